@@ -0,0 +1,67 @@
+"""
+Benchmark of the copy engine against shutil.copytree.
+
+Creates a synthetic tree in a temporary directory and copies it with
+shutil.copytree and with copy_engine.copy_tree using 1..N workers,
+printing wall time, MB/s and files/s.
+
+Usage:
+    python benchmarks/bench_copy.py --files 2000 --size 65536 --jobs 1 4 8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features import copy_engine  # noqa: E402
+
+
+def make_tree(root, files, size):
+    """Create `files` files of `size` random bytes spread over 10 folders."""
+    for i in range(files):
+        folder = os.path.join(root, f'dir{i % 10}')
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f'file{i}.bin'), 'wb') as f:
+            f.write(os.urandom(size))
+
+
+def measure(label, files, total, func):
+    """Run one copy and print a result row."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<16}{elapsed:>10.3f}{total / elapsed / 1e6:>10.1f}{files / elapsed:>12.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='copy engine benchmark')
+    parser.add_argument('--files', type=int, default=2000, help='number of files')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='size of each file in bytes')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8], help='worker counts')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_copy_')
+    try:
+        src = os.path.join(root, 'src')
+        make_tree(src, args.files, args.size)
+        total = args.files * args.size
+
+        print(f'{args.files} files x {args.size} B')
+        print(f'{"method":<16}{"seconds":>10}{"MB/s":>10}{"files/s":>12}')
+        dst = os.path.join(root, 'shutil')
+        measure('shutil.copytree', args.files, total, lambda: shutil.copytree(src, dst))
+        shutil.rmtree(dst)
+        for jobs in args.jobs:
+            dst = os.path.join(root, f'engine{jobs}')
+            measure(f'engine -j {jobs}', args.files, total, lambda: copy_engine.copy_tree(src, dst, jobs))
+            shutil.rmtree(dst)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
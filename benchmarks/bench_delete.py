@@ -0,0 +1,62 @@
+"""
+Benchmark of the parallel delete engine against shutil.rmtree.
+
+Creates the same synthetic tree before every run and deletes it with
+shutil.rmtree and with delete.delete_tree using 1..N threads, printing
+wall time and files/s.
+
+Usage:
+    python benchmarks/bench_delete.py --files 100000 --per-dir 100 --jobs 1 4 16
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features import delete  # noqa: E402
+
+
+def make_tree(root, files, per_dir):
+    """Create `files` empty files, `per_dir` per folder."""
+    for i in range(files):
+        folder = os.path.join(root, f'd{i // per_dir}')
+        if i % per_dir == 0:
+            os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, f'f{i}'), 'wb').close()
+
+
+def measure(label, files, func):
+    """Run one deletion and print a result row."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<16}{elapsed:>10.3f}{files / elapsed:>12.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parallel delete benchmark')
+    parser.add_argument('--files', type=int, default=100000, help='number of files')
+    parser.add_argument('--per-dir', type=int, default=100, help='files per folder')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4, 16], help='thread counts')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_delete_')
+    try:
+        tree = os.path.join(root, 'tree')
+        print(f'{args.files} files, {args.per_dir} per folder')
+        print(f'{"method":<16}{"seconds":>10}{"files/s":>12}')
+        make_tree(tree, args.files, args.per_dir)
+        measure('shutil.rmtree', args.files, lambda: shutil.rmtree(tree))
+        for jobs in args.jobs:
+            make_tree(tree, args.files, args.per_dir)
+            measure(f'delete -j {jobs}', args.files, lambda: delete.delete_tree(tree, jobs))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
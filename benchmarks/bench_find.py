@@ -0,0 +1,77 @@
+"""
+Benchmark of multi-pattern find against one find run per pattern.
+
+Creates a synthetic tree with files of many extensions and searches it for
+N patterns (a mix of '*.ext' globs, '.*\\.ext' regexes and general regexes):
+    separate - one iter_find() walk per pattern, as when find ran once per file type
+    combined - one walk with all patterns in a PatternSet
+Prints wall time and the number of matches of both.
+
+Usage:
+    python benchmarks/bench_find.py --files 100000 --patterns 24
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features import find  # noqa: E402
+
+EXTENSIONS = ['txt', 'log', 'md', 'py', 'c', 'h', 'jpg', 'png', 'gif', 'mp4', 'mkv', 'tar.gz', 'zip', 'json',
+              'csv', 'xml', 'html', 'css', 'js', 'ts', 'pdf', 'doc', 'bak', 'tmp']
+
+
+def make_tree(root, files, per_dir):
+    """Create `files` empty files, `per_dir` per folder, cycling through EXTENSIONS."""
+    for i in range(files):
+        folder = os.path.join(root, f'd{i // per_dir}')
+        if i % per_dir == 0:
+            os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, f'file{i}.{EXTENSIONS[i % len(EXTENSIONS)]}'), 'wb').close()
+
+
+def make_patterns(count):
+    """Globs for the first third, suffix regexes for the second and general regexes for the rest."""
+    regexes, globs = [], []
+    for i in range(count):
+        ext = EXTENSIONS[i % len(EXTENSIONS)]
+        if i % 3 == 0:
+            globs.append(f'*.{ext}')
+        elif i % 3 == 1:
+            regexes.append(r'.*\.' + ext.replace('.', r'\.'))
+        else:
+            regexes.append(rf'file[0-9]*7\.{ext.replace(".", "[.]")}')
+    return regexes, globs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='multi-pattern find benchmark')
+    parser.add_argument('--files', type=int, default=100000, help='number of files to create')
+    parser.add_argument('--per-dir', type=int, default=1000, help='files per folder')
+    parser.add_argument('--patterns', type=int, default=24, help='number of patterns')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_find_')
+    try:
+        make_tree(root, args.files, args.per_dir)
+        regexes, globs = make_patterns(args.patterns)
+        print(f'{args.files} files, {len(regexes)} regexes, {len(globs)} globs')
+
+        start = time.perf_counter()
+        separate = sum(sum(1 for _ in find.iter_find(root, pattern))
+                       for pattern in regexes + [find.PatternSet(globs=[glob]) for glob in globs])
+        print(f'{"separate":<10}{time.perf_counter() - start:>10.2f} s{separate:>10} matches')
+
+        start = time.perf_counter()
+        combined = sum(len(hits) for _, hits in find.iter_find(root, find.PatternSet(regexes, globs), tagged=True))
+        print(f'{"combined":<10}{time.perf_counter() - start:>10.2f} s{combined:>10} matches')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of parallel hashing (hashsum / duplicates worker pools).
+
+Creates a synthetic tree in a temporary directory and hashes it with
+1..16 workers of both pool types, printing wall time and throughput.
+
+Usage:
+    python benchmarks/bench_hashing.py --files 2000 --size 65536
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features.hashing import hash_file, parallel_map  # noqa: E402
+
+
+def make_tree(root, files, size):
+    """Create `files` files of `size` random bytes spread over 10 folders."""
+    paths = []
+    for i in range(files):
+        folder = os.path.join(root, f'dir{i % 10}')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'file{i}.bin')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parallel hashing benchmark')
+    parser.add_argument('--files', type=int, default=2000, help='number of files')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='size of each file in bytes')
+    parser.add_argument('--method', default='sha256', help='hash algorithm')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='worker counts')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_hashing_')
+    try:
+        paths = make_tree(root, args.files, args.size)
+        total = args.files * args.size
+        worker = partial(hash_file, method=args.method)
+
+        print(f'{args.files} files x {args.size} B, {args.method}')
+        print(f'{"executor":<10}{"jobs":>6}{"seconds":>10}{"MB/s":>10}{"speedup":>10}')
+        for executor in ('thread', 'process'):
+            baseline = None
+            for jobs in args.jobs:
+                start = time.perf_counter()
+                for _ in parallel_map(worker, paths, jobs, executor):
+                    pass
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                print(f'{executor:<10}{jobs:>6}{elapsed:>10.3f}{total / elapsed / 1e6:>10.1f}'
+                      f'{baseline / elapsed:>10.2f}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
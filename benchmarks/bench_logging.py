@@ -0,0 +1,75 @@
+"""
+Benchmark of the per-file logging overhead.
+
+Logs one "Hashed file" line per synthetic file, the way hashsum does:
+    direct   - the former setup, a FileHandler flushed after every record
+               and an f-string built in the calling thread
+    queued   - features.logger: lazy %-arguments, formatting and batched
+               writes in the listener thread
+    quiet    - features.logger with --quiet, info records are dropped
+Prints microseconds per record in the logging thread and in total
+(including the time to drain the queue).
+
+Usage:
+    python benchmarks/bench_logging.py --records 200000
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features import logger  # noqa: E402
+
+log = logging.getLogger('bench')
+
+
+def direct(paths, filename):
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(logging.Formatter(logger.LOG_FORMAT))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    start = time.perf_counter()
+    for path in paths:
+        log.info(f'Hashed file: {path} with algorithm sha256')
+    elapsed = time.perf_counter() - start
+    root.removeHandler(handler)
+    handler.close()
+    return elapsed, time.perf_counter() - start
+
+
+def queued(paths, filename, quiet=False):
+    logger.setup_logging(filename=filename, quiet=quiet)
+    start = time.perf_counter()
+    for path in paths:
+        log.info('Hashed file: %s with algorithm %s', path, 'sha256')
+    elapsed = time.perf_counter() - start
+    logger.shutdown_logging()
+    return elapsed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='logging overhead benchmark')
+    parser.add_argument('--records', type=int, default=200000, help='number of log records')
+    args = parser.parse_args()
+
+    paths = [f'/data/folder{i // 1000}/file{i}.bin' for i in range(args.records)]
+    root = tempfile.mkdtemp(prefix='bench_logging_')
+    try:
+        print(f'{args.records} records')
+        print(f'{"setup":<10}{"caller us":>12}{"total us":>12}')
+        for label, func in (('direct', direct), ('queued', queued),
+                            ('quiet', lambda p, f: queued(p, f, quiet=True))):
+            caller, total = func(paths, os.path.join(root, f'{label}.log'))
+            print(f'{label:<10}{caller / args.records * 1e6:>12.2f}{total / args.records * 1e6:>12.2f}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
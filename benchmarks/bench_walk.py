@@ -0,0 +1,95 @@
+"""
+Benchmark of the scandir-based walker against os.walk + os.path.getsize.
+
+Creates a synthetic tree in a temporary directory and sums file sizes with
+both approaches, printing wall time and the number of os.stat() and
+DirEntry.stat() calls made from Python. These are Python-level calls, not
+syscalls: on Linux a DirEntry.stat() is still one stat syscall per file (only
+Windows fills it from the directory listing), so there the walker saves
+Python overhead and path building, not syscalls.
+
+Usage:
+    python benchmarks/bench_walk.py --files 1000000 --per-dir 1000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features import walker  # noqa: E402
+
+
+def make_tree(root, files, per_dir):
+    """Create `files` empty files, `per_dir` per folder, in two levels of folders."""
+    for i in range(files):
+        folder = os.path.join(root, f'd{i // (per_dir * 100)}', f'd{i // per_dir}')
+        if i % per_dir == 0:
+            os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, f'f{i}'), 'wb').close()
+
+
+class StatCounter:
+    """Wrap os.stat and the walker's DirEntry.stat() helper and count calls made through them."""
+
+    def __init__(self):
+        self.calls = 0
+        self.entry_calls = 0
+        self.original = os.stat
+        self.original_entry = walker._stat
+
+    def __enter__(self):
+        def counting_stat(*args, **kwargs):
+            self.calls += 1
+            return self.original(*args, **kwargs)
+
+        def counting_entry_stat(entry):
+            self.entry_calls += 1
+            return self.original_entry(entry)
+        os.stat = counting_stat
+        walker._stat = counting_entry_stat
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        os.stat = self.original
+        walker._stat = self.original_entry
+
+
+def legacy_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def walker_size(path):
+    return sum(entry.stat.st_size for entry in walker.walk(path, stat=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='directory walker benchmark')
+    parser.add_argument('--files', type=int, default=100000, help='number of files')
+    parser.add_argument('--per-dir', type=int, default=1000, help='files per directory')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_walk_')
+    try:
+        make_tree(root, args.files, args.per_dir)
+        print(f'{args.files} files, {args.per_dir} per directory')
+        print(f'{"method":<22}{"seconds":>10}{"os.stat calls":>16}{"DirEntry.stat calls":>22}')
+        for name, func in [('os.walk + getsize', legacy_size), ('walker.walk(stat)', walker_size)]:
+            with StatCounter() as counter:
+                start = time.perf_counter()
+                func(root)
+                elapsed = time.perf_counter() - start
+            print(f'{name:<22}{elapsed:>10.3f}{counter.calls:>16}{counter.entry_calls:>22}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
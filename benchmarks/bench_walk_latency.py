@@ -0,0 +1,82 @@
+"""
+Benchmark of parallel directory traversal on a simulated high-latency filesystem.
+
+Every os.scandir() call is delayed by --latency milliseconds to emulate the
+metadata round trip of NFS/FUSE mounts, then the tree is counted with
+1..N walker threads. The result of every run is checked against the serial walk.
+
+Usage:
+    python benchmarks/bench_walk_latency.py --dirs 500 --latency 2
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from features import walker  # noqa: E402
+
+
+def make_tree(root, dirs, files_per_dir):
+    """Create `dirs` directories spread over 20 parents with a few files each."""
+    for i in range(dirs):
+        folder = os.path.join(root, f'p{i % 20}', f'd{i}')
+        os.makedirs(folder, exist_ok=True)
+        for j in range(files_per_dir):
+            open(os.path.join(folder, f'f{j}'), 'wb').close()
+
+
+class SlowScandir:
+    """Replace os.scandir with a version that sleeps before every call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.original = os.scandir
+
+    def __enter__(self):
+        def slow_scandir(*args, **kwargs):
+            time.sleep(self.latency)
+            return self.original(*args, **kwargs)
+        os.scandir = slow_scandir
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        os.scandir = self.original
+
+
+def snapshot(root, threads):
+    return [(listing.path, [e.name for e in listing.dirs], [e.name for e in listing.files])
+            for listing in walker.iter_dirs(root, threads=threads)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parallel traversal benchmark with simulated latency')
+    parser.add_argument('--dirs', type=int, default=500, help='number of directories')
+    parser.add_argument('--files', type=int, default=5, help='files per directory')
+    parser.add_argument('--latency', type=float, default=2.0, help='delay per directory listing in ms')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help='thread counts')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_walk_latency_')
+    try:
+        make_tree(root, args.dirs, args.files)
+        expected = snapshot(root, 1)
+        print(f'{args.dirs} directories, {args.latency} ms per listing')
+        print(f'{"threads":>8}{"seconds":>10}{"speedup":>10}{"same result":>14}')
+        baseline = None
+        with SlowScandir(args.latency / 1000):
+            for threads in args.threads:
+                start = time.perf_counter()
+                result = snapshot(root, threads)
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                print(f'{threads:>8}{elapsed:>10.3f}{baseline / elapsed:>10.2f}{str(result == expected):>14}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
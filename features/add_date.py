@@ -1,15 +1,11 @@
 import os
+import stat
 import datetime
 import logging
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
 
 
 def run(args):
@@ -20,11 +16,14 @@ def run(args):
     If a directory is provided:
         - Without --recursive: only files in the top-level directory are processed.
         - With --recursive: all files in the directory and its subdirectories are processed.
+    Only regular files (or symlinks to them) are renamed; broken symlinks,
+    sockets and FIFOs are skipped.
 
     :param:
             args: Namespace: Arguments from argparse.
             path: str: Path to file or directory.
             recursive: bool: Whether to process directories recursively.
+            format: str (optional): Output format: 'text', 'ndjson' or 'csv'.
     :raises:
             FileNotFoundError: If the given path does not exist.
             FileExistsError: If the new file name already exists.
@@ -33,28 +32,26 @@ def run(args):
     path = args.path
     recursive = args.recursive
 
-    logging.info(f'Add_date command started: path={path}, recursive={recursive}')
+    log.info(f'Add_date command started: path={path}, recursive={recursive}')
 
     if not os.path.exists(path):
-        logging.error(f'Path does not exist: {path}')
+        log.error(f'Path does not exist: {path}')
         raise FileNotFoundError(f'Path does not exist: {path}')
 
-    if os.path.isfile(path):
-        _rename_with_date(file_path=path)
-    else:
-        if recursive:
-            for root, subfolders, files in os.walk(path):
-                for f in files:
-                    file_path = os.path.join(root, f)
-                    _rename_with_date(file_path=file_path)
+    with output.from_args(args, ('path', 'new_path', 'skipped')) as out:
+        if os.path.isfile(path):
+            _rename_with_date(file_path=path, out=out)
         else:
-            for f in os.listdir(path):
-                file_path = os.path.join(path, f)
-                if os.path.isfile(file_path):
-                    _rename_with_date(file_path=file_path)
+            max_depth = None if recursive else 1
+            for entry in walker.walk(path, max_depth=max_depth, stat=True, on_error=walker.log_error):
+                # like os.path.isfile(): broken symlinks, sockets and FIFOs are not renamed
+                if not stat.S_ISREG(entry.stat.st_mode):
+                    log.info('Skipping (not a regular file): %s', entry.path)
+                    continue
+                _rename_with_date(file_path=entry.path, out=out)
 
 
-def _rename_with_date(file_path):
+def _rename_with_date(file_path, out=None):
     """
     Renames a file by appending its creation date to the name.
 
@@ -63,7 +60,7 @@ def _rename_with_date(file_path):
 
     :param:
             file_path: str: Path to file or rename.
-            recursive: bool: Whether to process directories recursively.
+            out: output.Output (optional): Where the result is written, text to stdout by default.
     :raises:
             FileExistsError: If the new file name already exists.
     :return:
@@ -72,6 +69,7 @@ def _rename_with_date(file_path):
             after rename: "document_2025-08-06.txt"
 
     """
+    out = out or output.Output()
     try:
         creation_time = os.path.getctime(file_path)
         date_str = datetime.datetime.fromtimestamp(creation_time).strftime('%Y-%m-%d')
@@ -81,20 +79,20 @@ def _rename_with_date(file_path):
         name, ext = os.path.splitext(base_name)
 
         if date_str in name:
-            logging.info(f'Skipping (already contains date): {file_path}')
-            print(f'Skipping (already contains date): {file_path}')
+            log.info('Skipping (already contains date): %s', file_path)
+            out.emit(f'Skipping (already contains date): {file_path}', path=file_path, skipped=True)
             return
 
         new_name = f'{date_str}_{name}{ext}'
         new_path = os.path.join(dir_name, new_name)
 
         if os.path.exists(new_path):
-            logging.error(f'File already exists: {new_path}')
+            log.error(f'File already exists: {new_path}')
             raise FileExistsError(f'File already exists: {new_path}')
 
         os.rename(file_path, new_path)
-        logging.info(f'Renamed: {file_path} to {new_path}')
-        print(f'Renamed: {file_path} to {new_path}')
+        log.info('Renamed: %s to %s', file_path, new_path)
+        out.emit(f'Renamed: {file_path} to {new_path}', path=file_path, new_path=new_path, skipped=False)
     except Exception as e:
-        logging.error(f'Error renaming file {file_path}: {e}')
+        log.error(f'Error renaming file {file_path}: {e}')
         raise
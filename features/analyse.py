@@ -1,47 +1,34 @@
 import os
+import heapq
 import logging
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
 
 
-def get_size(path):
+def get_size(path, cache=None):
     """
     Calculate the total size of a file or directory.
 
     If the path is a file, its size in bytes is returned.
     If the path is a directory, the size of all files
-    (including in subdirectories) is summed.
+    (including in subdirectories) is summed. Sizes come from the
+    stat results cached by the scandir-based walker.
 
     :param:
         path: str: Path to the file or directory.
+        cache: walker.ListingCache or None: Reuse listings of unchanged directories.
     :return:
         int: Size in bytes.
     :raises:
         FileNotFoundError
         PermissionError
     """
-    total = 0
     if os.path.isfile(path):
         return os.path.getsize(path)
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            try:
-                file_path = os.path.join(root, file)
-                total += os.path.getsize(file_path)
-            except FileNotFoundError:
-                logging.warning(f'File not found: {path}')
-                continue
-            except PermissionError:
-                logging.warning(f'Permission denied: {path}')
-                continue
-    return total
+    return sum(entry.stat.st_size
+               for entry in walker.walk(path, stat=True, on_error=walker.log_error, cache=cache))
 
 
 def convert_size(size_bytes):
@@ -61,19 +48,110 @@ def convert_size(size_bytes):
         size_bytes /= 1024
 
 
+class DirStats:
+    """
+    Totals of one directory, including everything below it.
+
+    apparent: int - sum of st_size of all files
+    allocated: int - disk usage of all files (st_blocks * 512)
+    files: int - number of files
+    """
+    __slots__ = ('apparent', 'allocated', 'files')
+
+    def __init__(self, apparent=0, allocated=0, files=0):
+        self.apparent = apparent
+        self.allocated = allocated
+        self.files = files
+
+    def add(self, other):
+        self.apparent += other.apparent
+        self.allocated += other.allocated
+        self.files += other.files
+
+
+def _allocated(st):
+    """Disk usage of a file, falls back to the apparent size where st_blocks is missing."""
+    blocks = getattr(st, 'st_blocks', None)
+    return st.st_size if blocks is None else blocks * 512
+
+
+def scan_tree(path, depth=1, top=0, threads=1, cache=None):
+    """
+    Collect sizes of all directories in a single bottom-up traversal.
+
+    Every directory is listed exactly once; totals of subdirectories are
+    added to their parents as the walk goes up. Only directories up to the
+    requested depth are kept in the result.
+
+    :param:
+        path: str: Path to the directory.
+        depth: int: Keep totals of directories up to this depth (0 = only path itself).
+        top: int: Number of largest files to collect.
+        threads: int: Threads listing directories in parallel.
+        cache: walker.ListingCache or None: Reuse listings of unchanged directories.
+    :return:
+        tuple(dict, dict, list):
+            totals of kept directories {path: DirStats},
+            stats of top-level files {path: DirStats},
+            largest files [(size, path)] sorted by size descending.
+    """
+    totals = dict()
+    top_files = dict()
+    largest = []
+
+    for listing in walker.iter_dirs(path, stat=True, on_error=walker.log_error, topdown=False,
+                                   threads=threads, cache=cache):
+        node = DirStats()
+        for entry in listing.files:
+            st = entry.stat
+            file_stats = DirStats(st.st_size, _allocated(st), 1)
+            node.add(file_stats)
+            if listing.depth == 0:
+                top_files[entry.path] = file_stats
+            if top:
+                if len(largest) < top:
+                    heapq.heappush(largest, (st.st_size, entry.path))
+                elif st.st_size > largest[0][0]:
+                    heapq.heapreplace(largest, (st.st_size, entry.path))
+        for entry in listing.dirs:
+            child = totals.get(entry.path)
+            if child is None:
+                # not descended into (symlink or unreadable)
+                if entry.depth <= depth:
+                    totals[entry.path] = DirStats()
+                continue
+            node.add(child)
+            if entry.depth > depth:
+                del totals[entry.path]
+        totals[listing.path] = node
+
+    return totals, top_files, sorted(largest, reverse=True)
+
+
 def run(args):
     """
     Analyze the contents of a directory and display size information.
 
     The function prints the total size of the given directory
     and the size of each file/folder inside, sorted by size (descending).
+    All numbers come from one bottom-up traversal of the tree.
+    Optionally it prints a tree of directory sizes up to a given depth
+    (like du -d N) and the largest files.
 
     :param:
         args: Namespace: Parsed CLI arguments.
         path: str: Path to the directory to analyze.
+        depth: int (optional): Print directory totals up to this depth.
+        top: int (optional): Print this many largest files.
+        walk_threads: int (optional): Threads listing directories in parallel.
+        index: bool (optional): Take sizes from the directory index instead of the filesystem.
+        index_file: str (optional): Path to the index database.
+        refresh: bool (optional): Update the index incrementally before answering.
+        format: str (optional): Output format: 'text', 'ndjson' or 'csv'; structured formats have one
+            record per entry with its kind ('total', 'entry', 'directory' or 'largest'), path and sizes in bytes.
     :return:
         Output example:
-            full size: 72.37 MB
+            full size: 72.37 MB (allocated 74.1 MB, 1450 files)
                 - .venv  -  72.23 MB
                 - .git  -  54.71 KB
                 - tests  -  44.16 KB
@@ -86,29 +164,69 @@ def run(args):
     """
     path = args.path
     path = os.path.abspath(path)
-    logging.info(f'Starting analyse for path: {path}')
+    depth = getattr(args, 'depth', None) or 0
+    top = getattr(args, 'top', None) or 0
+    walk_threads = getattr(args, 'walk_threads', None) or 1
+    log.info(f'Starting analyse for path: {path}')
 
+    out = output.from_args(args, ('kind', 'path', 'size', 'allocated', 'files', 'error'))
     if not os.path.exists(path):
-        logging.error(f'Path does not exist: {path}')
-        print(f'Path does not exist: {path}')
+        log.error(f'Path does not exist: {path}')
+        with out:
+            out.emit(f'Path does not exist: {path}', path=path, error='path does not exist')
         return
 
-    entries = os.listdir(path)
-    entries_paths = [os.path.join(path, entry) for entry in entries]
-
-    sizes = []
-    total_size = 0
-
-    for entry_path in entries_paths:
-        size = get_size(entry_path)
-        sizes.append((os.path.basename(entry_path), size))
-        total_size += size
-
-    logging.info(f'Total size for {path}: {convert_size(total_size)}')
-    print(f'full size: {convert_size(total_size)}')
+    if not os.path.isdir(path):
+        size = get_size(path)
+        log.info(f'Total size for {path}: {convert_size(size)}')
+        with out:
+            out.emit(f'full size: {convert_size(size)}', kind='total', path=path, size=size)
+        return
 
-    for name, size in sorted(sizes, key=lambda x: x[1], reverse=True):
-        logging.info(f'{name}: {convert_size(size)}')
-        print(f' - {name}  -  {convert_size(size)}')
+    idx = None
+    if getattr(args, 'index', False) or getattr(args, 'refresh', False):
+        from features import index
+        idx = index.open_from_args(path, args)
+    if idx is not None:
+        with idx:
+            totals, top_files, largest = idx.scan_tree(path, max(depth, 1), top)
+    else:
+        totals, top_files, largest = scan_tree(path, max(depth, 1), top, walk_threads)
+    total = totals.get(path)
+    if total is None:
+        # the walk logged why the directory itself could not be listed
+        log.error(f'Cannot read directory: {path}')
+        with out:
+            out.emit(f'Cannot read directory: {path}', path=path, error='cannot read directory')
+        return
 
-    logging.info(f'Analyse completed for path: {path}')
+    sizes = [(p, stats.apparent) for p, stats in top_files.items()]
+    sizes += [(p, stats.apparent) for p, stats in totals.items() if os.path.dirname(p) == path]
+
+    log.info(f'Total size for {path}: {convert_size(total.apparent)}')
+    with out:
+        out.emit(f'full size: {convert_size(total.apparent)} '
+                 f'(allocated {convert_size(total.allocated)}, {total.files} files)',
+                 kind='total', path=path, size=total.apparent, allocated=total.allocated, files=total.files)
+
+        for entry_path, size in sorted(sizes, key=lambda x: x[1], reverse=True):
+            name = os.path.basename(entry_path)
+            log.info(f'{name}: {convert_size(size)}')
+            out.emit(f' - {name}  -  {convert_size(size)}', kind='entry', path=entry_path, size=size)
+
+        if depth:
+            out.emit(f'Directory sizes (depth {depth}):')
+            for dir_path in sorted(totals):
+                stats = totals[dir_path]
+                rel = os.path.relpath(dir_path, path)
+                out.emit(f'  {convert_size(stats.apparent):>10}  {convert_size(stats.allocated):>10}  '
+                         f'{stats.files:>8} files  {rel}',
+                         kind='directory', path=dir_path, size=stats.apparent, allocated=stats.allocated,
+                         files=stats.files)
+
+        if top:
+            out.emit('Largest files:')
+            for size, file_path in largest:
+                out.emit(f'  {convert_size(size):>10}  {file_path}', kind='largest', path=file_path, size=size)
+
+    log.info(f'Analyse completed for path: {path}')
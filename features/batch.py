@@ -0,0 +1,224 @@
+import io
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import threading
+from functools import partial
+
+from features import cli
+from features.hashing import parallel_map
+
+log = logging.getLogger(__name__)
+
+# commands that cannot run inside a batch
+EXCLUDED_COMMANDS = ('batch', 'serve')
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+class _OutputRouter:
+    """
+    Replacement for sys.stdout that sends each thread's output to its own buffer.
+
+    Threads without a buffer write to the original stream, so output of
+    concurrently running commands never interleaves.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self, buffer):
+        self.local.buffer = buffer
+
+    def write(self, s):
+        return (getattr(self.local, 'buffer', None) or self.stream).write(s)
+
+    def flush(self):
+        (getattr(self.local, 'buffer', None) or self.stream).flush()
+
+
+def read_manifest(path, fmt=None):
+    """
+    Read operations from a manifest.
+
+    JSONL manifests have one JSON object per line, CSV manifests a header
+    row; both need a 'command' field, all other fields are options of that
+    command (see namespace_for()). Empty lines and empty CSV cells are skipped.
+
+    :param path: str - manifest file, '-' for stdin
+           fmt: str or None - 'jsonl' or 'csv', guessed from the extension if None
+    :return: generator of dict
+    :raises: ValueError if a JSONL line is not an object
+    """
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    f = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if key and value not in (None, '')}
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                operation = json.loads(line)
+                if not isinstance(operation, dict):
+                    raise ValueError(f'Manifest line is not a JSON object: {line.strip()}')
+                yield operation
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _convert(action, value):
+    """Convert a manifest value like argparse would convert the command line value."""
+    if action.nargs == 0:
+        if isinstance(value, str):
+            value = value.strip().lower() in TRUE_VALUES
+        return bool(value) if action.const is True else not bool(value)
+    if action.nargs in ('+', '*'):
+        values = value if isinstance(value, list) else [value]
+        return [action.type(v) if action.type and isinstance(v, str) else v for v in values]
+    if action.type and isinstance(value, str):
+        value = action.type(value)
+    if action.choices is not None and value not in action.choices:
+        raise ValueError(f'invalid choice for {action.dest}: {value!r} (choose from {list(action.choices)})')
+    return value
+
+
+def namespace_for(parser, command, fields):
+    """
+    Build the argparse namespace a command would get from the command line.
+
+    Options keep the defaults of the command's subparser. Field names are
+    option names with or without dashes ('walk-threads', 'walk_threads').
+
+    :param parser: argparse.ArgumentParser - subparser of the command
+           command: str - command name
+           fields: dict - option values from the manifest
+    :return: argparse.Namespace
+    :raises: ValueError for unknown options, missing required options or invalid values
+    """
+    actions = {action.dest: action for action in parser._actions if action.dest != 'help'}
+    namespace = argparse.Namespace(command=command)
+    for dest, action in actions.items():
+        setattr(namespace, dest, action.default)
+
+    given = set()
+    for key, value in fields.items():
+        dest = key.lstrip('-').replace('-', '_')
+        action = actions.get(dest)
+        if action is None:
+            raise ValueError(f'unknown option for {command}: {key}')
+        setattr(namespace, dest, _convert(action, value))
+        given.add(dest)
+
+    missing = [dest for dest, action in actions.items() if action.required and dest not in given]
+    if missing:
+        raise ValueError(f'missing required options for {command}: {", ".join(missing)}')
+    return namespace
+
+
+def execute(item, parsers, commands, router=None):
+    """
+    Run one manifest operation and describe the outcome.
+
+    :param item: tuple(int, dict) - line number and operation
+           parsers: dict - {command: subparser}
+           commands: dict - {command: module with run(args)}
+           router: _OutputRouter or None - captures what the command prints
+    :return: dict - line, id, command, ok, output, error, seconds
+    """
+    line, operation = item
+    fields = dict(operation)
+    command = fields.pop('command', None)
+    result = {'line': line, 'id': fields.pop('id', None), 'command': command,
+              'ok': False, 'output': '', 'error': None, 'seconds': 0.0}
+    buffer = io.StringIO()
+    if router is not None:
+        router.capture(buffer)
+    started = time.perf_counter()
+    try:
+        if command not in parsers or command in EXCLUDED_COMMANDS:
+            raise ValueError(f'unknown command: {command}')
+        args = namespace_for(parsers[command], command, fields)
+        commands[command].run(args)
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        log.error(f'Batch operation {line} ({command}) failed: {e}')
+    finally:
+        if router is not None:
+            router.capture(None)
+    result['seconds'] = round(time.perf_counter() - started, 6)
+    result['output'] = buffer.getvalue()
+    return result
+
+
+def run_batch(operations, parsers, commands, jobs=1, out=None):
+    """
+    Run operations on a worker pool and stream one JSON result per operation.
+
+    Results are written in manifest order as soon as they are available.
+
+    :param operations: iterable of dict - manifest operations
+           parsers: dict - {command: subparser}
+           commands: dict - {command: module with run(args)}
+           jobs: int - number of operations run in parallel
+           out: text stream or None - where results go, sys.stdout if None
+    :return: tuple(int, int) - (succeeded, failed)
+    """
+    out = out or sys.stdout
+    router = _OutputRouter(sys.stdout)
+    succeeded = failed = 0
+    previous, sys.stdout = sys.stdout, router
+    try:
+        worker = partial(execute, parsers=parsers, commands=commands, router=router)
+        for _, result, error in parallel_map(worker, enumerate(operations, 1), jobs):
+            if error is not None:
+                raise error
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            if result['ok']:
+                succeeded += 1
+            else:
+                failed += 1
+    finally:
+        sys.stdout = previous
+    return succeeded, failed
+
+
+def run(args):
+    """
+    Run many operations from a manifest in one process.
+
+    Each manifest line names a command and its options, e.g.
+        {"id": "a1", "command": "copy", "src": "/data/a", "dst": "/backup"}
+    The result stream has one JSON object per operation with its line,
+    id, command, ok flag, captured output, error and duration.
+
+    :param args: argparse.Namespace with fields:
+           manifest: str, path to the manifest ('-' for stdin)
+           jobs: int (optional), operations run in parallel, default 1
+           manifest_format: str (optional), 'jsonl' or 'csv'
+           output: str (optional), file for the results instead of stdout
+    :return: tuple(int, int) - (succeeded, failed)
+    """
+    jobs = getattr(args, 'jobs', None) or 1
+    output = getattr(args, 'output', None)
+    log.info(f'Batch command started: manifest={args.manifest}, jobs={jobs}')
+
+    parsers = cli.build_parser().subcommands
+    operations = read_manifest(args.manifest, getattr(args, 'manifest_format', None))
+    out = open(output, 'w') if output else None
+    try:
+        succeeded, failed = run_batch(operations, parsers, cli.commands, jobs, out)
+    finally:
+        if out is not None:
+            out.close()
+
+    log.info(f'Batch completed: {succeeded} succeeded, {failed} failed')
+    return succeeded, failed
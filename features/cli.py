@@ -0,0 +1,315 @@
+import os
+import argparse
+import importlib
+from collections.abc import Mapping
+
+# command name -> module implementing run(args); imported only when the command is dispatched
+COMMAND_MODULES = {
+    'copy': 'features.copy',
+    'delete': 'features.delete',
+    'count': 'features.count',
+    'find': 'features.find',
+    'move': 'features.move',
+    'add_date': 'features.add_date',
+    'analyse': 'features.analyse',
+    'hashsum': 'features.hashsum',
+    'duplicates': 'features.duplicates',
+    'cache': 'features.hash_cache',
+    'index': 'features.index',
+    'sync': 'features.sync',
+    'trash': 'features.trash',
+    'batch': 'features.batch',
+    'serve': 'features.serve',
+}
+
+# command name -> loggers of the modules it runs, so that a per-command --log-level also covers the
+# engine, walker and cache modules the command module hands its work to
+COMMAND_LOGGERS = {
+    'copy': ('features.copy', 'features.copy_engine', 'features.walker'),
+    'delete': ('features.delete', 'features.trash', 'features.walker'),
+    'count': ('features.count', 'features.index', 'features.walker'),
+    'find': ('features.find', 'features.index', 'features.walker'),
+    'move': ('features.move', 'features.copy_engine', 'features.walker'),
+    'add_date': ('features.add_date', 'features.walker'),
+    'analyse': ('features.analyse', 'features.index', 'features.walker'),
+    'hashsum': ('features.hashsum', 'features.hash_cache', 'features.walker'),
+    'duplicates': ('features.duplicates', 'features.hash_cache', 'features.walker'),
+    'cache': ('features.hash_cache',),
+    'index': ('features.index', 'features.walker'),
+    'sync': ('features.sync', 'features.copy_engine', 'features.hash_cache', 'features.walker'),
+    'trash': ('features.trash', 'features.delete', 'features.walker'),
+    'batch': ('features.batch',),
+    'serve': ('features.serve', 'features.batch'),
+}
+
+
+def command_loggers(per_command):
+    """
+    Turn per-command log levels into levels of the loggers those commands use.
+
+    A logger shared by several of the given commands (e.g. features.walker)
+    gets the most verbose of their levels.
+
+    :param per_command: dict - {command: level}, as returned by logger.parse_levels()
+    :return: dict - {logger name: level}
+    """
+    loggers = dict()
+    for command, level in per_command.items():
+        names = COMMAND_LOGGERS.get(command) or (COMMAND_MODULES.get(command, f'features.{command}'),)
+        for name in names:
+            loggers[name] = min(level, loggers.get(name, level))
+    return loggers
+
+
+class CommandRegistry(Mapping):
+    """
+    {command: module} mapping that imports a command module on first lookup.
+
+    Keeps startup cheap: running count does not load hashlib, sqlite3,
+    asyncio & co. needed only by other commands.
+    """
+
+    def __init__(self, modules):
+        self.modules = modules
+
+    def __getitem__(self, command):
+        return importlib.import_module(self.modules[command])
+
+    def __iter__(self):
+        return iter(self.modules)
+
+    def __len__(self):
+        return len(self.modules)
+
+
+commands = CommandRegistry(COMMAND_MODULES)
+
+
+def build_parser():
+    """
+    Build the command line parser with one subparser per command.
+
+    The subparsers are also available as parser.subcommands ({name: parser})
+    so that other front ends (batch manifests, the server) can fill in the
+    same options and defaults.
+
+    :return: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        prog='python manager.py',
+        description='simple file manager',
+        epilog='for more information visit https://github.com/marazoch/dir_tools'
+    )
+
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='only log warnings and errors')
+    parser.add_argument('--log-level', default=os.environ.get('DIRTOOLS_LOG_LEVEL'), metavar='',
+                        help='log level, for all commands (WARNING) and/or per command (hashsum=DEBUG,copy=ERROR); '
+                             'default: $DIRTOOLS_LOG_LEVEL or INFO')
+
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    parser_copy = subparsers.add_parser('copy', help='Copy file or folder to destination folder')
+    parser_copy.add_argument('-s', '--src', required=True, metavar='', help='file or folder source')
+    parser_copy.add_argument('-d', '--dst', required=True, metavar='', help='destination folder')
+    parser_copy.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                             help='number of files copied in parallel (default: 1)')
+    parser_copy.add_argument('--buffer-size', type=int, default=4 * 1024 * 1024, metavar='',
+                             help='copy buffer size in bytes when zero-copy is unavailable (default: 4 MiB)')
+    parser_copy.add_argument('--reflink', choices=['auto', 'always', 'never'], default='auto', metavar='',
+                             help='clone files on copy-on-write filesystems: auto, always or never (default: auto)')
+    parser_copy.add_argument('--delta', action='store_true',
+                             help='update an existing destination file in place, rewriting only changed blocks')
+    parser_copy.add_argument('--resume', action='store_true',
+                             help='continue an interrupted copy from its journal')
+    parser_copy.add_argument('--verify-hash', action='store_true',
+                             help='compare sha256 of already copied data before skipping it')
+    parser_copy.add_argument('--journal', metavar='', help='path to the journal file')
+    parser_copy.add_argument('--no-journal', action='store_true', help='do not record progress')
+
+    parser_delete = subparsers.add_parser('delete', help='Delete file or folder')
+    parser_delete.add_argument('-s', '--src', required=True, metavar='', help='file source to delete')
+    parser_delete.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                               help='delete folder contents with N threads in parallel batches (default: 1)')
+    parser_delete.add_argument('--dry-run', action='store_true',
+                               help='only report how many files and bytes would be deleted')
+    parser_delete.add_argument('--async', dest='async_delete', action='store_true',
+                               help='move to the trash at once (instant), free space later with trash purge')
+    parser_delete.add_argument('--walk-threads', type=int, default=1, metavar='',
+                               help='threads listing directories in parallel (for network filesystems)')
+
+    parser_count = subparsers.add_parser('count', help='Count files in folder')
+    parser_count.add_argument('-p', '--path', required=True, metavar='', help='path to folder to count')
+    parser_count.add_argument('--walk-threads', type=int, default=1, metavar='',
+                              help='threads listing directories in parallel (for network filesystems)')
+    parser_count.add_argument('--index', action='store_true',
+                              help='answer from the directory index (see the index command)')
+    parser_count.add_argument('--index-file', metavar='', help='path to the index database')
+    parser_count.add_argument('--refresh', action='store_true',
+                              help='update the index first, rescanning only changed directories')
+
+    parser_find = subparsers.add_parser('find', help='Find files by name, path, type, size or age')
+    parser_find.add_argument('-p', '--path', required=True, metavar='', help='path to folder for search')
+    parser_find.add_argument('-r', '--regex', action='append', metavar='',
+                             help='filename regex to find (repeatable, all are matched in one walk)')
+    parser_find.add_argument('-g', '--glob', action='append', metavar='', help='filename glob to find (repeatable)')
+    parser_find.add_argument('--pattern-file', metavar='',
+                             help="file with one filename regex per line ('glob:' prefix for globs)")
+    parser_find.add_argument('--path-regex', metavar='', help='regex the whole path must match')
+    parser_find.add_argument('--type', choices=('f', 'd', 'l'),
+                             help='only files, directories or symlinks (default: everything but directories)')
+    parser_find.add_argument('--min-size', metavar='', help='smallest size, e.g. 100K or 1.5G')
+    parser_find.add_argument('--max-size', metavar='', help='largest size, e.g. 100K or 1.5G')
+    parser_find.add_argument('--newer', metavar='',
+                             help='modified within an age (30m, 12h, 7d, 2w) or since a date (2024-05-01)')
+    parser_find.add_argument('--older', metavar='', help='modified before an age or date, like --newer')
+    parser_find.add_argument('--max-depth', type=int, metavar='',
+                             help='deepest level to search (1 = only the folder itself)')
+    parser_find.add_argument('--exclude-dir', action='append', metavar='',
+                             help='glob pattern of folder names not to enter (repeatable)')
+    parser_find.add_argument('--limit', type=int, metavar='', help='stop after N matches')
+    parser_find.add_argument('--first', action='store_true', help='stop at the first match')
+    parser_find.add_argument('--walk-threads', type=int, default=1, metavar='',
+                             help='threads listing directories in parallel (for network filesystems)')
+    parser_find.add_argument('--index', action='store_true',
+                             help='answer from the directory index (see the index command)')
+    parser_find.add_argument('--index-file', metavar='', help='path to the index database')
+    parser_find.add_argument('--refresh', action='store_true',
+                             help='update the index first, rescanning only changed directories')
+
+    parser_move = subparsers.add_parser("move", help="Move files or folders")
+    parser_move.add_argument('-s', '--src', required=True, nargs='+', metavar='',
+                             help='source paths or glob patterns (quoted, e.g. "logs/*.gz")')
+    parser_move.add_argument('-r', '--regex', metavar='',
+                             help='move the entries of the source folders whose names match the regex')
+    parser_move.add_argument('-d', '--dst', required=True, metavar='', help='destination folder')
+    parser_move.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                             help='files copied in parallel when moving across filesystems (default: 1)')
+    parser_move.add_argument('--resume', action='store_true',
+                             help='continue an interrupted move across filesystems from its journal')
+    parser_move.add_argument('--verify-hash', action='store_true',
+                             help='compare sha256 of already copied data before skipping it')
+    parser_move.add_argument('--journal', metavar='', help='path to the journal file')
+    parser_move.add_argument('--no-journal', action='store_true', help='do not record progress')
+
+    parser_add_date = subparsers.add_parser('add_date', help='Rename file(s) with creation date')
+    parser_add_date.add_argument('-p', '--path', required=True, metavar='', help="path to file or folder")
+    parser_add_date.add_argument('-r', '--recursive', action='store_true',
+                                 help='process all subdirectories')
+
+    parser_analyse = subparsers.add_parser('analyse', help='Analyse files in dir')
+    parser_analyse.add_argument('-p', '--path', metavar='', required=True, help='path to file or folder')
+    parser_analyse.add_argument('--walk-threads', type=int, default=1, metavar='',
+                                help='threads listing directories in parallel (for network filesystems)')
+    parser_analyse.add_argument('--index', action='store_true',
+                                help='answer from the directory index (see the index command)')
+    parser_analyse.add_argument('--index-file', metavar='', help='path to the index database')
+    parser_analyse.add_argument('--refresh', action='store_true',
+                                help='update the index first, rescanning only changed directories')
+    parser_analyse.add_argument('--depth', type=int, default=0, metavar='',
+                                help='print directory sizes up to this depth (like du -d N)')
+    parser_analyse.add_argument('--top', type=int, default=0, metavar='',
+                                help='print this many largest files')
+
+    parser_hashsum = subparsers.add_parser('hashsum', help='Calculate hash of file or directory')
+    parser_hashsum.add_argument('-p', '--path', required=True, metavar='',
+                                help='Path to file or directory')
+    parser_hashsum.add_argument('-m', '--method', choices=['sha256', 'md5'], default='sha256', metavar='',
+                                help='Hash algorithm (sha256 or md5)')
+    parser_hashsum.add_argument('--chunk-size', type=int, default=1024 * 1024, metavar='',
+                                help='read size in bytes (default 1 MiB)')
+    parser_hashsum.add_argument('--mmap', action='store_true',
+                                help='hash large files through a memory map')
+    parser_hashsum.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                                help='number of hashing workers (default 1)')
+    parser_hashsum.add_argument('--executor', choices=['thread', 'process'], default='thread', metavar='',
+                                help='worker pool type: thread or process (default thread)')
+    parser_hashsum.add_argument('--no-cache', action='store_true',
+                                help='do not use the persistent hash cache')
+    parser_hashsum.add_argument('--rebuild-cache', action='store_true',
+                                help='rehash all files and refresh the hash cache')
+    parser_hashsum.add_argument('--cache-file', metavar='', help='path to the hash cache database')
+
+    parser_duplicates = subparsers.add_parser('duplicates', help='Find duplicate files in directory')
+    parser_duplicates.add_argument('-p', '--path', required=True, metavar='', help='Path to directory')
+    parser_duplicates.add_argument('--chunk-size', type=int, default=1024 * 1024, metavar='',
+                                   help='read size in bytes (default 1 MiB)')
+    parser_duplicates.add_argument('--mmap', action='store_true',
+                                   help='hash large files through a memory map')
+    parser_duplicates.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                                   help='number of hashing workers (default 1)')
+    parser_duplicates.add_argument('--executor', choices=['thread', 'process'], default='thread', metavar='',
+                                   help='worker pool type: thread or process (default thread)')
+    parser_duplicates.add_argument('--no-cache', action='store_true',
+                                   help='do not use the persistent hash cache')
+    parser_duplicates.add_argument('--rebuild-cache', action='store_true',
+                                   help='rehash all files and refresh the hash cache')
+    parser_duplicates.add_argument('--cache-file', metavar='', help='path to the hash cache database')
+    parser_duplicates.add_argument('--partial-size', type=int, default=64 * 1024, metavar='',
+                                   help='bytes hashed at each end of a file before full hashing (default 64 KiB)')
+    parser_duplicates.add_argument('--verify', action='store_true',
+                                   help='confirm duplicates with a byte-by-byte comparison')
+
+    parser_cache = subparsers.add_parser('cache', help='Manage the persistent hash cache')
+    parser_cache.add_argument('action', choices=['stats', 'compact', 'clear'],
+                              help='stats, compact (drop entries of deleted/changed files) or clear')
+    parser_cache.add_argument('--cache-file', metavar='', help='path to the hash cache database')
+
+    parser_sync = subparsers.add_parser('sync', help='Copy only new or changed files to a mirror folder')
+    parser_sync.add_argument('-s', '--src', required=True, metavar='', help='source folder')
+    parser_sync.add_argument('-d', '--dst', required=True, metavar='', help='destination (mirror) folder')
+    parser_sync.add_argument('--checksum', action='store_true',
+                             help='compare file contents (sha256) instead of size and modification time')
+    parser_sync.add_argument('--delete', action='store_true',
+                             help='delete files in the destination that do not exist in the source')
+    parser_sync.add_argument('--delta', action='store_true',
+                             help='update changed files in place, rewriting only changed blocks')
+    parser_sync.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                             help='number of files copied in parallel (default: 1)')
+    parser_sync.add_argument('--reflink', choices=['auto', 'always', 'never'], default='auto', metavar='',
+                             help='clone files on copy-on-write filesystems: auto, always or never (default: auto)')
+    parser_sync.add_argument('--walk-threads', type=int, default=1, metavar='',
+                             help='threads listing directories in parallel (for network filesystems)')
+    parser_sync.add_argument('--no-cache', action='store_true',
+                             help='do not use the persistent hash cache with --checksum')
+    parser_sync.add_argument('--cache-file', metavar='', help='path to the hash cache database')
+
+    parser_trash = subparsers.add_parser('trash', help='List, restore or purge items deleted with --async')
+    parser_trash.add_argument('action', choices=['list', 'restore', 'purge'],
+                              help='list: show items, restore: move an item back, purge: delete for good')
+    parser_trash.add_argument('--id', metavar='', help='trash item id (from trash list)')
+    parser_trash.add_argument('--to', metavar='', help='restore to this path instead of the original one')
+    parser_trash.add_argument('--older-than', type=float, metavar='',
+                              help='purge only items deleted more than this many days ago')
+    parser_trash.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                              help='number of deleting threads for purge (default: 1)')
+
+    parser_index = subparsers.add_parser('index', help='Build or update the directory index')
+    parser_index.add_argument('action', choices=['build', 'update'],
+                              help='build a new index or update it (rescans only changed directories)')
+    parser_index.add_argument('-p', '--path', required=True, metavar='', help='directory to index')
+    parser_index.add_argument('--index-file', metavar='', help='path to the index database')
+    parser_index.add_argument('--walk-threads', type=int, default=1, metavar='',
+                              help='threads listing directories in parallel')
+
+    parser_batch = subparsers.add_parser('batch', help='Run many operations from a JSONL/CSV manifest')
+    parser_batch.add_argument('-m', '--manifest', required=True, metavar='',
+                              help='manifest file (.jsonl or .csv, - for stdin), one operation per line')
+    parser_batch.add_argument('-j', '--jobs', type=int, default=1, metavar='',
+                              help='number of operations run in parallel (default: 1)')
+    parser_batch.add_argument('--manifest-format', choices=['jsonl', 'csv'], metavar='',
+                              help='manifest format, guessed from the file extension by default')
+    parser_batch.add_argument('-o', '--output', metavar='', help='write the NDJSON results to a file')
+
+    parser_serve = subparsers.add_parser('serve', help='Run commands sent as JSON over a unix socket')
+    parser_serve.add_argument('--socket', required=True, metavar='', help='path of the unix socket')
+    parser_serve.add_argument('-j', '--jobs', type=int, default=4, metavar='',
+                              help='number of requests executed in parallel (default: 4)')
+
+    for name, subparser in subparsers.choices.items():
+        if name not in ('batch', 'serve'):
+            subparser.add_argument('--format', choices=['text', 'ndjson', 'csv'], default='text', metavar='',
+                                   help='output format: text, ndjson or csv (default: text)')
+
+    parser.subcommands = subparsers.choices
+    return parser
@@ -1,28 +1,36 @@
 import os
-import shutil
 import logging
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import copy_engine, output, journal as journal_mod
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
 
 
 def run(args):
     """
-    Copies a file from source to destination.
+    Copies a file or a directory tree from source to destination.
 
     If the destination file already exists in the same folder as the source,
     a new file is created with the prefix "copy_" to avoid overwriting.
+    Files are cloned on copy-on-write filesystems (btrfs, XFS) and otherwise
+    copied with the zero-copy paths of the copy engine when the platform
+    supports them; files of a directory tree are copied on a worker
+    pool. Throughput is printed at the end.
 
     :param:
             args: Namespace: Arguments from argparse.
-            src: str: Path to the source file.
+            src: str: Path to the source file or directory.
             dst: str: Path to the destination file or folder.
+            jobs: int (optional): Number of files copied in parallel.
+            buffer_size: int (optional): Size of the fallback copy buffer in bytes.
+            no_journal: bool (optional): Do not record progress (default for programmatic use).
+            journal: str (optional): Path to the journal file.
+            resume: bool (optional): Continue an interrupted copy recorded in the journal.
+            verify_hash: bool (optional): Compare contents before skipping journaled data.
+            reflink: str (optional): 'auto' (default) clones files on copy-on-write filesystems,
+                'always' fails when cloning is not possible, 'never' always copies the data.
+            delta: bool (optional): Update an existing destination file in place, rewriting only changed blocks.
+            format: str (optional): Output format: 'text', 'ndjson' or 'csv'.
     :raises:
             FileNotFoundError: If the source file does not exist.
             NotADirectoryError: Path is not a directory.
@@ -32,34 +40,80 @@ def run(args):
     """
     src = args.src
     dst = args.dst
+    jobs = getattr(args, 'jobs', None) or 1
+    buffer_size = getattr(args, 'buffer_size', None) or copy_engine.DEFAULT_BUFFER_SIZE
+    reflink = getattr(args, 'reflink', None) or 'auto'
 
-    logging.info(f"Copy command started: src={src}, dst={dst}")
+    log.info(f"Copy command started: src={src}, dst={dst}, jobs={jobs}")
 
     if not os.path.exists(src):
-        logging.error(f'Source file does not exist: {src}')
+        log.error(f'Source file does not exist: {src}')
         raise FileNotFoundError(f'Source file does not exist: {src}')
 
     if not os.path.isdir(dst):
-        logging.error(f'Destination path is not a directory: {dst}')
+        log.error(f'Destination path is not a directory: {dst}')
         raise NotADirectoryError(f'Path is not a directory: {dst}')
 
+    out = output.from_args(args, ('src', 'dst', 'files', 'bytes', 'skipped', 'errors', 'seconds',
+                                  'blocks', 'rewritten', 'error'))
+
     if os.path.isdir(dst):
-        filename = os.path.basename(src)
+        filename = os.path.basename(os.path.normpath(src))
         dst_file = os.path.join(dst, filename)
 
-        if os.path.exists(dst_file):
+        resumed = [path for path in (dst_file, os.path.join(dst, f'copy_{filename}'))
+                   if getattr(args, 'resume', False)
+                   and os.path.exists(journal_mod.journal_path_from_args(src, path, args))]
+        if resumed:
+            dst_file = resumed[0]
+            log.info(f'Resuming interrupted copy into: {dst_file}')
+        elif getattr(args, 'delta', False) and os.path.isfile(src) and os.path.isfile(dst_file):
+            blocks, rewritten, written = copy_engine.delta_copy(src, dst_file)
+            log.info(f'Delta copy {src} to {dst_file}: {rewritten} of {blocks} blocks rewritten')
+            with out:
+                out.emit(f'File {src} updated in {dst}: {rewritten} of {blocks} blocks rewritten '
+                         f'({written} bytes written)',
+                         src=src, dst=dst_file, blocks=blocks, rewritten=rewritten, bytes=written)
+            return dst_file
+        elif os.path.exists(dst_file):
             dst_file = os.path.join(dst, f'copy_{filename}')
-            logging.warning(f'File already exists in destination. Renaming to: {dst_file}')
+            log.warning(f'File already exists in destination. Renaming to: {dst_file}')
     else:
         dst_file = dst
 
+    journal = journal_mod.open_from_args(src, dst_file, args)
+    verify = getattr(args, 'verify_hash', False)
+    stats = copy_engine.CopyStats()
+
+    def on_error(src_path, dst_path, error):
+        out.emit(f'Error copying {src_path} to {dst_path}: {error}', src=src_path, dst=dst_path, error=str(error))
+
     try:
-        shutil.copy2(src, dst_file)
-        logging.info(f'File copied successfully: {src} to {dst_file}')
-        print(f'File {src} copied to {dst}')
+        if os.path.isdir(src):
+            copy_engine.copy_tree(src, dst_file, jobs, buffer_size, stats, journal, verify, reflink, on_error)
+        elif journal is not None:
+            stats.add(copy_engine.copy_file_journaled(src, dst_file, journal, verify, buffer_size, reflink))
+        else:
+            stats.add(copy_engine.copy_file(src, dst_file, buffer_size, reflink=reflink))
+        log.info(f'File copied successfully: {src} to {dst_file}')
+        out.emit(f'File {src} copied to {dst}')
     except PermissionError as e:
-        logging.error(f'Permission denied while copying {src} to {dst_file}: {e}')
+        log.error(f'Permission denied while copying {src} to {dst_file}: {e}')
         raise PermissionError(
             f'Permission denied while copying {src} to {dst_file}: {e}. Maybe you forget filename in {src}')
+    finally:
+        out.flush()
+        if journal is not None:
+            journal.close()
+
+    if journal is not None and not stats.errors:
+        journal.remove()
+    log.info(f'Copy throughput: {stats.report()}')
+    with out:
+        out.emit(f'Copied {stats.report()}', src=src, dst=dst_file, **stats.as_record())
+        if stats.errors:
+            out.emit(f'{stats.errors} files could not be copied, see the log for details')
+            if journal is not None:
+                out.emit('Rerun with --resume to continue the copy')
 
     return dst_file
@@ -0,0 +1,434 @@
+import os
+import time
+import errno
+import shutil
+import logging
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from functools import partial
+
+from features import walker
+from features.hashing import parallel_map
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# large files record their progress in the journal after every CHECKPOINT_BYTES
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+# delta copies compare files in blocks of this size, DELTA_BATCH_BLOCKS blocks per read
+DEFAULT_BLOCK_SIZE = 128 * 1024
+DELTA_BATCH_BLOCKS = 64
+
+# linux/fs.h: _IOW(0x94, 9, int), clone a whole file (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+REFLINK_MODES = ('auto', 'always', 'never')
+
+# errors meaning "this copy method is not available here", not "the copy failed"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+_local = threading.local()
+
+
+class CopyStats:
+    """
+    Counters of a copy run used for the throughput report.
+
+    files: int - copied files
+    bytes: int - copied bytes
+    skipped: int - files already complete from an interrupted run
+    errors: int - files that could not be copied
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def add(self, size):
+        if size is None:
+            self.skipped += 1
+            return
+        self.files += 1
+        self.bytes += size
+
+    def elapsed(self):
+        return max(time.perf_counter() - self.started, 1e-9)
+
+    def as_record(self):
+        """
+        Counters for structured output.
+
+        :return: dict
+        """
+        return {'files': self.files, 'bytes': self.bytes, 'skipped': self.skipped, 'errors': self.errors,
+                'seconds': round(self.elapsed(), 3)}
+
+    def report(self):
+        """
+        Build a human-readable throughput summary.
+
+        :return: str
+        """
+        elapsed = self.elapsed()
+        report = (f'{self.files} files, {self.bytes / 1e6:.2f} MB in {elapsed:.2f}s '
+                  f'({self.bytes / 1e6 / elapsed:.2f} MB/s, {self.files / elapsed:.1f} files/s)')
+        if self.skipped:
+            report += f', {self.skipped} already complete'
+        return report
+
+
+def _buffer(size):
+    """Per-thread reusable copy buffer."""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) != size:
+        buffer = _local.buffer = bytearray(size)
+    return buffer
+
+
+def _copy_range(fsrc, fdst, offset, size):
+    """Copy with os.copy_file_range(), return the new offset."""
+    while offset < size:
+        n = os.copy_file_range(fsrc, fdst, size - offset, offset, offset)
+        if n == 0:
+            break
+        offset += n
+    return offset
+
+
+def _sendfile(fsrc, fdst, offset, size):
+    """Copy with os.sendfile(), return the new offset."""
+    os.lseek(fdst, offset, os.SEEK_SET)
+    while offset < size:
+        n = os.sendfile(fdst, fsrc, offset, min(size - offset, 1 << 30))
+        if n == 0:
+            break
+        offset += n
+    return offset
+
+
+def _copy_buffered(fsrc, fdst, offset, buffer_size, end=None):
+    """Copy through a reusable buffer up to `end` (or end of file), return the new offset."""
+    view = memoryview(_buffer(buffer_size))
+    os.lseek(fsrc, offset, os.SEEK_SET)
+    os.lseek(fdst, offset, os.SEEK_SET)
+    while end is None or offset < end:
+        want = len(view) if end is None else min(len(view), end - offset)
+        n = os.readv(fsrc, [view[:want]])
+        if not n:
+            break
+        written = 0
+        while written < n:
+            written += os.write(fdst, view[written:n])
+        offset += n
+    return offset
+
+
+def _copy_span(fsrc, fdst, offset, end, buffer_size, copy_range=True):
+    """Copy bytes [offset, end), trying the zero-copy methods before the buffer."""
+    for method in (copy_range and getattr(os, 'copy_file_range', None) and _copy_range,
+                   getattr(os, 'sendfile', None) and _sendfile):
+        if not method or offset >= end:
+            continue
+        try:
+            offset = method(fsrc, fdst, offset, end)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    if offset < end:
+        offset = _copy_buffered(fsrc, fdst, offset, buffer_size, end)
+    return offset
+
+
+def copy_data(fsrc, fdst, size, offset=0, buffer_size=DEFAULT_BUFFER_SIZE, progress=None, step=None,
+              copy_range=True):
+    """
+    Copy file contents between two open file descriptors.
+
+    Tries the zero-copy paths first (os.copy_file_range, then os.sendfile)
+    and falls back to a reusable per-thread buffer when the kernel or the
+    filesystem does not support them. A method that fails midway hands over
+    to the next one at the offset it reached.
+
+    :param fsrc: int - source file descriptor
+           fdst: int - destination file descriptor
+           size: int - size of the source file
+           offset: int - position to start copying from
+           buffer_size: int - size of the fallback buffer
+           progress: callable(offset) or None - called after every `step` copied bytes
+           step: int or None - distance between progress calls, CHECKPOINT_BYTES if None
+           copy_range: bool - allow os.copy_file_range (it may share extents on CoW filesystems)
+    :return: int - offset after copying (end of data)
+    :raises: OSError if the data cannot be copied
+    """
+    step = step or CHECKPOINT_BYTES
+    while offset < size:
+        end = size if progress is None else min(offset + step, size)
+        reached = _copy_span(fsrc, fdst, offset, end, buffer_size, copy_range)
+        if reached < end:
+            # the file shrank since it was stat-ed
+            return reached
+        offset = reached
+        if progress is not None and offset < size:
+            progress(offset)
+    # the file may have grown since it was stat-ed, copy whatever is left
+    return _copy_buffered(fsrc, fdst, offset, buffer_size)
+
+
+def clone(fsrc, fdst):
+    """
+    Make fdst a copy-on-write clone of fsrc with the FICLONE ioctl.
+
+    Only metadata is written: both files share their data extents until
+    one of them is modified.
+
+    :param fsrc: int - source file descriptor
+           fdst: int - destination file descriptor (opened for writing)
+    :return: bool - True if cloned, False if the platform or filesystem does not support it
+    :raises: OSError for errors other than "not supported"
+    """
+    if fcntl is None or not hasattr(fcntl, 'ioctl'):
+        return False
+    try:
+        fcntl.ioctl(fdst, FICLONE, fsrc)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED or e.errno == errno.ENOTTY:
+            return False
+        raise
+    return True
+
+
+def copy_file(src, dst, buffer_size=DEFAULT_BUFFER_SIZE, offset=0, checkpoint=None, reflink='auto'):
+    """
+    Copy one file with its metadata (like shutil.copy2).
+
+    With reflink='auto' the file is first cloned (see clone()) and copied
+    byte by byte only when the filesystem cannot clone it; 'always' fails
+    instead of copying and 'never' only makes real copies, like the modes
+    of GNU cp --reflink.
+
+    With offset > 0 the first `offset` bytes of dst are kept and copying
+    continues from there. A checkpoint callback is only called once the
+    data before the reported offset has been flushed to disk.
+
+    :param src: str - source file
+           dst: str - destination file path
+           buffer_size: int - size of the fallback buffer
+           offset: int - resume copying at this position of an existing dst
+           checkpoint: callable(offset) or None - called every CHECKPOINT_BYTES
+           reflink: str - 'auto', 'always' or 'never'
+    :return: int - number of bytes copied by this call
+    :raises: OSError if the file cannot be copied or cloned with reflink='always'
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'r+b' if offset else 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        if reflink != 'never' and not offset and clone(fsrc.fileno(), fdst.fileno()):
+            end = size
+        elif reflink == 'always':
+            raise OSError(errno.EOPNOTSUPP, 'Filesystem does not support reflinks', dst)
+        else:
+            progress = None
+            if checkpoint is not None:
+                def progress(position):
+                    os.fsync(fdst.fileno())
+                    checkpoint(position)
+            end = copy_data(fsrc.fileno(), fdst.fileno(), size, offset, buffer_size, progress,
+                            copy_range=reflink != 'never')
+            os.ftruncate(fdst.fileno(), end)
+    shutil.copystat(src, dst)
+    return end - offset
+
+
+def copy_file_journaled(src, dst, journal, verify=False, buffer_size=DEFAULT_BUFFER_SIZE, reflink='auto'):
+    """
+    Copy one file, recording progress in a journal and resuming from it.
+
+    :param src: str - source file
+           dst: str - destination file path
+           journal: journal.Journal - progress of the interrupted and current run
+           verify: bool - also compare contents before trusting the journal
+           buffer_size: int - size of the fallback buffer
+           reflink: str - 'auto', 'always' or 'never', see copy_file()
+    :return: int or None - bytes copied by this call, None if dst was already complete
+    :raises: OSError if the file cannot be copied
+    """
+    st = os.stat(src)
+    done, offset = journal.resume_point(src, dst, st, verify)
+    if done:
+        return None
+    if st.st_size > CHECKPOINT_BYTES:
+        journal.begin(src, st, offset)
+        copied = copy_file(src, dst, buffer_size, offset, partial(journal.checkpoint, src), reflink)
+    else:
+        copied = copy_file(src, dst, buffer_size, offset, reflink=reflink)
+    journal.finish(src, st)
+    return copied
+
+
+def _read_full(fd, view, offset=None):
+    """
+    Fill a buffer from a file descriptor, return the number of bytes read (short only at EOF).
+
+    With an offset the data is read from that position (preadv) and the file position is left alone.
+    """
+    total = 0
+    while total < len(view):
+        if offset is None:
+            n = os.readv(fd, [view[total:]])
+        else:
+            n = os.preadv(fd, [view[total:]], offset + total)
+        if not n:
+            break
+        total += n
+    return total
+
+
+def _same(a, b):
+    """Compare two buffer slices byte for byte (memoryview == compares item by item, bytes == uses memcmp)."""
+    return len(a) == len(b) and a.tobytes() == b.tobytes()
+
+
+def delta_copy(src, dst, block_size=DEFAULT_BLOCK_SIZE, batch_blocks=DELTA_BATCH_BLOCKS):
+    """
+    Update an existing copy in place, rewriting only the blocks that changed.
+
+    Both files are read in batches of `batch_blocks` fixed-size blocks. Both
+    copies are local, so blocks are compared directly instead of through
+    checksums: a batch that is identical in both files is skipped after one
+    comparison, otherwise its blocks are compared one by one and the blocks
+    that differ are rewritten. Finally dst is truncated or extended to the
+    size of src and gets its metadata.
+
+    Blocks are compared at the same offsets only: this is meant for large
+    files modified in place (databases, disk images), not for data shifted
+    by insertions. The update is not atomic - an interrupted delta copy
+    leaves dst partially updated until it is run again.
+
+    :param src: str - source file
+           dst: str - existing destination file
+           block_size: int - size of a compared block in bytes
+           batch_blocks: int - number of blocks read and compared at once
+    :return: tuple(int, int, int) - (blocks compared, blocks rewritten, bytes written)
+    :raises: OSError if a file cannot be read or written
+    """
+    batch = block_size * batch_blocks
+    src_buffer = bytearray(batch)
+    dst_buffer = bytearray(batch)
+    src_view = memoryview(src_buffer)
+    dst_view = memoryview(dst_buffer)
+    blocks = rewritten = written = 0
+
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'r+b', buffering=0) as fdst:
+        fd = fdst.fileno()
+        offset = 0
+        while True:
+            n = _read_full(fsrc.fileno(), src_view)
+            if not n:
+                break
+            # read dst at the batch offset: a short dst stops reading at EOF, and pwrite does not move
+            # the file position, so a sequential read would compare later batches at the wrong offset
+            m = _read_full(fd, dst_view[:n], offset)
+            starts = range(0, n, block_size)
+            blocks += len(starts)
+            # full batches that did not change cost one memcmp of the two buffers
+            if n == m == batch and src_buffer == dst_buffer:
+                offset += n
+                continue
+            for start in starts:
+                end = min(start + block_size, n)
+                if end <= m and _same(src_view[start:end], dst_view[start:end]):
+                    continue
+                os.pwrite(fd, src_view[start:end], offset + start)
+                rewritten += 1
+                written += end - start
+            offset += n
+        os.ftruncate(fd, offset)
+    shutil.copystat(src, dst)
+    return blocks, rewritten, written
+
+
+def _copy_item(item, buffer_size, journal=None, verify=False, reflink='auto'):
+    """Copy a (src, dst) pair, recreating symlinks as symlinks."""
+    src, dst = item
+    if os.path.islink(src):
+        target = os.readlink(src)
+        if journal is not None and os.path.islink(dst) and os.readlink(dst) == target:
+            return None
+        os.symlink(target, dst)
+        return 0
+    if journal is not None:
+        return copy_file_journaled(src, dst, journal, verify, buffer_size, reflink)
+    return copy_file(src, dst, buffer_size, reflink=reflink)
+
+
+def print_error(src, dst, error):
+    """Default error callback of copy_tree(): print the error and continue."""
+    print(f'Error copying {src} to {dst}: {error}')
+
+
+def copy_tree(src, dst, jobs=1, buffer_size=DEFAULT_BUFFER_SIZE, stats=None, journal=None, verify=False,
+              reflink='auto', on_error=print_error):
+    """
+    Copy a directory tree, copying files on a worker pool.
+
+    Directories are created while walking the source, files are copied by
+    `jobs` threads, and directory metadata is applied at the end so that
+    copying files does not change the directory mtimes again. Symlinks are
+    recreated as symlinks.
+
+    With a journal the copy can be resumed: dst may already exist, files
+    the journal lists as complete are skipped and partially copied large
+    files continue where they stopped.
+
+    :param src: str - source directory
+           dst: str - destination directory (must not exist)
+           jobs: int - number of copy workers
+           buffer_size: int - size of the fallback buffer of each worker
+           stats: CopyStats or None - counters to update
+           journal: journal.Journal or None - record progress to resume an interrupted copy
+           verify: bool - compare contents before skipping journaled files
+           reflink: str - 'auto', 'always' or 'never', see copy_file()
+           on_error: callable(src, dst, error) - called for files that cannot be copied
+    :return: CopyStats
+    :raises: FileExistsError if dst already exists and there is no journal
+    """
+    stats = stats or CopyStats()
+    src = os.path.abspath(src)
+    dst = os.path.abspath(dst)
+    resume = journal is not None
+    os.makedirs(dst, exist_ok=resume)
+    directories = [(src, dst)]
+
+    def items():
+        for listing in walker.iter_dirs(src, on_error=walker.log_error):
+            target = os.path.join(dst, os.path.relpath(listing.path, src))
+            for entry in listing.dirs:
+                if entry.is_symlink:
+                    yield entry.path, os.path.join(target, entry.name)
+                else:
+                    os.makedirs(os.path.join(target, entry.name), exist_ok=resume)
+                    directories.append((entry.path, os.path.join(target, entry.name)))
+            for entry in listing.files:
+                yield entry.path, os.path.join(target, entry.name)
+
+    worker = partial(_copy_item, buffer_size=buffer_size, journal=journal, verify=verify, reflink=reflink)
+    for (src_path, dst_path), size, error in parallel_map(worker, items(), jobs):
+        if error is not None:
+            stats.errors += 1
+            log.error('Error copying %s to %s: %s', src_path, dst_path, error)
+            on_error(src_path, dst_path, error)
+            continue
+        stats.add(size)
+
+    for src_dir, dst_dir in reversed(directories):
+        shutil.copystat(src_dir, dst_dir)
+    if journal is not None:
+        journal.commit()
+    return stats
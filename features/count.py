@@ -1,14 +1,9 @@
 import os
 import logging
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
 
 
 def run(args):
@@ -18,6 +13,11 @@ def run(args):
     :param:
             args: Namespace: Arguments from argparse.
             path: str: Path to the directory.
+            walk_threads: int (optional): Threads listing directories in parallel.
+            index: bool (optional): Answer from the directory index instead of the filesystem.
+            index_file: str (optional): Path to the index database.
+            refresh: bool (optional): Update the index incrementally before answering.
+            format: str (optional): Output format: 'text', 'ndjson' or 'csv'.
     :raises:
             FileNotFoundError: If the source file does not exist.
             NotADirectoryError: Path is not a directory.
@@ -26,27 +26,33 @@ def run(args):
             total_files: int: number of files in directory
     """
     path = args.path
+    walk_threads = getattr(args, 'walk_threads', None) or 1
 
-    logging.info(f'Count command started: path={path}')
+    log.info(f'Count command started: path={path}')
 
     if not os.path.exists(path):
-        logging.error(f'Path does not exist: {path}')
+        log.error(f'Path does not exist: {path}')
         raise FileNotFoundError(f'Path does not exist: {path}')
 
     if not os.path.isdir(path):
-        logging.error(f'Path is not a directory: {path}')
+        log.error(f'Path is not a directory: {path}')
         raise NotADirectoryError(f'Path is not a directory: {path}')
 
-    total_files = 0
-    try:
-        for root, dirs, files in os.walk(path):
-            total_files += len(files)
-    except PermissionError as e:
-        logging.error(f'Permission denied while accessing {path}: {e}')
-        raise PermissionError(f'Permission denied while accessing {path}: {e}')
-
-    logging.info(f'Total files counted in {path}: {total_files}')
-
-    print(f'Total files in {path}: {total_files}')
+    idx = None
+    if getattr(args, 'index', False) or getattr(args, 'refresh', False):
+        from features import index
+        idx = index.open_from_args(path, args)
+    if idx is not None:
+        with idx:
+            total_files = idx.count_files(path)
+    else:
+        total_files = 0
+        for listing in walker.iter_dirs(path, on_error=walker.log_error, threads=walk_threads):
+            total_files += len(listing.files)
+
+    log.info(f'Total files counted in {path}: {total_files}')
+
+    with output.from_args(args, ('path', 'files')) as out:
+        out.emit(f'Total files in {path}: {total_files}', path=path, files=total_files)
 
     return total_files
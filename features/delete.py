@@ -1,52 +1,210 @@
 import os
+import time
 import shutil
 import logging
+from itertools import groupby
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
+from features.hashing import parallel_map
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
+
+# paths unlinked per worker task and seconds between progress lines
+DELETE_BATCH_SIZE = 256
+PROGRESS_INTERVAL = 2.0
+
+
+class DeleteStats:
+    """
+    Counters of a tree deletion.
+
+    files: int - deleted (or, in a dry run, found) files and symlinks
+    dirs: int - deleted (or found) directories
+    bytes: int - size of the files, only counted in a dry run
+    errors: int - entries that could not be deleted
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._reported = self.started
+
+    def report(self):
+        """
+        Build a human-readable summary.
+
+        :return: str
+        """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (f'{self.files} files, {self.dirs} directories in {elapsed:.2f}s '
+                f'({self.files / elapsed:.1f} files/s)')
+
+    def progress(self, force=False):
+        """Print a progress line at most every PROGRESS_INTERVAL seconds."""
+        now = time.perf_counter()
+        if force or now - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            print(f'  ... {self.report()}', flush=True)
+
+
+def _record(stats, path, error, what):
+    if error is None:
+        return True
+    stats.errors += 1
+    log.error('Error deleting %s %s: %s', what, path, error)
+    return False
+
+
+def delete_tree(path, jobs=1, dry_run=False, walk_threads=1, batch_size=DELETE_BATCH_SIZE, stats=None,
+                progress=False):
+    """
+    Delete a directory tree with parallel unlinks.
+
+    The tree is walked with scandir while files are unlinked on `jobs`
+    threads in batches of `batch_size` paths. Directories are removed
+    afterwards, deepest level first; directories of one level are removed
+    in parallel as well. Symlinks are unlinked, never followed.
+
+    With dry_run=True nothing is deleted; the files, directories and bytes
+    that would be removed are counted instead.
+
+    :param path: str - directory to delete
+           jobs: int - number of deleting threads
+           dry_run: bool - only count what would be deleted
+           walk_threads: int - threads listing directories in parallel
+           batch_size: int - paths per worker task
+           stats: DeleteStats or None - counters to update
+           progress: bool - print progress lines while deleting
+    :return: DeleteStats
+    """
+    stats = stats if stats is not None else DeleteStats()
+    directories = []
+
+    def files():
+        for listing in walker.iter_dirs(path, stat=dry_run, on_error=walker.log_error, threads=walk_threads):
+            directories.append((listing.depth, listing.path))
+            for entry in listing.files + [d for d in listing.dirs if d.is_symlink]:
+                if dry_run and not entry.is_symlink:
+                    stats.bytes += entry.stat.st_size
+                yield entry.path
+
+    if dry_run:
+        for _ in files():
+            stats.files += 1
+            if progress:
+                stats.progress()
+        stats.dirs = len(directories)
+        return stats
+
+    for file_path, _, error in parallel_map(os.unlink, files(), jobs, batch_size=batch_size):
+        if _record(stats, file_path, error, 'file'):
+            stats.files += 1
+        if progress:
+            stats.progress()
+
+    directories.sort(reverse=True)
+    for _, level in groupby(directories, key=lambda item: item[0]):
+        for dir_path, _, error in parallel_map(os.rmdir, [p for _, p in level], jobs, batch_size=batch_size):
+            if _record(stats, dir_path, error, 'directory'):
+                stats.dirs += 1
+        if progress:
+            stats.progress()
+    return stats
 
 
 def run(args):
     """
     Deletes a file or directory.
 
+    With --async the target is renamed into a trash directory on the same
+    filesystem and the command returns at once; `trash purge` reclaims the
+    space later and `trash restore` undoes it.
+
+    With --jobs N directories are deleted by the parallel engine (see
+    delete_tree()) with progress lines; --dry-run only reports how many
+    files and bytes would be deleted.
+
     :param:
             args: Namespace: Arguments from argparse.
             source: str: Path to the file or directory to delete.
+            jobs: int (optional): Number of deleting threads.
+            dry_run: bool (optional): Report what would be deleted without deleting.
+            walk_threads: int (optional): Threads listing directories in parallel.
+            async_delete: bool (optional): Only rename the target into the trash (see trash.py).
+            format: str (optional): Output format: 'text', 'ndjson' or 'csv'.
     :raises:
             FileNotFoundError: If the target does not exist.
             PermissionError: If there is no permission to delete.
+            OSError: If the parallel engine could not delete some entries.
             Exception: Target is neither file nor directory.
     :return:
     """
     target = args.src
+    jobs = getattr(args, 'jobs', None) or 1
+    dry_run = getattr(args, 'dry_run', False)
+    walk_threads = getattr(args, 'walk_threads', None) or 1
 
-    logging.info(f'Delete command started: target={target}')
+    log.info(f'Delete command started: target={target}, jobs={jobs}, dry_run={dry_run}')
 
     if not os.path.exists(target):
-        logging.error(f'Target does not exist: {target}')
+        log.error(f'Target does not exist: {target}')
         raise FileNotFoundError(f'Target does not exist: {target}')
 
+    out = output.from_args(args, ('path', 'action', 'trash_id', 'files', 'dirs', 'bytes', 'errors'))
+
+    if getattr(args, 'async_delete', False) and not dry_run:
+        from features import trash
+        item_id = trash.move_to_trash(target)
+        log.info(f'Moved to trash: {target} (id {item_id})')
+        with out:
+            out.emit(f'Moved to trash: {target} (id {item_id})', path=target, action='trash', trash_id=item_id)
+        return
+
+    if dry_run:
+        if os.path.isdir(target) and not os.path.islink(target):
+            stats = delete_tree(target, dry_run=True, walk_threads=walk_threads)
+        else:
+            stats = DeleteStats()
+            stats.files = 1
+            stats.bytes = os.lstat(target).st_size
+        log.info(f'Dry run for {target}: {stats.files} files, {stats.dirs} directories, {stats.bytes} bytes')
+        with out:
+            out.emit(f'Would delete {stats.files} files, {stats.dirs} directories, {stats.bytes} bytes: {target}',
+                     path=target, action='dry_run', files=stats.files, dirs=stats.dirs, bytes=stats.bytes)
+        return
+
+    if jobs > 1 and os.path.isdir(target) and not os.path.islink(target):
+        stats = delete_tree(target, jobs, walk_threads=walk_threads, progress=not out.structured)
+        log.info(f'Parallel delete of {target}: {stats.report()}, {stats.errors} errors')
+        with out:
+            record = dict(path=target, action='delete', files=stats.files, dirs=stats.dirs, errors=stats.errors)
+            if stats.errors:
+                out.emit(f'Deleted {stats.report()}, {stats.errors} entries could not be deleted, see the log',
+                         **record)
+                out.flush()
+                raise OSError(f'Could not delete {stats.errors} entries in {target}')
+            out.emit(f'Deleted {stats.report()}', **record)
+            out.emit(f'Successfully deleted: {target}')
+        return
+
     try:
         if os.path.isfile(target):
             os.remove(target)
-            logging.info(f"File deleted: {target}")
+            log.info(f"File deleted: {target}")
         elif os.path.isdir(target):
             shutil.rmtree(target)
-            logging.info(f"Directory deleted: {target}")
+            log.info(f"Directory deleted: {target}")
         else:
-            logging.error(f'Target is neither file nor directory: {target}')
+            log.error(f'Target is neither file nor directory: {target}')
             raise Exception(f'Target is neither file nor directory: {target}')
     except PermissionError as e:
-        logging.error(f'Permission denied while deleting {target}: {e}')
+        log.error(f'Permission denied while deleting {target}: {e}')
         raise PermissionError(f'Permission denied while deleting {target}: {e}')
 
-    logging.info(f'Successfully deleted: {target}')
+    log.info(f'Successfully deleted: {target}')
 
-    print(f'Successfully deleted: {target}')
+    with out:
+        out.emit(f'Successfully deleted: {target}', path=target, action='delete')
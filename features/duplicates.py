@@ -1,79 +1,338 @@
 import os
-import hashlib
 import logging
+from functools import partial
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
+from features.hashing import hash_file, hash_file_ends, DEFAULT_CHUNK_SIZE, DEFAULT_MMAP_THRESHOLD
+from features.hash_cache import open_from_args, cached_hash, cached_map
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
 
+DEFAULT_PARTIAL_SIZE = 64 * 1024
 
-def file_hash(path):
+# --verify keeps the files of a group open while comparing them, up to this many
+VERIFY_OPEN_FILES = 64
+
+
+def file_hash(path, chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=None, cache=None):
     """
     Calculate SHA256 hash of a file.
 
+    The file is streamed in chunks, so memory usage does not grow with file size.
+    If a cache is given, the file is only read when its metadata changed
+    since the digest was stored.
+
     :param path: str - path to the file
+           chunk_size: int - size of a single read in bytes
+           mmap_threshold: int or None - hash files of at least this size through mmap
+           cache: HashCache or None - persistent digest cache
     :return: str - hex digest of SHA256 hash
     :raises: Exception if file cannot be read or hashed
     """
-    hash_func = hashlib.sha256()
     try:
-        with open(path, 'rb') as f:
-            data = f.read()
-            hash_func.update(data)
-        logging.info(f'Hashed file: {path}')
-        return hash_func.hexdigest()
+        digest = cached_hash(partial(_full_digest, chunk_size=chunk_size, mmap_threshold=mmap_threshold),
+                             path, 'sha256', cache)
+        log.info('Hashed file: %s', path)
+        return digest
     except Exception as e:
-        logging.error(f'Error hashing file {path}: {e}')
+        log.error('Error hashing file %s: %s', path, e)
         raise
 
 
+class PipelineStats:
+    """
+    Counters collected by the duplicate search pipeline.
+
+    For every stage (size, partial, full, verify) it stores how many files
+    entered the stage, how many candidates were left after it and how many
+    bytes were read from disk. candidate_bytes is the size of all files that
+    share their size with another file, i.e. what hashing every candidate
+    completely would read.
+    """
+
+    STAGES = ('size', 'partial', 'full', 'verify')
+
+    def __init__(self):
+        self.files_in = dict.fromkeys(self.STAGES, 0)
+        self.files_out = dict.fromkeys(self.STAGES, 0)
+        self.bytes_read = dict.fromkeys(self.STAGES, 0)
+        self.total_bytes = 0
+        self.candidate_bytes = 0
+
+    def report(self):
+        """
+        Build a human-readable summary of the pipeline stages.
+
+        :return: list of str - one line per stage plus a total line
+        """
+        lines = []
+        for stage in self.STAGES:
+            lines.append(f'  {stage:<8} in={self.files_in[stage]:<8} candidates={self.files_out[stage]:<8} '
+                         f'read={self.bytes_read[stage]} B')
+        read = sum(self.bytes_read.values())
+        line = (f'  total read {read} B ({self.total_bytes} B in all files, '
+                f'{self.candidate_bytes} B to fully hash every same-size candidate')
+        if read < self.candidate_bytes:
+            line += f', {self.candidate_bytes - read} B saved'
+        lines.append(line + ')')
+        return lines
+
+
+def _partial_digest(path, partial_size, chunk_size):
+    """Hash the first and last partial_size bytes of a file."""
+    return hash_file_ends(path, partial_size, 'sha256', chunk_size)[0]
+
+
+def _full_digest(path, chunk_size, mmap_threshold):
+    """Hash the whole file."""
+    return hash_file(path, 'sha256', chunk_size=chunk_size, mmap_threshold=mmap_threshold)
+
+
+def _print_error(path, error):
+    print(f'Error hashing {path}: {error}')
+
+
+def _regroup(groups, hasher, cost, stats, stage, method, cache=None, jobs=1, executor='thread',
+             on_error=_print_error):
+    """
+    Split each candidate group by digest and keep only groups with 2+ files.
+
+    Digests of all files are computed on a worker pool when jobs > 1
+    and taken from the cache when it holds a valid entry.
+
+    :param groups: list of lists of (path, size)
+           hasher: callable(path) -> str - computes the digest, picklable
+           cost: callable(size) -> int - bytes read by hasher for a file of this size
+           stats: PipelineStats - counters to update
+           stage: str - stage name for the counters
+           method: str - cache key for the digest kind
+           cache: HashCache or None - persistent digest cache
+           jobs: int - number of workers
+           executor: str - worker pool type ('thread' or 'process')
+           on_error: callable(path, error) - called for files that cannot be read
+    :return: list of (digest, list of (path, size))
+    """
+    owners = [(index, item) for index, group in enumerate(groups) for item in group]
+    buckets = [dict() for _ in groups]
+    stats.files_in[stage] += len(owners)
+
+    results = cached_map(hasher, [path for _, (path, _) in owners], method, cache, jobs, executor)
+    for (index, item), (path, digest, error, cached) in zip(owners, results):
+        if error is not None:
+            log.error('Error hashing %s: %s', path, error)
+            on_error(path, error)
+            continue
+        log.info('Hashed file (%s): %s', stage, path)
+        if not cached:
+            stats.bytes_read[stage] += cost(item[1])
+        buckets[index].setdefault(digest, []).append(item)
+
+    result = []
+    for group_buckets in buckets:
+        for digest, bucket in group_buckets.items():
+            if len(bucket) > 1:
+                stats.files_out[stage] += len(bucket)
+                result.append((digest, bucket))
+    return result
+
+
+def _identical_sets(group, stats, chunk_size):
+    """
+    Split a group of same-size files into sets of byte-identical files in one pass.
+
+    All files are read chunk by chunk in lockstep and split at every offset
+    by the chunk they hold, so each file is read at most once however large
+    the group is. Groups of more than VERIFY_OPEN_FILES files are reopened
+    per chunk instead of keeping every file open.
+
+    :param group: list of (path, size)
+           stats: PipelineStats - counters to update
+           chunk_size: int - size of a single read in bytes
+    :return: list of lists of (path, size) - sets of 2+ identical files
+    """
+    keep_open = len(group) <= VERIFY_OPEN_FILES
+    handles = dict()
+
+    def read(path, offset):
+        if keep_open:
+            if path not in handles:
+                handles[path] = open(path, 'rb')
+            return handles[path].read(chunk_size)
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(chunk_size)
+
+    result = []
+    pending = [(0, list(group))]
+    try:
+        while pending:
+            offset, members = pending.pop()
+            # equal chunks share one dict key, so only distinct chunks are held in memory
+            by_chunk = dict()
+            for item in members:
+                try:
+                    data = read(item[0], offset)
+                except OSError as e:
+                    log.error('Error comparing %s: %s', item[0], e)
+                    continue
+                stats.bytes_read['verify'] += len(data)
+                by_chunk.setdefault(data, []).append(item)
+            for data, same in by_chunk.items():
+                if len(same) < 2:
+                    continue
+                if data:
+                    pending.append((offset + len(data), same))
+                else:
+                    result.append(same)
+    finally:
+        for f in handles.values():
+            f.close()
+    return result
+
+
+def _verify(groups, stats, chunk_size):
+    """
+    Confirm candidate groups by comparing file contents byte by byte.
+
+    :param groups: list of (digest, list of (path, size))
+           stats: PipelineStats - counters to update
+           chunk_size: int - size of a single read in bytes
+    :return: list of (digest, list of (path, size))
+    """
+    result = []
+    for digest, group in groups:
+        stats.files_in['verify'] += len(group)
+        for same in _identical_sets(group, stats, chunk_size):
+            stats.files_out['verify'] += len(same)
+            result.append((digest, same))
+    return result
+
+
+def find_duplicates(path, chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=None,
+                    partial_size=DEFAULT_PARTIAL_SIZE, verify=False, jobs=1, executor='thread',
+                    cache=None, on_error=_print_error):
+    """
+    Find groups of identical files under a directory.
+
+    Files go through a pipeline where each stage only looks at the
+    candidates that survived the previous one:
+        1. size    - group by st_size, files with a unique size are dropped
+        2. partial - hash the first and last partial_size bytes
+        3. full    - SHA256 of the whole file (skipped for files that were
+                     already read completely by the partial stage)
+        4. verify  - optional byte-by-byte comparison
+
+    :param path: str - directory to search in
+           chunk_size: int - size of a single read in bytes
+           mmap_threshold: int or None - hash files of at least this size through mmap
+           partial_size: int - bytes hashed at each end of a file in the partial stage
+           verify: bool - compare candidates byte by byte before reporting
+           jobs: int - number of hashing workers
+           executor: str - worker pool type ('thread' or 'process')
+           cache: HashCache or None - persistent cache for partial and full digests
+           on_error: callable(path, error) - called for files that cannot be read
+    :return: tuple(list of (str, list of str), PipelineStats) - groups of
+             duplicate paths sorted by path with their SHA256 digest,
+             and pipeline counters
+    """
+    stats = PipelineStats()
+
+    by_size = dict()
+    for entry in walker.walk(path, stat=True, on_error=walker.log_error):
+        size = entry.stat.st_size
+        stats.files_in['size'] += 1
+        stats.total_bytes += size
+        by_size.setdefault(size, []).append((entry.path, size))
+
+    groups = [group for group in by_size.values() if len(group) > 1]
+    stats.files_out['size'] = sum(len(group) for group in groups)
+    stats.candidate_bytes = sum(size for group in groups for _, size in group)
+
+    groups = _regroup(groups, partial(_partial_digest, partial_size=partial_size, chunk_size=chunk_size),
+                      lambda size: min(size, 2 * partial_size), stats, 'partial',
+                      f'sha256-ends-{partial_size}', cache, jobs, executor, on_error)
+
+    hashed = []
+    full = []
+    for digest, group in groups:
+        if group[0][1] <= 2 * partial_size:
+            # the partial stage already hashed these files completely
+            hashed.append((digest, group))
+        else:
+            full.append(group)
+
+    hashed.extend(_regroup(full, partial(_full_digest, chunk_size=chunk_size, mmap_threshold=mmap_threshold),
+                           lambda size: size, stats, 'full', 'sha256', cache, jobs, executor, on_error))
+
+    if verify:
+        hashed = _verify(hashed, stats, chunk_size)
+
+    result = [(digest, sorted(p for p, _ in group)) for digest, group in hashed]
+    return sorted(result, key=lambda x: x[1]), stats
+
+
 def run(args):
     """
     Search for duplicate files in a directory and print groups of duplicates.
 
-    Uses SHA256 hashing to identify identical files.
+    Files are compared in stages (size, partial hash, full SHA256 hash and an
+    optional byte-by-byte check), so only files that may have a duplicate are
+    read. A summary of files and bytes per stage is printed at the end.
 
     :param args: argparse.Namespace with field:
         - path: str, path to directory for duplicate search
+        - chunk_size: int (optional), read size in bytes
+        - mmap: bool (optional), hash large files through mmap
+        - partial_size: int (optional), bytes hashed at each end in the partial stage
+        - verify: bool (optional), confirm duplicates byte by byte
+        - jobs: int (optional), number of hashing workers, default 1
+        - executor: str (optional), worker pool type ('thread' or 'process')
+        - no_cache: bool (optional), do not use the persistent hash cache
+        - rebuild_cache: bool (optional), rehash all files and refresh the cache
+        - cache_file: str (optional), path to the cache database
+        - format: str (optional), output format: 'text', 'ndjson' or 'csv'
     :return: None, prints duplicates to stdout and logs actions/errors
     """
     path = args.path
+    chunk_size = getattr(args, 'chunk_size', None) or DEFAULT_CHUNK_SIZE
+    mmap_threshold = DEFAULT_MMAP_THRESHOLD if getattr(args, 'mmap', False) else None
+    partial_size = getattr(args, 'partial_size', None) or DEFAULT_PARTIAL_SIZE
+    verify = getattr(args, 'verify', False)
+    jobs = getattr(args, 'jobs', None) or 1
+    executor = getattr(args, 'executor', None) or 'thread'
 
-    logging.info(f'Started duplicate search in directory: {path}')
+    log.info(f'Started duplicate search in directory: {path}')
 
+    out = output.from_args(args, ('group', 'hash', 'path', 'error'))
     if not os.path.isdir(path):
-        logging.error(f'Path is not a directory: {path}')
-        print(f'Path is not a directory: {path}')
+        log.error(f'Path is not a directory: {path}')
+        with out:
+            out.emit(f'Path is not a directory: {path}', path=path, error='not a directory')
         return
 
-    hashes = dict()
+    def on_error(file_path, error):
+        out.emit(f'Error hashing {file_path}: {error}', path=file_path, error=str(error))
 
-    for root, subfolders, files in os.walk(path):
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            try:
-                h = file_hash(filepath)
-                if h in hashes:
-                    hashes[h].append(filepath)
-                else:
-                    hashes[h] = [filepath]
-            except Exception as e:
-                logging.error(f'Error hashing {filepath}: {e}')
-                print(f'Error hashing {filepath}: {e}')
-
-    duplicates_found = False
-    for h, files_list in hashes.items():
-        if len(files_list) > 1:
-            duplicates_found = True
-            print(f'Duplicate files (hash={h}):')
+    with out:
+        cache = open_from_args(args)
+        try:
+            groups, stats = find_duplicates(path, chunk_size, mmap_threshold, partial_size, verify,
+                                            jobs, executor, cache, on_error)
+        finally:
+            if cache is not None:
+                log.info(f'Hash cache: {cache.hits} hits, {cache.misses} misses')
+                cache.close()
+
+        for group, (h, files_list) in enumerate(groups, 1):
+            out.emit(f'Duplicate files (hash={h}):')
             for f in files_list:
-                print(f'  {f}')
-            print()
+                out.emit(f'  {f}', group=group, hash=h, path=f)
+            out.emit('')
+
+        if not groups:
+            out.emit('No duplicates found.')
 
-    if not duplicates_found:
-        print('No duplicates found.')
+        out.emit('Pipeline stages:')
+        for line in stats.report():
+            log.info(line.strip())
+            out.emit(line)
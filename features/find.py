@@ -1,56 +1,393 @@
 import os
 import re
+import time
 import logging
+from fnmatch import translate
+from datetime import datetime
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
+
+TYPES = ('f', 'd', 'l')
+
+_SIZE = re.compile(r'(\d+(?:[.]\d*)?)\s*([KMGT]?)(?:i?B)?', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+_AGE = re.compile(r'(\d+(?:[.]\d*)?)\s*([smhdw]?)')
+_AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, '': 86400, 'w': 7 * 86400}
+
+# '*.ext' globs and '.*\.ext' regexes only test the end of a name and are answered by a suffix lookup
+_GLOB_SUFFIX = re.compile(r'[*]((?:[.][\w-]+)+)')
+_REGEX_SUFFIX = re.compile(r'[.][*]((?:(?:\\[.]|\[[.]\])[\w-]+)+)[$]?')
+_REGEX_DOT = re.compile(r'\\[.]|\[[.]\]')
+# patterns that cannot be part of the combined regex: backreferences and global inline flags
+_STANDALONE = re.compile(r'\\[1-9]|[(][?]P=|^[(][?][aiLmsux]+[)]')
+
+
+def parse_size(value):
+    """
+    Parse a size like '4096', '10K', '1.5M' or '2GiB' (binary units).
+
+    :param value: str or int - size
+    :return: int - bytes
+    :raises: ValueError for an invalid size
+    """
+    if isinstance(value, int):
+        return value
+    match = _SIZE.fullmatch(str(value).strip())
+    if match is None:
+        raise ValueError(f'Invalid size: {value}')
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_time(value, now=None):
+    """
+    Parse a point in time given as an age ('30m', '12h', '7d', '2w'; a bare number
+    is days) or as an ISO date or datetime ('2024-05-01', '2024-05-01T12:00').
+
+    :param value: str, int or float - age, date, or a timestamp in seconds when a number is passed
+           now: float or None - reference for ages, time.time() if None
+    :return: float - timestamp in seconds
+    :raises: ValueError for an invalid value
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    match = _AGE.fullmatch(text)
+    if match is not None:
+        return (time.time() if now is None else now) - float(match.group(1)) * _AGE_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f'Invalid time: {value} (use an age like 7d or a date like 2024-05-01)')
+
+
+class PatternSet:
+    """
+    Many file name patterns matched in one pass over a name.
+
+    Regex patterns must match the whole name, globs work like fnmatch.
+    Simple suffix patterns ('*.log', '*.tar.gz', r'.*[.]log') go into a set
+    looked up with the suffixes of the name; all other patterns are joined
+    into one alternation, so a name that matches nothing is rejected by a
+    single regex search however many patterns there are. Only names that
+    match are checked further, to collect every pattern they hit.
+
+    Usage:
+        patterns = PatternSet([r'core[.][0-9]+'], ['*.log', '*.gz'])
+        patterns.match('app.log')   # ['*.log']
+    """
+
+    def __init__(self, regexes=(), globs=()):
+        """
+        :param regexes: iterable of str or re.Pattern - regexes the whole name must match
+               globs: iterable of str - glob patterns
+        :raises: ValueError if a regex is invalid
+        """
+        self.patterns = []
+        self.suffixes = dict()
+        combined = []
+        self.standalone = []
+        for kind, pattern in [('regex', p) for p in regexes] + [('glob', p) for p in globs]:
+            number = len(self.patterns)
+            self.patterns.append(pattern if isinstance(pattern, str) else pattern.pattern)
+            suffix = self._suffix(kind, pattern)
+            if suffix is not None:
+                self.suffixes.setdefault(suffix, []).append(number)
+                continue
+            if kind == 'glob':
+                pattern = translate(pattern)
+            regex = _compile(pattern)
+            if isinstance(pattern, str) and not _STANDALONE.search(pattern):
+                combined.append((number, regex))
+            else:
+                self.standalone.append((number, regex))
+        self.combined = None
+        if combined:
+            # the wrapper groups are named after the pattern number, lastgroup tells which alternative matched
+            try:
+                self.combined = re.compile('|'.join(f'(?P<_p{number}>{regex.pattern})' for number, regex in combined))
+            except re.error:
+                # e.g. two patterns using the same group name
+                self.standalone = sorted(self.standalone + combined, key=lambda item: item[0])
+                combined = []
+        self.regexes = dict(combined)
+
+    @staticmethod
+    def _suffix(kind, pattern):
+        if not isinstance(pattern, str):
+            return None
+        if kind == 'glob':
+            match = _GLOB_SUFFIX.fullmatch(pattern)
+            return match.group(1) if match else None
+        match = _REGEX_SUFFIX.fullmatch(pattern)
+        return _REGEX_DOT.sub('.', match.group(1)) if match else None
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def match(self, name):
+        """
+        Patterns a name matches.
+
+        :param name: str - file name
+        :return: list of str - matched patterns in the order they were given, empty if none
+        """
+        hits = []
+        if self.suffixes:
+            dot = name.find('.')
+            while dot != -1:
+                hits.extend(self.suffixes.get(name[dot:], ()))
+                dot = name.find('.', dot + 1)
+        if self.combined is not None:
+            match = self.combined.fullmatch(name)
+            if match is not None:
+                first = int(match.lastgroup[2:])
+                hits.append(first)
+                hits.extend(number for number, regex in self.regexes.items()
+                            if number > first and regex.fullmatch(name))
+        for number, regex in self.standalone:
+            if regex.fullmatch(name):
+                hits.append(number)
+        if len(hits) > 1:
+            hits.sort()
+        return [self.patterns[number] for number in hits]
+
+
+def read_patterns(path):
+    """
+    Read a pattern file: one regex per line, 'glob:' in front of a line makes it a glob.
+
+    Blank lines and lines starting with '#' are skipped.
+
+    :param path: str - pattern file
+    :return: tuple(list, list) - (regexes, globs)
+    """
+    regexes, globs = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if line.startswith('glob:'):
+                globs.append(line[len('glob:'):])
+            else:
+                regexes.append(line)
+    return regexes, globs
+
+
+def _selector(file_type, min_size, max_size, newer, older, path_regex):
+    """Combine the entry predicates into one check, None if there is nothing to check."""
+    checks = []
+    if file_type == 'f':
+        checks.append(lambda entry: not entry.is_dir and not entry.is_symlink)
+    elif file_type == 'd':
+        checks.append(lambda entry: entry.is_dir and not entry.is_symlink)
+    elif file_type == 'l':
+        checks.append(lambda entry: entry.is_symlink)
+    if min_size is not None:
+        checks.append(lambda entry: entry.stat.st_size >= min_size)
+    if max_size is not None:
+        checks.append(lambda entry: entry.stat.st_size <= max_size)
+    if newer is not None:
+        newer_ns = int(newer * 1e9)
+        checks.append(lambda entry: entry.stat.st_mtime_ns >= newer_ns)
+    if older is not None:
+        older_ns = int(older * 1e9)
+        checks.append(lambda entry: entry.stat.st_mtime_ns < older_ns)
+    if path_regex is not None:
+        checks.append(lambda entry: path_regex.fullmatch(entry.path) is not None)
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda entry: all(check(entry) for check in checks)
+
+
+def _matches(patterns, selector, entries, limit, tagged):
+    found = 0
+    for entry in entries:
+        hits = None
+        if patterns is not None:
+            hits = patterns.match(entry.name)
+            if not hits:
+                continue
+        if selector is not None and not selector(entry):
+            continue
+        yield (entry.path, hits) if tagged else entry.path
+        found += 1
+        if found == limit:
+            return
+
+
+def _pattern_set(pattern):
+    if pattern is None or isinstance(pattern, PatternSet):
+        return pattern
+    if isinstance(pattern, (str, re.Pattern)):
+        return PatternSet([pattern])
+    return PatternSet(pattern) if pattern else None
+
+
+def _compile(pattern):
+    if pattern is None:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error:
+        raise ValueError(f'Invalid regular expression: {pattern}')
+
+
+def iter_find(path, pattern=None, limit=None, walk_threads=1, index=None, file_type=None, min_size=None,
+              max_size=None, newer=None, older=None, max_depth=None, path_regex=None, exclude_dirs=None,
+              tagged=False):
+    """
+    Find entries by name, path, type, size and age, yielding each match as soon as it is found.
+
+    The walk stops when the consumer stops iterating or after `limit`
+    matches, so the first results of a huge tree arrive at once and no
+    list of matches is built up. Directories matching exclude_dirs are
+    not entered at all. Size and age are checked against the stat data
+    collected while listing each directory (only requested when one of
+    these predicates is given), so no file is stat-ed twice.
+
+    Any number of name patterns is matched in the same single walk (see
+    PatternSet); with tagged=True every match comes with the patterns it hit.
+
+    Usage:
+        for file_path in iter_find('/data', r'.*[.]log', min_size='1M', newer='7d', exclude_dirs=['.git']):
+            print(file_path)
+        for file_path, hits in iter_find('/data', PatternSet(globs=['*.jpg', '*.mp4']), tagged=True):
+            print(file_path, hits)
+
+    :param path: str - directory to search in
+           pattern: str, re.Pattern, list of them, PatternSet or None - regex(es) the whole file name
+                    must match (any of them), any name if None
+           limit: int or None - stop after this many matches (at least 1)
+           walk_threads: int - threads listing directories in parallel
+           index: index.DirIndex or None - search this directory index instead of the filesystem
+           file_type: str or None - 'f' files, 'd' directories, 'l' symlinks; None: everything but directories
+           min_size: int, str or None - smallest size in bytes, or a size for parse_size()
+           max_size: int, str or None - largest size in bytes, or a size for parse_size()
+           newer: float, str or None - only entries modified at or after this time (see parse_time())
+           older: float, str or None - only entries modified before this time (see parse_time())
+           max_depth: int or None - deepest entry depth to search (1 = only the directory itself)
+           path_regex: str, re.Pattern or None - regex the whole path must match
+           exclude_dirs: list of str or None - glob patterns of directory names to prune
+           tagged: bool - yield (path, matched patterns) instead of paths
+    :return: generator of str - paths of matching entries, or of tuple(str, list of str or None) if tagged
+    :raises: FileNotFoundError if the path does not exist
+             ValueError if a pattern, size, time, type or limit is invalid
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Path does not exist: {path}')
+    if file_type is not None and file_type not in TYPES:
+        raise ValueError(f'Invalid type: {file_type} (choose from {", ".join(TYPES)})')
+    if limit is not None and limit < 1:
+        raise ValueError(f'Invalid limit: {limit} (must be at least 1)')
+    if isinstance(exclude_dirs, str):
+        exclude_dirs = [exclude_dirs]
+    patterns = _pattern_set(pattern)
+    min_size = parse_size(min_size) if min_size is not None else None
+    max_size = parse_size(max_size) if max_size is not None else None
+    newer = parse_time(newer) if newer is not None else None
+    older = parse_time(older) if older is not None else None
+    selector = _selector(file_type, min_size, max_size, newer, older, _compile(path_regex))
+
+    # symlinks to directories are listed with the directories
+    dirs = file_type in ('d', 'l')
+    if index is not None:
+        entries = index.iter_entries(path, dirs, max_depth, exclude_dirs)
+    else:
+        stat = any(value is not None for value in (min_size, max_size, newer, older))
+        entries = walker.walk(path, max_depth=max_depth, stat=stat, on_error=walker.log_error,
+                              exclude_dirs=exclude_dirs, dirs=dirs, threads=walk_threads)
+    return _matches(patterns, selector, entries, limit, tagged)
 
 
 def run(args):
     """
-    Finds files by regex pattern in a given directory.
+    Finds files by regex pattern and other predicates in a given directory.
+
+    Matches are printed as they are found (see iter_find()). All -r regexes,
+    --glob patterns and pattern file lines are matched in one walk; with more
+    than one pattern every match is printed with the patterns it hit.
 
     :param:
             args: Namespace: Arguments from argparse.
             path: str: Path to the directory.
-            regex: str: Regex pattern for file names.
+            regex: list of str (optional): Regex patterns for file names.
+            glob: list of str (optional): Glob patterns for file names.
+            pattern_file: str (optional): File with one regex per line ('glob:' prefix for globs).
+            path_regex: str (optional): Regex pattern for whole paths.
+            type: str (optional): 'f', 'd' or 'l' to find only files, directories or symlinks.
+            min_size: str (optional): Smallest size, e.g. 100K.
+            max_size: str (optional): Largest size, e.g. 2G.
+            newer: str (optional): Only entries modified within an age (7d) or since a date (2024-05-01).
+            older: str (optional): Only entries modified before an age or date.
+            max_depth: int (optional): Deepest level to search, 1 = only the directory itself.
+            exclude_dir: list of str (optional): Glob patterns of directory names not to enter.
+            limit: int (optional): Stop after this many matches.
+            first: bool (optional): Stop at the first match, same as limit 1.
+            walk_threads: int (optional): Threads listing directories in parallel.
+            index: bool (optional): Search the directory index instead of the filesystem.
+            index_file: str (optional): Path to the index database.
+            refresh: bool (optional): Update the index incrementally before searching.
+            format: str (optional): Output format: 'text', 'ndjson' or 'csv'.
     :raises:
             FileNotFoundError: If the path does not exist.
-            ValueError: If the regex pattern is invalid.
+            ValueError: If a regex pattern, size, time or type is invalid.
     :return:
-            list of matched files
+            int: number of matched files
     """
     path = args.path
-    pattern = args.regex
+    regexes = getattr(args, 'regex', None) or []
+    globs = getattr(args, 'glob', None) or []
+    regexes = [regexes] if isinstance(regexes, str) else list(regexes)
+    globs = [globs] if isinstance(globs, str) else list(globs)
+    walk_threads = getattr(args, 'walk_threads', None) or 1
+    limit = 1 if getattr(args, 'first', False) else getattr(args, 'limit', None)
+    predicates = dict(
+        file_type=getattr(args, 'type', None),
+        min_size=getattr(args, 'min_size', None),
+        max_size=getattr(args, 'max_size', None),
+        newer=getattr(args, 'newer', None),
+        older=getattr(args, 'older', None),
+        max_depth=getattr(args, 'max_depth', None),
+        path_regex=getattr(args, 'path_regex', None),
+        exclude_dirs=getattr(args, 'exclude_dir', None),
+    )
 
-    logging.info(f'Find command started: path={path}, regex={pattern}')
-
-    if not os.path.exists(path):
-        logging.error(f'Path does not exist: {path}')
-        raise FileNotFoundError(f'Path does not exist: {path}')
+    used = {name: value for name, value in predicates.items() if value is not None}
+    log.info(f'Find command started: path={path}, regex={regexes}, glob={globs}, limit={limit}, predicates={used}')
 
+    idx = None
+    matched = 0
     try:
-        regex = re.compile(pattern)
-    except re.error as e:
-        logging.error(f'Invalid regex pattern {pattern}: {e}')
-        raise ValueError(f'Invalid regular expression: {pattern}')
-
-    matched_files = []
-
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            if regex.fullmatch(file):
-                matched_files.append(os.path.join(root, file))
-
-    logging.info(f'Find command completed: {len(matched_files)} files matched')
-
-    for file in matched_files:
-        print(file)
+        if getattr(args, 'pattern_file', None):
+            from_file = read_patterns(args.pattern_file)
+            regexes += from_file[0]
+            globs += from_file[1]
+        patterns = PatternSet(regexes, globs) if regexes or globs else None
+        tagged = patterns is not None and len(patterns) > 1
+        if getattr(args, 'index', False) or getattr(args, 'refresh', False):
+            from features import index
+            idx = index.open_from_args(path, args)
+        matches = iter_find(path, patterns, limit, walk_threads, idx, tagged=tagged, **predicates)
+        with output.from_args(args, ('path', 'patterns') if tagged else ('path',)) as out:
+            if tagged:
+                for file_path, hits in matches:
+                    out.emit(f'{file_path}\t{", ".join(hits)}', path=file_path, patterns=hits)
+                    matched += 1
+            else:
+                for file_path in matches:
+                    out.emit(file_path, path=file_path)
+                    matched += 1
+    except (FileNotFoundError, ValueError) as e:
+        log.error(str(e))
+        raise
+    finally:
+        if idx is not None:
+            idx.close()
 
-    return matched_files
+    log.info(f'Find command completed: {matched} files matched')
+    return matched
@@ -0,0 +1,265 @@
+import os
+import sqlite3
+import logging
+
+from features import output
+from features.hashing import parallel_map
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'DIRTOOLS_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'dir_tools', 'hashes.sqlite3')
+)
+
+COMMIT_EVERY = 1000
+
+
+class HashCache:
+    """
+    Persistent cache of file digests stored in a sqlite database.
+
+    Entries are keyed by file identity (st_dev, st_ino) and hash method and
+    are only valid while st_size and st_mtime_ns stay the same, so a file is
+    rehashed as soon as its metadata changes.
+
+    Usage:
+        with HashCache() as cache:
+            digest = cache.lookup(os.stat(path), 'sha256')
+    """
+
+    def __init__(self, path=None, rebuild=False):
+        """
+        Open (and create if needed) the cache database.
+
+        :param path: str or None - database file, DEFAULT_CACHE_PATH if None
+               rebuild: bool - ignore stored digests and overwrite them
+        """
+        self.path = path or DEFAULT_CACHE_PATH
+        self.rebuild = rebuild
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            ' dev INTEGER NOT NULL, ino INTEGER NOT NULL, method TEXT NOT NULL,'
+            ' size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+            ' digest TEXT NOT NULL, path TEXT NOT NULL,'
+            ' PRIMARY KEY (dev, ino, method)) WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def lookup(self, st, method):
+        """
+        Return the cached digest for a file or None.
+
+        :param st: os.stat_result - current stat of the file
+               method: str - hash method name
+        :return: str or None - hex digest if the entry is still valid
+        """
+        if self.rebuild:
+            self.misses += 1
+            return None
+        row = self.conn.execute(
+            'SELECT digest FROM hashes WHERE dev=? AND ino=? AND method=? AND size=? AND mtime_ns=?',
+            (st.st_dev, st.st_ino, method, st.st_size, st.st_mtime_ns)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def store(self, path, st, method, digest):
+        """
+        Save a digest for a file.
+
+        :param path: str - path of the file (used for compaction)
+               st: os.stat_result - stat taken before the file was hashed
+               method: str - hash method name
+               digest: str - hex digest
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO hashes (dev, ino, method, size, mtime_ns, digest, path) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (st.st_dev, st.st_ino, method, st.st_size, st.st_mtime_ns, digest, os.path.abspath(path))
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        """Write pending entries to disk."""
+        self.conn.commit()
+        self._pending = 0
+
+    def compact(self):
+        """
+        Remove entries of deleted or changed files and shrink the database.
+
+        :return: int - number of removed entries
+        """
+        stale = []
+        rows = self.conn.execute('SELECT dev, ino, method, size, mtime_ns, path FROM hashes').fetchall()
+        for dev, ino, method, size, mtime_ns, path in rows:
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append((dev, ino, method))
+                continue
+            if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != (dev, ino, size, mtime_ns):
+                stale.append((dev, ino, method))
+
+        self.conn.executemany('DELETE FROM hashes WHERE dev=? AND ino=? AND method=?', stale)
+        self.conn.commit()
+        self.conn.execute('VACUUM')
+        return len(stale)
+
+    def clear(self):
+        """Remove all entries."""
+        self.conn.execute('DELETE FROM hashes')
+        self.conn.commit()
+        self.conn.execute('VACUUM')
+
+    def count(self):
+        """Return the number of stored entries."""
+        return self.conn.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+
+    def close(self):
+        """Commit pending entries and close the database."""
+        if self.conn is not None:
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+
+def open_from_args(args):
+    """
+    Open the hash cache according to command line options.
+
+    Callers whose namespace does not define the cache options
+    (e.g. programmatic use of run()) get no cache.
+
+    :param args: argparse.Namespace with optional fields no_cache, rebuild_cache, cache_file
+    :return: HashCache or None
+    """
+    if getattr(args, 'no_cache', True):
+        return None
+    return HashCache(getattr(args, 'cache_file', None), rebuild=getattr(args, 'rebuild_cache', False))
+
+
+def cached_hash(func, path, method, cache=None):
+    """
+    Hash a single file, consulting the cache first.
+
+    :param func: callable(path) -> str - computes the digest
+           path: str - path to the file
+           method: str - cache key for the hash method
+           cache: HashCache or None
+    :return: str - hex digest
+    """
+    if cache is None:
+        return func(path)
+    st = os.stat(path)
+    digest = cache.lookup(st, method)
+    if digest is None:
+        digest = func(path)
+        cache.store(path, st, method, digest)
+    return digest
+
+
+def cached_map(func, paths, method, cache=None, jobs=1, executor='thread'):
+    """
+    Hash many files, computing only digests that are missing from the cache.
+
+    Lookups and stores happen in the calling thread; only cache misses are
+    sent to the worker pool. Results keep the input order.
+
+    :param func: callable(path) -> str - computes the digest, picklable
+           paths: iterable of str
+           method: str - cache key for the hash method
+           cache: HashCache or None
+           jobs: int - number of workers
+           executor: str - worker pool type ('thread' or 'process')
+    :return: generator of (path, digest, error, cached)
+    """
+    if cache is None:
+        for path, digest, error in parallel_map(func, paths, jobs, executor):
+            yield path, digest, error, False
+        return
+
+    paths = list(paths)
+    known = dict()
+    stats = dict()
+    misses = []
+    for index, path in enumerate(paths):
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            known[index] = (None, e)
+            continue
+        digest = cache.lookup(st, method)
+        if digest is None:
+            stats[index] = st
+            misses.append(path)
+        else:
+            known[index] = (digest, None)
+
+    hashed = parallel_map(func, misses, jobs, executor)
+    for index, path in enumerate(paths):
+        if index in known:
+            digest, error = known[index]
+            yield path, digest, error, error is None
+            continue
+        _, digest, error = next(hashed)
+        if error is None:
+            cache.store(path, stats[index], method, digest)
+        yield path, digest, error, False
+    cache.commit()
+
+
+def run(args):
+    """
+    Manage the persistent hash cache.
+
+    Actions:
+        stats   - print the number of entries and the cache location
+        compact - remove entries of deleted or changed files
+        clear   - remove all entries
+
+    :param args: argparse.Namespace with fields:
+           action: str, one of 'stats', 'compact', 'clear'
+           cache_file: str (optional), path to the cache database
+           format: str (optional), output format: 'text', 'ndjson' or 'csv'
+    :return: None, prints results to stdout and logs actions
+    """
+    action = args.action
+    path = getattr(args, 'cache_file', None) or DEFAULT_CACHE_PATH
+
+    log.info(f'Cache command started: action={action}, cache={path}')
+
+    with HashCache(path) as cache, output.from_args(args, ('cache', 'action', 'entries', 'removed')) as out:
+        if action == 'compact':
+            removed = cache.compact()
+            entries = cache.count()
+            log.info(f'Removed {removed} stale cache entries')
+            out.emit(f'Removed {removed} stale entries, {entries} left in {path}',
+                     cache=path, action=action, entries=entries, removed=removed)
+        elif action == 'clear':
+            cache.clear()
+            log.info(f'Cache cleared: {path}')
+            out.emit(f'Cache cleared: {path}', cache=path, action=action, entries=0)
+        else:
+            entries = cache.count()
+            out.emit(f'{entries} entries in {path}', cache=path, action=action, entries=entries)
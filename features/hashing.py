@@ -0,0 +1,180 @@
+import os
+import mmap
+import hashlib
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+def new_hash(method='sha256'):
+    """
+    Create a new hash object for the given algorithm name.
+
+    :param method: str - hashlib algorithm name ('sha256', 'md5', ...)
+    :return: hashlib hash object
+    :raises: ValueError if the algorithm is not supported
+    """
+    try:
+        return hashlib.new(method)
+    except ValueError:
+        raise ValueError(f'Unsupported hash algorithm: {method}')
+
+
+def update_from_file(hash_func, f, buffer, limit=None):
+    """
+    Feed a binary file object into a hash object using one preallocated buffer.
+
+    Data is read with readinto() into the same buffer on every iteration,
+    so no new bytes objects are allocated per chunk.
+
+    :param hash_func: hashlib hash object to update
+           f: binary file object opened for reading
+           buffer: bytearray - reusable read buffer
+           limit: int or None - maximum number of bytes to read
+    :return: int - number of bytes fed into the hash
+    """
+    view = memoryview(buffer)
+    total = 0
+    while limit is None or total < limit:
+        want = len(buffer) if limit is None else min(len(buffer), limit - total)
+        n = f.readinto(view[:want])
+        if not n:
+            break
+        hash_func.update(view[:n])
+        total += n
+    return total
+
+
+def _update_from_mmap(hash_func, fd, size, chunk_size):
+    """Feed a file descriptor into a hash object through a read-only memory map."""
+    with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mm)
+        try:
+            for offset in range(0, size, chunk_size):
+                hash_func.update(view[offset:offset + chunk_size])
+        finally:
+            view.release()
+    return size
+
+
+def hash_file(path, method='sha256', chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=None):
+    """
+    Calculate the hash of a file without loading it into memory.
+
+    The file is streamed in chunks of chunk_size bytes through a single
+    reusable buffer, so peak memory does not depend on the file size.
+    Files of at least mmap_threshold bytes are hashed through a read-only
+    memory map instead (pass None to always use buffered reads).
+
+    :param path: str - path to the file
+           method: str - hash algorithm name (default 'sha256')
+           chunk_size: int - size of a single read in bytes
+           mmap_threshold: int or None - minimal file size for mmap mode
+    :return: str - hex digest of the hash
+    :raises: ValueError if chunk_size is not positive or the algorithm is unknown
+             OSError if the file cannot be read
+    """
+    if chunk_size <= 0:
+        raise ValueError(f'Chunk size must be positive: {chunk_size}')
+
+    hash_func = new_hash(method)
+    with open(path, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        if mmap_threshold is not None and size > 0 and size >= mmap_threshold:
+            _update_from_mmap(hash_func, fd, size, chunk_size)
+        else:
+            update_from_file(hash_func, f, bytearray(min(chunk_size, size) if size else chunk_size))
+
+    return hash_func.hexdigest()
+
+
+def hash_file_ends(path, edge_size, method='sha256', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Calculate a hash of the first and last edge_size bytes of a file.
+
+    Files not larger than 2 * edge_size are hashed completely, so for them
+    the result equals hash_file(path, method).
+
+    :param path: str - path to the file
+           edge_size: int - number of bytes taken from each end of the file
+           method: str - hash algorithm name (default 'sha256')
+           chunk_size: int - size of a single read in bytes
+    :return: tuple(str, int) - hex digest and number of bytes read
+    :raises: OSError if the file cannot be read
+    """
+    hash_func = new_hash(method)
+    with open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        buffer = bytearray(max(1, min(chunk_size, edge_size, size)))
+        if size <= 2 * edge_size:
+            read = update_from_file(hash_func, f, buffer)
+        else:
+            read = update_from_file(hash_func, f, buffer, limit=edge_size)
+            f.seek(size - edge_size)
+            read += update_from_file(hash_func, f, buffer, limit=edge_size)
+    return hash_func.hexdigest(), read
+
+
+def _run_batch(func, batch):
+    """Apply func to every item of a batch, capturing exceptions per item."""
+    results = []
+    for item in batch:
+        try:
+            results.append((func(item), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def parallel_map(func, items, jobs=1, executor='thread', batch_size=None):
+    """
+    Apply func to items on a worker pool and yield results in input order.
+
+    Items are submitted in batches and only a bounded number of batches is
+    in flight at any time, so memory does not grow with the number of items.
+    With jobs <= 1 everything runs in the calling thread.
+
+    :param func: callable(item) - must be picklable for the process executor
+           items: iterable of items to process
+           jobs: int - number of workers
+           executor: str - 'thread' or 'process'
+           batch_size: int or None - items per task (default 1 for threads, 64 for processes)
+    :return: generator of (item, result, error) - error is None on success
+    :raises: ValueError if executor is unknown
+    """
+    if executor not in ('thread', 'process'):
+        raise ValueError(f'Unknown executor: {executor}')
+
+    if jobs <= 1:
+        for item in items:
+            (result, error), = _run_batch(func, [item])
+            yield item, result, error
+        return
+
+    if batch_size is None:
+        batch_size = 1 if executor == 'thread' else 64
+
+    pool_class = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+    with pool_class(max_workers=jobs) as pool:
+        pending = deque()
+        iterator = iter(items)
+        while True:
+            while len(pending) < jobs * 4:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+                pending.append((batch, pool.submit(_run_batch, func, batch)))
+            if not pending:
+                break
+            batch, future = pending.popleft()
+            for item, (result, error) in zip(batch, future.result()):
+                yield item, result, error
@@ -1,36 +1,37 @@
 import os
-import hashlib
 import logging
+from functools import partial
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import walker, output
+from features.hashing import hash_file, DEFAULT_CHUNK_SIZE, DEFAULT_MMAP_THRESHOLD
+from features.hash_cache import open_from_args, cached_hash, cached_map
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
 
 
-def file_hash(path, method='sha256'):
+def file_hash(path, method='sha256', chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=None, cache=None):
     """
     Calculate hash of a file using sha256 or md5.
 
+    The file is streamed in chunks, so memory usage does not grow with file size.
+    If a cache is given, the file is only read when its metadata changed
+    since the digest was stored.
+
     :param path: str - path to the file
            method: str - 'sha256' or 'md5' (default 'sha256')
+           chunk_size: int - size of a single read in bytes
+           mmap_threshold: int or None - hash files of at least this size through mmap
+           cache: HashCache or None - persistent digest cache
     :return: str - hex digest of the hash
     :raises: Exception if file cannot be read or hashed
     """
-    hash_func = hashlib.sha256() if method == 'sha256' else hashlib.md5()
+    worker = partial(hash_file, method=method, chunk_size=chunk_size, mmap_threshold=mmap_threshold)
     try:
-        with open(path, 'rb') as f:
-            data = f.read()
-            hash_func.update(data)
-
-        logging.info(f'Hashed file: {path} with algorithm {method}')
-        return hash_func.hexdigest()
+        digest = cached_hash(worker, path, method, cache)
+        log.info('Hashed file: %s with algorithm %s', path, method)
+        return digest
     except Exception as e:
-        logging.error(f'Error hashing file {path}: {e}')
+        log.error('Error hashing file %s: %s', path, e)
         raise
 
 
@@ -38,44 +39,69 @@ def run(args):
     """
     Calculate and print hash sums of a file or all files in a directory.
 
-    Supports 'sha256' and 'md5' algorithms.
+    Supports 'sha256' and 'md5' algorithms. Files of a directory are printed
+    sorted by path, also when they are hashed by several workers.
 
     :param args: argparse.Namespace with fields:
            path: str, path to file or directory
            method: str (optional), hash method ('sha256' or 'md5'), default 'sha256'
+           chunk_size: int (optional), read size in bytes
+           mmap: bool (optional), hash large files through mmap
+           jobs: int (optional), number of hashing workers, default 1
+           executor: str (optional), worker pool type ('thread' or 'process')
+           no_cache: bool (optional), do not use the persistent hash cache
+           rebuild_cache: bool (optional), rehash all files and refresh the cache
+           cache_file: str (optional), path to the cache database
+           format: str (optional), output format: 'text', 'ndjson' or 'csv'
     :return: None, prints results to stdout and logs actions/errors
     """
     path = args.path
     method = args.method.lower() if args.method else 'sha256'
+    chunk_size = getattr(args, 'chunk_size', None) or DEFAULT_CHUNK_SIZE
+    mmap_threshold = DEFAULT_MMAP_THRESHOLD if getattr(args, 'mmap', False) else None
+    jobs = getattr(args, 'jobs', None) or 1
+    executor = getattr(args, 'executor', None) or 'thread'
 
-    logging.info(f'Started hashing for path: {path} with algo: {method}')
+    log.info(f'Started hashing for path: {path} with algo: {method}')
 
+    out = output.from_args(args, ('path', 'algorithm', 'hash', 'error'))
     if not os.path.exists(path):
-        logging.error(f'Path does not exist: {path}')
-        print(f'Path does not exist: {path}')
+        log.error(f'Path does not exist: {path}')
+        with out:
+            out.emit(f'Path does not exist: {path}', path=path, error='path does not exist')
         return
 
-    if os.path.isfile(path):
-        try:
-            h = file_hash(path, method)
-            logging.info(f'{method}({path}) = {h}')
-            print(f'{method}({path}) = {h}')
-        except Exception as e:
-            logging.error(f'Error hashing file {path}: {e}')
-            print(f'Error hashing file {path}: {e}')
-    elif os.path.isdir(path):
-        logging.info(f'Hashes of files in directory {path}:')
-        print(f'Hashes of files in directory {path}:')
-        for root, subfolders, files in os.walk(path):
-            for filename in files:
-                filepath = os.path.join(root, filename)
+    if not os.path.isfile(path) and not os.path.isdir(path):
+        log.error(f'Not a file or directory: {path}')
+        with out:
+            out.emit(f'Not a file or directory: {path}', path=path, error='not a file or directory')
+        return
+
+    cache = open_from_args(args)
+    try:
+        with out:
+            if os.path.isfile(path):
                 try:
-                    h = file_hash(filepath, method)
-                    logging.info(f'{method}({filepath}) = {h}')
-                    print(f'{method}({filepath}) = {h}')
+                    h = file_hash(path, method, chunk_size, mmap_threshold, cache)
+                    log.info(f'{method}({path}) = {h}')
+                    out.emit(f'{method}({path}) = {h}', path=path, algorithm=method, hash=h)
                 except Exception as e:
-                    logging.error(f'Error hashing {filepath}: {e}')
-                    print(f'Error hashing {filepath}: {e}')
-    else:
-        logging.error(f'Not a file or directory: {path}')
-        print(f'Not a file or directory: {path}')
+                    log.error('Error hashing file %s: %s', path, e)
+                    out.emit(f'Error hashing file {path}: {e}', path=path, algorithm=method, error=str(e))
+            else:
+                log.info(f'Hashes of files in directory {path}:')
+                out.emit(f'Hashes of files in directory {path}:')
+                filepaths = sorted(entry.path for entry in walker.walk(path, on_error=walker.log_error))
+                worker = partial(hash_file, method=method, chunk_size=chunk_size, mmap_threshold=mmap_threshold)
+                for filepath, h, error, cached in cached_map(worker, filepaths, method, cache, jobs, executor):
+                    if error is not None:
+                        log.error('Error hashing %s: %s', filepath, error)
+                        out.emit(f'Error hashing {filepath}: {error}', path=filepath, algorithm=method,
+                                 error=str(error))
+                        continue
+                    log.info('%s(%s) = %s', method, filepath, h)
+                    out.emit(f'{method}({filepath}) = {h}', path=filepath, algorithm=method, hash=h)
+    finally:
+        if cache is not None:
+            log.info(f'Hash cache: {cache.hits} hits, {cache.misses} misses')
+            cache.close()
@@ -0,0 +1,469 @@
+import os
+import time
+import heapq
+import sqlite3
+import hashlib
+import logging
+from fnmatch import fnmatch
+
+from features import walker, output
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.environ.get(
+    'DIRTOOLS_INDEX_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'dir_tools', 'index')
+)
+
+COLUMNS = ('path', 'parent', 'name', 'is_dir', 'is_link', 'size', 'blocks', 'mtime_ns', 'ctime_ns', 'ino', 'mode')
+
+
+def default_index_path(root):
+    """
+    Location of the index file for a directory.
+
+    :param root: str - indexed directory
+    :return: str - path of the sqlite file inside DEFAULT_INDEX_DIR
+    """
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(DEFAULT_INDEX_DIR, f'{key}.sqlite3')
+
+
+def _subtree_range(path):
+    """Bounds of the primary key range holding everything below a directory."""
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+def _row(path, parent, name, is_dir, is_link, st):
+    return (path, parent, name, int(is_dir), int(is_link), st.st_size, getattr(st, 'st_blocks', 0),
+            st.st_mtime_ns, st.st_ctime_ns, st.st_ino, st.st_mode)
+
+
+class DirIndex:
+    """
+    On-disk snapshot of a directory tree stored in a sqlite database.
+
+    Every file and directory under the root is one row with its path,
+    size, allocated blocks, mtime, ctime, inode and mode. Rows are keyed by
+    path, so everything below a directory is one contiguous key range.
+
+    Directory rows also remember the mtime/ctime the directory had when it
+    was listed, which makes the index a walker listing cache (see
+    walker.ListingCache): update() walks the tree and lists only the
+    directories that changed since then.
+
+    Usage:
+        with DirIndex(default_index_path(root)) as index:
+            index.build(root)
+            print(index.count_files(root))
+    """
+
+    def __init__(self, path):
+        """
+        Open (and create if needed) the index database.
+
+        :param path: str - index file
+        """
+        self.path = path
+        self.reused = 0
+        self.rescanned = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(entries)')]
+        if columns and 'listed_mtime_ns' not in columns:
+            # index written by an older version, the next update rescans everything
+            self.conn.execute('DROP TABLE entries')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' path TEXT PRIMARY KEY, parent TEXT, name TEXT NOT NULL,'
+            ' is_dir INTEGER NOT NULL, is_link INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL, blocks INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL, ctime_ns INTEGER NOT NULL,'
+            ' ino INTEGER NOT NULL, mode INTEGER NOT NULL,'
+            ' listed_mtime_ns INTEGER, listed_ctime_ns INTEGER) WITHOUT ROWID'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent)')
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def root(self):
+        """Indexed directory or None if the index was never built."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key='root'").fetchone()
+        return row[0] if row else None
+
+    def covers(self, path):
+        """Check whether a path lies inside the indexed tree."""
+        root = self.root
+        if root is None:
+            return False
+        path = os.path.abspath(path)
+        return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+    def _upsert(self, rows):
+        # keeps listed_mtime_ns/listed_ctime_ns of existing directories untouched
+        updates = ', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])
+        self.conn.executemany(
+            f'INSERT INTO entries ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))}) '
+            f'ON CONFLICT (path) DO UPDATE SET {updates}',
+            rows
+        )
+
+    def _mark_listed(self, path, st):
+        self.conn.execute('UPDATE entries SET listed_mtime_ns = ?, listed_ctime_ns = ? WHERE path = ?',
+                          (st.st_mtime_ns, st.st_ctime_ns, path))
+
+    def _delete_subtree(self, path):
+        low, high = _subtree_range(path)
+        self.conn.execute('DELETE FROM entries WHERE path = ? OR (path >= ? AND path < ?)', (path, low, high))
+
+    def _set_meta(self, root):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('root', ?)", (root,))
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('updated', ?)", (str(time.time()),))
+
+    def get(self, path, depth, st):
+        """
+        Listing cache interface: children of a directory if it did not change.
+
+        :param path: str - directory
+               depth: int - depth of the directory in the current walk
+               st: os.stat_result - fresh stat of the directory
+        :return: walker.Listing or None
+        """
+        row = self.conn.execute('SELECT listed_mtime_ns, listed_ctime_ns FROM entries WHERE path = ?',
+                                (path,)).fetchone()
+        if row is None or row != (st.st_mtime_ns, st.st_ctime_ns):
+            self.rescanned += 1
+            return None
+        self.reused += 1
+
+        dirs = []
+        files = []
+        rows = self.conn.execute('SELECT path, name, is_dir, is_link, size, blocks, mtime_ns, ctime_ns, ino, mode '
+                                 'FROM entries WHERE parent = ? ORDER BY path', (path,))
+        for entry_path, name, is_dir, is_link, *stat in rows:
+            entry = walker.Entry(entry_path, name, depth + 1, bool(is_dir), bool(is_link), walker.CachedStat(*stat))
+            (dirs if is_dir else files).append(entry)
+        return walker.Listing(path, depth, dirs, files)
+
+    def put(self, path, st, listing):
+        """
+        Listing cache interface: replace the children of a directory.
+
+        :param path: str - directory
+               st: os.stat_result - stat of the directory taken before listing it
+               listing: walker.Listing - fresh listing with stat data
+        """
+        old = dict(self.conn.execute('SELECT path, is_dir FROM entries WHERE parent = ?', (path,)).fetchall())
+        current = {entry.path: entry.is_dir for entry in listing.dirs + listing.files}
+        for old_path, was_dir in old.items():
+            if old_path not in current or (was_dir and not current[old_path]):
+                self._delete_subtree(old_path)
+
+        if self.conn.execute('SELECT 1 FROM entries WHERE path = ?', (path,)).fetchone() is None:
+            self._upsert([_row(path, None, os.path.basename(path), True, False, st)])
+        self._upsert([_row(entry.path, path, entry.name, entry.is_dir, entry.is_symlink, entry.stat)
+                      for entry in listing.dirs + listing.files])
+        self._mark_listed(path, st)
+
+    def forget(self, path):
+        """Listing cache interface: drop a directory that cannot be listed anymore."""
+        self._delete_subtree(path)
+
+    def build(self, root, threads=1):
+        """
+        Scan a directory tree and replace the index contents with it.
+
+        :param root: str - directory to index
+               threads: int - threads listing directories in parallel
+        :return: int - number of indexed entries
+        """
+        root = os.path.abspath(root)
+        self.conn.execute('DELETE FROM entries')
+        self._set_meta(root)
+        st = os.stat(root)
+        self._upsert([_row(root, None, os.path.basename(root), True, False, st)])
+        self._mark_listed(root, st)
+
+        total = 0
+        for listing in walker.iter_dirs(root, stat=True, on_error=walker.log_error, threads=threads):
+            entries = listing.dirs + listing.files
+            self._upsert([_row(e.path, listing.path, e.name, e.is_dir, e.is_symlink, e.stat) for e in entries])
+            # a subdirectory is listed after this stat was taken, so it is a valid cache key
+            self.conn.executemany(
+                'UPDATE entries SET listed_mtime_ns = ?, listed_ctime_ns = ? WHERE path = ?',
+                [(e.stat.st_mtime_ns, e.stat.st_ctime_ns, e.path) for e in listing.dirs if not e.is_symlink]
+            )
+            total += len(entries)
+        self.conn.commit()
+        return total
+
+    def update(self):
+        """
+        Bring the index up to date, listing only directories that changed.
+
+        The tree is walked with the index as listing cache: a directory whose
+        mtime and ctime are the same as when it was listed keeps its rows and
+        only its subdirectories are checked. In-place changes of file
+        contents do not touch the directory and are not picked up.
+
+        :return: tuple(int, int) - number of reused and rescanned directories
+        :raises: ValueError if the index was never built
+        """
+        root = self.root
+        if root is None:
+            raise ValueError(f'Index {self.path} was never built')
+
+        self.reused = self.rescanned = 0
+        for _ in walker.iter_dirs(root, stat=True, on_error=walker.log_error, cache=self):
+            pass
+        self._set_meta(root)
+        self.conn.commit()
+        return self.reused, self.rescanned
+
+    def count_files(self, path):
+        """
+        Count files below a directory.
+
+        :param path: str - directory inside the indexed tree
+        :return: int
+        """
+        low, high = _subtree_range(os.path.abspath(path))
+        return self.conn.execute('SELECT COUNT(*) FROM entries WHERE path >= ? AND path < ? AND is_dir = 0',
+                                 (low, high)).fetchone()[0]
+
+    def iter_files(self, path):
+        """
+        Yield (path, name) of all files below a directory, ordered by path.
+
+        :param path: str - directory inside the indexed tree
+        :return: generator of tuple(str, str)
+        """
+        low, high = _subtree_range(os.path.abspath(path))
+        yield from self.conn.execute('SELECT path, name FROM entries WHERE path >= ? AND path < ? AND is_dir = 0 '
+                                     'ORDER BY path', (low, high))
+
+    def iter_entries(self, path, dirs=False, max_depth=None, exclude_dirs=None):
+        """
+        Yield the entries below a directory like walker.walk() would, ordered by path.
+
+        The index stores absolute paths; they are rebased onto `path` as
+        given, so a relative path yields the same relative paths as a walk.
+
+        :param path: str - directory inside the indexed tree
+               dirs: bool - also yield directory entries
+               max_depth: int or None - deepest entry depth to report (1 = only top contents)
+               exclude_dirs: list of str or None - glob patterns of directory names to leave out with their contents
+        :return: generator of walker.Entry with walker.CachedStat
+        """
+        prefix = path
+        path = os.path.abspath(path).rstrip(os.sep) or os.sep
+        low, high = _subtree_range(path)
+        start = len(low)
+        base = low.count(os.sep)
+        excluded = {path: False}
+
+        def is_excluded(parent):
+            # parents are looked up once each, so every directory name is matched once
+            if parent not in excluded:
+                excluded[parent] = (is_excluded(os.path.dirname(parent)) or
+                                    any(fnmatch(os.path.basename(parent), pattern) for pattern in exclude_dirs))
+            return excluded[parent]
+
+        rows = self.conn.execute('SELECT path, parent, name, is_dir, is_link, size, blocks, mtime_ns, ctime_ns, '
+                                 'ino, mode FROM entries WHERE path >= ? AND path < ? ORDER BY path', (low, high))
+        for entry_path, parent, name, is_dir, is_link, *stat in rows:
+            depth = entry_path.count(os.sep) - base + 1
+            if max_depth is not None and depth > max_depth:
+                continue
+            if exclude_dirs and (is_excluded(parent) or
+                                 is_dir and any(fnmatch(name, pattern) for pattern in exclude_dirs)):
+                continue
+            if is_dir and not dirs:
+                continue
+            yield walker.Entry(os.path.join(prefix, entry_path[start:]), name, depth, bool(is_dir), bool(is_link),
+                               walker.CachedStat(*stat))
+
+    def scan_tree(self, path, depth=1, top=0):
+        """
+        Compute the same totals as analyse.scan_tree() from the index.
+
+        :param path: str - directory inside the indexed tree
+               depth: int - keep totals of directories up to this depth
+               top: int - number of largest files to collect
+        :return: tuple(dict, dict, list) - see analyse.scan_tree()
+        """
+        from features.analyse import DirStats
+
+        path = os.path.abspath(path)
+        totals = {path: DirStats()}
+        top_files = dict()
+        largest = []
+        low, high = _subtree_range(path)
+        base = path.rstrip(os.sep).count(os.sep)
+
+        rows = self.conn.execute('SELECT path, parent, is_dir, is_link, size, blocks FROM entries '
+                                 'WHERE path >= ? AND path < ?', (low, high))
+        for entry_path, parent, is_dir, is_link, size, blocks in rows:
+            if is_dir:
+                if entry_path.count(os.sep) - base <= depth:
+                    totals.setdefault(entry_path, DirStats())
+                continue
+            stats = DirStats(size, blocks * 512, 1)
+            if parent == path:
+                top_files[entry_path] = stats
+            ancestor = parent
+            while True:
+                if ancestor.count(os.sep) - base <= depth:
+                    totals.setdefault(ancestor, DirStats()).add(stats)
+                if ancestor == path:
+                    break
+                ancestor = os.path.dirname(ancestor)
+            if top:
+                if len(largest) < top:
+                    heapq.heappush(largest, (size, entry_path))
+                elif size > largest[0][0]:
+                    heapq.heapreplace(largest, (size, entry_path))
+
+        return totals, top_files, sorted(largest, reverse=True)
+
+    def close(self):
+        """Commit and close the database."""
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+
+def open_for(path, index_file=None):
+    """
+    Open the index that covers a path.
+
+    Without an explicit index file the default locations of the path and
+    of all its parent directories are tried.
+
+    :param path: str - directory to answer queries for
+           index_file: str or None - explicit index file
+    :return: DirIndex
+    :raises: FileNotFoundError if no index covers the path
+    """
+    path = os.path.abspath(path)
+    if index_file:
+        candidates = [index_file]
+    else:
+        candidates = []
+        current = path
+        while True:
+            candidates.append(default_index_path(current))
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            index = DirIndex(candidate)
+            if index.covers(path):
+                return index
+            index.close()
+
+    log.error(f'No index covers {path}')
+    raise FileNotFoundError(f'No index covers {path}. Run: python manager.py index build -p {path}')
+
+
+def open_from_args(path, args):
+    """
+    Open the index for a command according to its --index/--refresh options.
+
+    With --refresh the index is brought up to date first (and built if
+    there is none yet), listing only directories that changed.
+
+    :param path: str - directory the command works on
+           args: argparse.Namespace with optional fields index, refresh, index_file
+    :return: DirIndex or None if the command should scan the filesystem
+    :raises: FileNotFoundError if --index is given and no index covers the path
+    """
+    refresh = getattr(args, 'refresh', False)
+    if not getattr(args, 'index', False) and not refresh:
+        return None
+    index_file = getattr(args, 'index_file', None)
+
+    try:
+        index = open_for(path, index_file)
+    except FileNotFoundError:
+        if not refresh:
+            raise
+        index = DirIndex(index_file or default_index_path(path))
+        total = index.build(path)
+        log.info(f'Index built for {path}: {total} entries')
+        with output.from_args(args) as out:
+            out.emit(f'Index built: {total} entries')
+        return index
+
+    if refresh:
+        reused, rescanned = index.update()
+        log.info(f'Index refreshed for {index.root}: {rescanned} directories rescanned, {reused} reused')
+        with output.from_args(args) as out:
+            out.emit(f'Index refreshed: {rescanned} directories rescanned, {reused} reused')
+    return index
+
+
+def run(args):
+    """
+    Build or update the directory index used by count, find and analyse --index.
+
+    Actions:
+        build  - scan the whole tree and write a new index
+        update - rescan only directories whose mtime/ctime changed
+
+    :param args: argparse.Namespace with fields:
+           action: str, 'build' or 'update'
+           path: str, directory to index
+           index_file: str (optional), path to the index database
+           walk_threads: int (optional), threads listing directories in parallel
+           format: str (optional), output format: 'text', 'ndjson' or 'csv'
+    :raises:
+            FileNotFoundError: If the path does not exist.
+            NotADirectoryError: Path is not a directory.
+    :return: None, prints results to stdout and logs actions
+    """
+    action = args.action
+    path = os.path.abspath(args.path)
+    index_file = getattr(args, 'index_file', None) or default_index_path(path)
+    walk_threads = getattr(args, 'walk_threads', None) or 1
+
+    log.info(f'Index command started: action={action}, path={path}, index={index_file}')
+
+    if not os.path.exists(path):
+        log.error(f'Path does not exist: {path}')
+        raise FileNotFoundError(f'Path does not exist: {path}')
+
+    if not os.path.isdir(path):
+        log.error(f'Path is not a directory: {path}')
+        raise NotADirectoryError(f'Path is not a directory: {path}')
+
+    start = time.perf_counter()
+    with DirIndex(index_file) as index:
+        if action == 'update' and index.root == path:
+            reused, rescanned = index.update()
+            message = f'Index updated: {rescanned} directories rescanned, {reused} reused'
+            record = dict(action='update', rescanned=rescanned, reused=reused)
+        else:
+            total = index.build(path, walk_threads)
+            message = f'Index built: {total} entries'
+            record = dict(action='build', entries=total)
+
+    seconds = time.perf_counter() - start
+    message += f' in {seconds:.2f}s ({index_file})'
+    log.info(message)
+    with output.from_args(args, ('path', 'index', 'action', 'entries', 'rescanned', 'reused', 'seconds')) as out:
+        out.emit(message, path=path, index=index_file, seconds=round(seconds, 3), **record)
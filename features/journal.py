@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import hashlib
+import threading
+
+from features.hashing import new_hash, update_from_file, DEFAULT_CHUNK_SIZE
+
+DEFAULT_JOURNAL_DIR = os.environ.get(
+    'DIRTOOLS_JOURNAL_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'dir_tools', 'journals')
+)
+
+COMMIT_EVERY = 1000
+
+
+def default_journal_path(src, dst):
+    """
+    Location of the journal of a transfer.
+
+    :param src: str - source file or directory
+           dst: str - destination file or directory
+    :return: str - path of the sqlite file inside DEFAULT_JOURNAL_DIR
+    """
+    key = f'{os.path.abspath(src)}\0{os.path.abspath(dst)}'
+    key = hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(DEFAULT_JOURNAL_DIR, f'{key}.sqlite3')
+
+
+def _remove_files(path):
+    """Delete a journal database together with its WAL files."""
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _prefix_digest(path, length):
+    """sha256 of the first `length` bytes of a file."""
+    h = new_hash('sha256')
+    with open(path, 'rb', buffering=0) as f:
+        update_from_file(h, f, bytearray(min(DEFAULT_CHUNK_SIZE, length) or 1), length)
+    return h.hexdigest()
+
+
+class Journal:
+    """
+    Progress of a copy or move stored in a sqlite database.
+
+    Every completed file is recorded with the size and mtime its source had
+    when it was copied; large files also record the offset up to which
+    their data is known to be on disk. A rerun of the same transfer skips
+    completed files and continues partial ones, but only while the source
+    metadata and the destination size still agree with the journal.
+
+    The journal is shared by the copy workers, all access is serialized.
+
+    Usage:
+        with Journal(default_journal_path(src, dst)) as journal:
+            done, offset = journal.resume_point(src_file, dst_file, os.stat(src_file))
+    """
+
+    def __init__(self, path):
+        """
+        Open (and create if needed) the journal database.
+
+        :param path: str - database file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self._pending = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            ' src TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+            ' offset INTEGER NOT NULL, done INTEGER NOT NULL) WITHOUT ROWID'
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def resume_point(self, src, dst, st, verify=False):
+        """
+        Decide how much of a file is already copied.
+
+        :param src: str - source file
+               dst: str - destination file
+               st: os.stat_result - current stat of the source
+               verify: bool - also compare sha256 of the data already copied
+        :return: tuple(bool, int) - (file is complete, offset to continue from)
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT size, mtime_ns, offset, done FROM files WHERE src=?',
+                                    (os.path.abspath(src),)).fetchone()
+        if row is None:
+            return False, 0
+        size, mtime_ns, offset, done = row
+        if (size, mtime_ns) != (st.st_size, st.st_mtime_ns):
+            return False, 0
+        try:
+            dst_st = os.stat(dst)
+        except OSError:
+            return False, 0
+
+        if done:
+            if dst_st.st_size != size or dst_st.st_mtime_ns != mtime_ns:
+                return False, 0
+            if verify and _prefix_digest(src, size) != _prefix_digest(dst, size):
+                return False, 0
+            return True, size
+
+        if dst_st.st_size < offset:
+            return False, 0
+        if verify and offset and _prefix_digest(src, offset) != _prefix_digest(dst, offset):
+            return False, 0
+        return False, offset
+
+    def begin(self, src, st, offset=0):
+        """
+        Record that a large file is being copied, starting at offset.
+
+        :param src: str - source file
+               st: os.stat_result - stat of the source
+               offset: int - data before this offset is already in place
+        """
+        self._write('INSERT OR REPLACE INTO files (src, size, mtime_ns, offset, done) VALUES (?, ?, ?, ?, 0)',
+                    (os.path.abspath(src), st.st_size, st.st_mtime_ns, offset), force=True)
+
+    def checkpoint(self, src, offset):
+        """
+        Record that data before offset is flushed to the destination.
+
+        :param src: str - source file
+               offset: int
+        """
+        self._write('UPDATE files SET offset=? WHERE src=?', (offset, os.path.abspath(src)), force=True)
+
+    def finish(self, src, st):
+        """
+        Record a completed file.
+
+        :param src: str - source file
+               st: os.stat_result - stat of the source taken before copying
+        """
+        self._write('INSERT OR REPLACE INTO files (src, size, mtime_ns, offset, done) VALUES (?, ?, ?, ?, 1)',
+                    (os.path.abspath(src), st.st_size, st.st_mtime_ns, st.st_size))
+
+    def _write(self, sql, params, force=False):
+        with self.lock:
+            self.conn.execute(sql, params)
+            self._pending += 1
+            if force or self._pending >= COMMIT_EVERY:
+                self.conn.commit()
+                self._pending = 0
+
+    def commit(self):
+        """Write pending entries to disk."""
+        with self.lock:
+            self.conn.commit()
+            self._pending = 0
+
+    def count(self):
+        """Return the number of completed files."""
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM files WHERE done=1').fetchone()[0]
+
+    def close(self):
+        """Commit pending entries and close the database."""
+        if self.conn is not None:
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+    def remove(self):
+        """Close and delete the journal after the transfer completed."""
+        self.close()
+        _remove_files(self.path)
+
+
+def journal_path_from_args(src, dst, args):
+    """Journal location for a transfer: --journal or the default path."""
+    return getattr(args, 'journal', None) or default_journal_path(src, dst)
+
+
+def open_from_args(src, dst, args):
+    """
+    Open the journal of a transfer according to command line options.
+
+    Without --resume a stale journal of an earlier run is discarded, so
+    only an explicit resume trusts previous progress. Callers whose
+    namespace does not define the journal options (e.g. programmatic use
+    of run()) get no journal.
+
+    :param src: str - source file or directory
+           dst: str - destination file or directory
+           args: argparse.Namespace with optional fields no_journal, journal, resume
+    :return: Journal or None
+    """
+    if getattr(args, 'no_journal', True):
+        return None
+    path = journal_path_from_args(src, dst, args)
+    if not getattr(args, 'resume', False):
+        _remove_files(path)
+    return Journal(path)
@@ -0,0 +1,188 @@
+import os
+import time
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'manager.log')
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+# manager.log is rotated at this size, keeping LOG_BACKUPS old files (manager.log.1, ...)
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+
+# write buffer of the log file; records are written in batches of about this size
+LOG_BUFFER_SIZE = 64 * 1024
+
+_listener = None
+_handler = None
+
+
+class BatchingFileHandler(RotatingFileHandler):
+    """
+    Rotating log file that does not flush after every record.
+
+    Records collect in the file buffer and reach the OS in LOG_BUFFER_SIZE
+    batches, when the queue runs empty (see _BatchingListener), on errors
+    and on shutdown.
+    """
+
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE, encoding=self.encoding,
+                      errors=self.errors)
+        self.size = stream.seek(0, os.SEEK_END)
+        return stream
+
+    def emit(self, record):
+        # the size is tracked here: RotatingFileHandler.shouldRollover() formats every record
+        # a second time and seeks, which flushes the buffer
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # maxBytes counts bytes in the file, so non-ASCII text is measured encoded
+            size = len(msg) if msg.isascii() else len(msg.encode(self.stream.encoding, self.stream.errors))
+            if self.maxBytes > 0 and self.size + size > self.maxBytes and self.size > 0:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self.size += size
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class _Formatter(logging.Formatter):
+    """LOG_FORMAT formatter that builds the timestamp text once per second."""
+
+    def __init__(self):
+        super().__init__(LOG_FORMAT)
+        self.last = (None, None)
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if self.last[0] != second:
+            self.last = (second, time.strftime(self.default_time_format, self.converter(record.created)))
+        return self.default_msec_format % (self.last[1], record.msecs)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Puts records on the queue unformatted.
+
+    The message is built from its %-arguments in the listener thread, so
+    the logging thread only pays for creating the record.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _BatchingListener(QueueListener):
+    """Flushes the file handlers whenever the queue runs empty."""
+
+    def dequeue(self, block):
+        try:
+            return self.queue.get(block=False)
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block=block)
+
+
+def parse_levels(spec, default=logging.INFO):
+    """
+    Parse a log level specification.
+
+    'WARNING' sets the level of all commands, 'hashsum=DEBUG,copy=ERROR'
+    the level of single commands; both can be combined
+    ('WARNING,copy=INFO').
+
+    :param spec: str or None - level specification
+           default: int - level when the specification has no global part
+    :return: tuple(int, dict) - (global level, {command: level})
+    :raises: ValueError for unknown level names
+    """
+    level, per_command = default, dict()
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        command, _, name = part.rpartition('=')
+        value = logging.getLevelName(name.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f'Unknown log level: {name}')
+        if command:
+            per_command[command.strip()] = value
+        else:
+            level = value
+    return level, per_command
+
+
+def setup_logging(level=logging.INFO, filename=None, loggers=None, quiet=False,
+                  max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """
+    Send the log records of all commands to the log file.
+
+    Called once by manager.py before a command runs; command modules only
+    log through logging.getLogger(__name__) and never configure logging
+    themselves. Records go through a queue to a background thread that
+    formats them and writes them in batches to a rotating log file.
+    Calling it again while logging is set up is a no-op.
+
+    :param level: int - lowest level that is written
+           filename: str or None - log file, logs/manager.log if None
+           loggers: dict or None - {logger name: level} overriding the level of single modules
+           quiet: bool - only write warnings and errors, ignoring level and loggers
+           max_bytes: int - rotate the log file at this size (0: never)
+           backups: int - number of rotated files kept
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    filename = filename or LOG_FILE
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    file_handler = BatchingFileHandler(filename, maxBytes=max_bytes, backupCount=backups, encoding='utf-8',
+                                       delay=True)
+    file_handler.setFormatter(_Formatter())
+
+    # LOG_FORMAT needs neither the caller nor thread and process details, skip collecting them
+    # for every record (see "Optimization" in the logging HOWTO)
+    logging._srcfile = None
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+    records = queue.SimpleQueue()
+    _handler = _DeferredQueueHandler(records)
+    _listener = _BatchingListener(records, file_handler)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(logging.WARNING if quiet else level)
+    if not quiet:
+        for name, logger_level in (loggers or {}).items():
+            logging.getLogger(name).setLevel(logger_level)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """
+    Write all pending records and close the log file.
+
+    :return: None
+    """
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = _handler = None
@@ -1,69 +1,320 @@
 import os
+import re
+import glob
+import errno
 import shutil
 import logging
+from functools import partial
+from collections import namedtuple
 
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
+from features import copy_engine, walker, output, journal as journal_mod
+from features.hashing import hash_file, parallel_map
 
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'manager.log'),
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s'
-)
+log = logging.getLogger(__name__)
+
+MovePlan = namedtuple('MovePlan', ['source', 'target', 'is_dir', 'same_device'])
+MovePlan.__doc__ = """
+One planned move.
+
+    source: str - absolute source path
+    target: str - absolute path it is moved to
+    is_dir: bool - source is a real directory
+    same_device: bool - source and destination share a filesystem (plain rename)
+"""
+
+
+def expand_sources(sources, regex=None):
+    """
+    Turn command line sources into a list of paths.
+
+    Sources that do not exist but contain glob wildcards are expanded.
+    With a regex every source must be a folder and its entries whose names
+    fully match the regex are selected.
+
+    :param sources: list of str - paths or glob patterns
+           regex: str or None - select entries of the source folders by name
+    :return: list of str - absolute paths, in the order given
+    :raises: FileNotFoundError if a source or pattern matches nothing
+    """
+    pattern = re.compile(regex) if regex else None
+    paths = []
+    for source in sources:
+        if pattern is not None:
+            with os.scandir(source) as it:
+                paths += sorted(os.path.abspath(entry.path) for entry in it if pattern.fullmatch(entry.name))
+        elif not os.path.lexists(source) and any(c in source for c in '*?['):
+            matches = sorted(glob.glob(source))
+            if not matches:
+                raise FileNotFoundError(f'No files match: {source}')
+            paths += [os.path.abspath(match) for match in matches]
+        else:
+            paths.append(os.path.abspath(source))
+    return paths
+
+
+def plan_moves(sources, destination, resumable=None):
+    """
+    Plan moving all sources into a destination folder and find conflicts.
+
+    Every source is stat-ed exactly once; nothing is moved. A move
+    conflicts when the target already exists, when two sources would get
+    the same target, when a source would move onto itself, or when a
+    folder would move into itself.
+
+    :param sources: list of str - absolute source paths
+           destination: str - destination folder
+           resumable: callable(source, target) -> bool or None - existing targets that may be
+                      continued (interrupted journaled moves) are not conflicts
+    :return: tuple(list of MovePlan, list of str) - plans and conflict messages
+    :raises: FileNotFoundError if a source does not exist
+    """
+    destination = os.path.abspath(destination)
+    dst_dev = os.stat(destination).st_dev
+    plans = []
+    conflicts = []
+    targets = set()
+    for source in sources:
+        try:
+            st = os.lstat(source)
+        except FileNotFoundError:
+            raise FileNotFoundError(f'Source does not exist: {source}')
+        target = os.path.join(destination, os.path.basename(source.rstrip(os.sep)))
+        is_dir = os.path.isdir(source) and not os.path.islink(source)
+        same_device = st.st_dev == dst_dev
+
+        if source == target:
+            conflicts.append(f'Cannot move to the same location: {source}')
+        elif is_dir and (destination + os.sep).startswith(source + os.sep):
+            conflicts.append(f'Cannot move a folder into itself: {source}')
+        elif target in targets:
+            conflicts.append(f'Several sources would be moved to: {target}')
+        elif os.path.lexists(target) and not (resumable and not same_device and resumable(source, target)):
+            conflicts.append(f'File already exists at destination: {target}')
+        targets.add(target)
+        plans.append(MovePlan(source, target, is_dir, same_device))
+    return plans, conflicts
+
+
+def _verify_copy(source, target, deep=False):
+    """
+    Compare a copied file or tree with its source before the source is deleted.
+
+    :param source: str - source file or folder
+           target: str - its copy
+           deep: bool - also compare sha256 of every file
+    :return: list of str - source paths whose copy is missing or differs
+    """
+    if os.path.isdir(source) and not os.path.islink(source):
+        pairs = [(entry.path, os.path.join(target, os.path.relpath(entry.path, source)), entry.is_symlink)
+                 for entry in walker.walk(source, on_error=walker.log_error, dirs=True)
+                 if not entry.is_dir or entry.is_symlink]
+    else:
+        pairs = [(source, target, os.path.islink(source))]
+
+    bad = []
+    for src, dst, is_link in pairs:
+        try:
+            if is_link:
+                same = os.path.islink(dst) and os.readlink(src) == os.readlink(dst)
+            else:
+                same = os.path.getsize(src) == os.lstat(dst).st_size
+                if same and deep:
+                    same = hash_file(src) == hash_file(dst)
+        except OSError:
+            same = False
+        if not same:
+            bad.append(src)
+    return bad
+
+
+def _remove_source(plan, deep):
+    """Delete a copied source once its copy has been verified."""
+    bad = _verify_copy(plan.source, plan.target, deep)
+    if bad:
+        log.error(f'Copy of {len(bad)} files differs from the source, source kept: {plan.source}')
+        raise OSError(f'Copy of {len(bad)} files differs from the source, source kept: {plan.source} '
+                      f'(first: {bad[0]})')
+    if plan.is_dir:
+        shutil.rmtree(plan.source)
+    else:
+        os.remove(plan.source)
+
+
+def _move_file_across(plan, deep=False):
+    """Copy a single file to another filesystem, verify it and unlink the source."""
+    if os.path.islink(plan.source):
+        os.symlink(os.readlink(plan.source), plan.target)
+    else:
+        copy_engine.copy_file(plan.source, plan.target)
+    _remove_source(plan, deep)
 
 
 def run(args):
     """
-    Moves a file or directory to a new location.
+    Moves files or directories to a new location.
+
+    Accepts several sources, glob patterns, or (with --regex) source folders
+    whose matching entries are moved. The whole batch is planned first and
+    nothing is moved if any target conflicts, e.g. already exists in the
+    destination folder.
 
-    If the target file already exists in the destination folder,
-    the operation is aborted with an error message.
+    Within one filesystem every source is renamed. Across filesystems
+    files are copied on a worker pool, verified and only then deleted;
+    with a journal that copy can be resumed after an interruption instead
+    of starting from zero.
 
     :param:
             args: Namespace: Arguments from argparse.
-            src: str: Path to the source file or directory.
-            dst: str: Path to the destination file or folder.
+            src: str or list of str: Paths or glob patterns of the sources.
+            dst: str: Path to the destination folder.
+            regex: str (optional): Move entries of the source folders whose names match.
+            jobs: int (optional): Number of files copied in parallel across filesystems.
+            no_journal: bool (optional): Do not record progress (default for programmatic use).
+            journal: str (optional): Path to the journal file.
+            resume: bool (optional): Continue an interrupted cross-device move.
+            verify_hash: bool (optional): Compare contents (sha256) of copies before deleting sources.
+            format: str (optional): Output format: 'text', 'ndjson' or 'csv'.
     :raises:
             FileNotFoundError: If the source does not exist.
             FileExistsError: If the file already exists in the destination.
             NotADirectoryError: Destination is not a directory.
             PermissionError: Permission denied while moving.
+            OSError: A copy across filesystems could not be completed or verified.
     :return:
     """
-    source = args.src
+    sources = args.src if isinstance(args.src, list) else [args.src]
     destination = args.dst
+    jobs = getattr(args, 'jobs', None) or 1
+    deep = getattr(args, 'verify_hash', False)
+    journaled = not getattr(args, 'no_journal', True)
 
-    logging.info(f'Move command started: src={source}, dst={destination}')
+    log.info(f'Move command started: src={sources}, dst={destination}')
 
-    if not os.path.exists(source):
-        logging.error(f'Source does not exist: {source}')
-        raise FileNotFoundError(f'Source does not exist: {source}')
+    sources = expand_sources(sources, getattr(args, 'regex', None))
 
     if not os.path.exists(destination):
-        logging.error(f'Destination does not exist: {destination}')
+        log.error(f'Destination does not exist: {destination}')
         raise FileNotFoundError(f'Destination does not exist: {destination}')
 
     if not os.path.isdir(destination):
-        logging.error(f'Destination is not a directory: {destination}')
+        log.error(f'Destination is not a directory: {destination}')
         raise NotADirectoryError(f'Destination is not a directory: {destination}')
 
-    base_name = os.path.basename(source)
-    target_path = os.path.join(destination, base_name)
+    def resumable(source, target):
+        return (journaled and getattr(args, 'resume', False)
+                and os.path.exists(journal_mod.journal_path_from_args(source, target, args)))
 
-    # prohibit to move to the same place
-    if os.path.abspath(source) == os.path.abspath(target_path):
-        logging.error('Cannot move to the same location. File already exists.')
-        raise FileExistsError('Cannot move to the same location. File already exists.')
+    try:
+        plans, conflicts = plan_moves(sources, destination, resumable)
+    except FileNotFoundError as e:
+        log.error(str(e))
+        raise
+    if conflicts:
+        for conflict in conflicts:
+            log.error(conflict)
+        raise FileExistsError('; '.join(conflicts))
+
+    out = output.from_args(args, ('source', 'target', 'error'))
+
+    def moved(plan):
+        out.emit(f'Moved {plan.source} -> {destination}', source=plan.source, target=plan.target)
 
-    # if file already exists
-    if os.path.exists(target_path):
-        logging.error(f'File already exists at destination: {target_path}')
-        raise FileExistsError(f'File already exists at destination: {target_path}')
+    def on_error(src_path, dst_path, error):
+        out.emit(f'Error copying {src_path} to {dst_path}: {error}', source=src_path, target=dst_path,
+                 error=str(error))
 
     try:
-        shutil.move(source, target_path)
-        logging.info(f'Moved successfully: {source} to {destination}')
-        print(f'Moved {source} -> {destination}')
+        with out:
+            across = [plan for plan in plans if not plan.same_device]
+            for plan in plans:
+                if plan.same_device:
+                    try:
+                        os.rename(plan.source, plan.target)
+                    except OSError as e:
+                        # e.g. bind mounts of one filesystem
+                        if e.errno != errno.EXDEV:
+                            raise
+                        across.append(plan._replace(same_device=False))
+                        continue
+                    log.info(f'Moved successfully: {plan.source} to {destination}')
+                    moved(plan)
+
+            for plan in across:
+                if plan.is_dir and journaled:
+                    journal = journal_mod.open_from_args(plan.source, plan.target, args)
+                    _move_journaled(plan, journal, args, on_error)
+                    moved(plan)
+                elif plan.is_dir:
+                    stats = copy_engine.copy_tree(plan.source, plan.target, jobs, on_error=on_error)
+                    if stats.errors:
+                        raise OSError(f'{stats.errors} files could not be copied, source kept: {plan.source}')
+                    _remove_source(plan, deep)
+                    log.info(f'Moved successfully: {plan.source} to {destination}')
+                    moved(plan)
+
+            # folders copy their files with `jobs` workers themselves, single files are moved `jobs` at a time
+            files = [plan for plan in across if not plan.is_dir]
+            if journaled:
+                worker = partial(_move_file_journaled, args=args)
+                if getattr(args, 'journal', None) and len(files) > 1:
+                    # one explicit --journal file is shared by all sources, so they take turns
+                    jobs = 1
+            else:
+                worker = partial(_move_file_across, deep=deep)
+            failed = 0
+            for plan, _, error in parallel_map(worker, files, jobs):
+                if error is not None:
+                    failed += 1
+                    log.error(f'Error moving {plan.source}: {error}')
+                    out.emit(f'Error moving {plan.source}: {error}', source=plan.source, target=plan.target,
+                             error=str(error))
+                    continue
+                log.info(f'Moved successfully: {plan.source} to {destination}')
+                moved(plan)
+            if failed:
+                raise OSError(f'{failed} files could not be moved' +
+                              (', rerun with --resume to continue' if journaled else ''))
     except PermissionError as e:
-        logging.error(f'Permission denied while moving: {e}')
+        log.error(f'Permission denied while moving: {e}')
         raise PermissionError(f'Permission denied while moving: {e}')
+
+
+def _move_file_journaled(plan, args):
+    """Move a single file across filesystems with its own journal (a parallel_map worker)."""
+    _move_journaled(plan, journal_mod.open_from_args(plan.source, plan.target, args), args)
+
+
+def _move_journaled(plan, journal, args, on_error=copy_engine.print_error):
+    """
+    Move across filesystems as a journaled copy followed by deleting the source.
+
+    The source is only deleted when every file was copied and verified;
+    otherwise the journal is kept so that a rerun with --resume continues
+    the copy.
+    """
+    jobs = getattr(args, 'jobs', None) or 1
+    verify = getattr(args, 'verify_hash', False)
+    if os.path.islink(plan.source):
+        journal.remove()
+        _move_file_across(plan)
+        return
+    stats = copy_engine.CopyStats()
+    log.info(f'Cross-device move, copying with journal {journal.path}')
+    try:
+        if plan.is_dir:
+            copy_engine.copy_tree(plan.source, plan.target, jobs, stats=stats, journal=journal, verify=verify,
+                                  on_error=on_error)
+        else:
+            stats.add(copy_engine.copy_file_journaled(plan.source, plan.target, journal, verify))
+    finally:
+        journal.close()
+
+    log.info(f'Move copy throughput: {stats.report()}')
+    if stats.errors:
+        log.error(f'{stats.errors} files could not be copied, source kept: {plan.source}')
+        raise OSError(f'{stats.errors} files could not be copied, source kept: {plan.source}. '
+                      f'Rerun with --resume to continue the move')
+
+    _remove_source(plan, verify)
+    journal.remove()
+    log.info(f'Moved successfully: {plan.source} to {plan.target}')
@@ -0,0 +1,101 @@
+import sys
+import csv
+import json
+
+FORMATS = ('text', 'ndjson', 'csv')
+
+# results are written to the stream in chunks of this many lines
+BUFFER_LINES = 1000
+
+
+class _Lines(list):
+    """List of output lines that csv writers can write to."""
+    write = list.append
+
+
+class Output:
+    """
+    Writes the results of a command as text lines, NDJSON or CSV.
+
+    Commands call emit() once per result, as soon as it is known, with the
+    human readable line and the same result as fields; each format only
+    builds what it needs. Lines are written in chunks of BUFFER_LINES, or
+    one by one when the stream is a terminal, so memory stays constant
+    however many results a command produces. List fields are written as
+    JSON arrays in NDJSON and joined with ';' in CSV.
+    """
+
+    def __init__(self, fmt='text', fields=(), stream=None, buffer_lines=BUFFER_LINES):
+        """
+        :param fmt: str - 'text', 'ndjson' or 'csv'
+               fields: sequence of str - CSV columns, other fields of a record are left out
+               stream: text stream or None - sys.stdout if None
+               buffer_lines: int - lines collected before they are written
+        :raises: ValueError for an unknown format
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown output format: {fmt} (choose from {", ".join(FORMATS)})')
+        self.format = fmt
+        self.stream = stream or sys.stdout
+        isatty = getattr(self.stream, 'isatty', None)
+        self.buffer_lines = 1 if isatty is not None and isatty() else buffer_lines
+        self.lines = _Lines()
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.lines, list(fields), extrasaction='ignore', lineterminator='\n')
+            self.csv.writeheader()
+
+    @property
+    def structured(self):
+        """True for machine readable formats, which leave out headings and summaries."""
+        return self.format != 'text'
+
+    def emit(self, text=None, **record):
+        """
+        Write one result.
+
+        :param text: str or None - line for the text format, nothing is written as text if None
+               record: fields for the NDJSON and CSV formats, nothing is written there if empty
+        """
+        if self.format == 'text':
+            if text is None:
+                return
+            self.lines.append(text + '\n')
+        elif not record:
+            return
+        elif self.format == 'ndjson':
+            self.lines.append(json.dumps(record) + '\n')
+        else:
+            self.csv.writerow({key: ';'.join(map(str, value)) if isinstance(value, list) else value
+                               for key, value in record.items()})
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        """Write the collected lines to the stream."""
+        if self.lines:
+            self.stream.write(''.join(self.lines))
+            self.lines.clear()
+        flush = getattr(self.stream, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def from_args(args, fields=()):
+    """
+    Output in the format chosen with --format.
+
+    :param args: argparse.Namespace with optional field format
+           fields: sequence of str - CSV columns
+    :return: Output
+    """
+    return Output(getattr(args, 'format', None) or 'text', fields)
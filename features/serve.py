@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import stat
+import signal
+import socket
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from features import cli
+from features.batch import execute, _OutputRouter
+
+log = logging.getLogger(__name__)
+
+
+async def _handle_client(reader, writer, parsers, commands, pool, router):
+    """
+    Serve one client connection.
+
+    Every line is a JSON request. Requests of one client run concurrently
+    and are answered as they finish, each response carries the request id.
+    A request {"cancel": <id>} cancels a request of the same client that
+    has not started yet; a request that is already running completes in the
+    background but is answered as cancelled. Requests still pending when
+    the client disconnects are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = dict()
+    write_lock = asyncio.Lock()
+
+    async def respond(message):
+        async with write_lock:
+            writer.write((json.dumps(message) + '\n').encode())
+            await writer.drain()
+
+    async def process(request_id, number, operation):
+        try:
+            result = await loop.run_in_executor(pool, execute, (number, operation), parsers, commands, router)
+        except asyncio.CancelledError:
+            result = {'line': number, 'command': operation.get('command'), 'ok': False, 'output': '',
+                      'error': 'cancelled', 'seconds': 0.0}
+        finally:
+            tasks.pop(request_id, None)
+        result['id'] = request_id
+        try:
+            await respond(result)
+        except ConnectionError:
+            pass
+
+    number = 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                operation = json.loads(line)
+                if not isinstance(operation, dict):
+                    raise ValueError('request is not a JSON object')
+            except ValueError as e:
+                await respond({'id': None, 'ok': False, 'error': f'invalid request: {e}'})
+                continue
+
+            if 'cancel' in operation:
+                task = tasks.get(operation['cancel'])
+                cancelled = task is not None and task.cancel()
+                await respond({'id': operation.get('id'), 'cancel': operation['cancel'], 'ok': cancelled})
+                continue
+
+            request_id = operation.get('id', number)
+            if request_id in tasks:
+                await respond({'id': request_id, 'ok': False, 'error': 'duplicate request id'})
+                continue
+            tasks[request_id] = asyncio.create_task(process(request_id, number, operation))
+    except ConnectionError:
+        pass
+    finally:
+        for task in list(tasks.values()):
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Remove a socket file left behind by a server that is no longer running.
+
+    :param socket_path: str - path of the unix socket
+    :raises: FileExistsError if the path is not a socket or a server still listens on it
+    """
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise FileExistsError(f'Path exists and is not a socket: {socket_path}')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        probe.settimeout(1)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            log.info('Removing stale socket %s', socket_path)
+            os.remove(socket_path)
+            return
+    raise FileExistsError(f'A server is already listening on {socket_path}')
+
+
+async def start_server(socket_path, parsers, commands, pool, router=None):
+    """
+    Listen for JSON requests on a unix socket.
+
+    A stale socket file from an earlier server is replaced, anything else at
+    the path (a regular file or the socket of a running server) is left alone
+    and the server does not start. The socket is only accessible by the
+    current user.
+
+    :param socket_path: str - path of the unix socket
+           parsers: dict - {command: subparser}, see cli.build_parser()
+           commands: dict - {command: module with run(args)}
+           pool: concurrent.futures.Executor - runs the commands
+           router: batch._OutputRouter or None - captures the output of commands
+    :return: asyncio.Server
+    :raises: FileExistsError if the socket path is in use
+    """
+    _remove_stale_socket(socket_path)
+
+    async def handler(reader, writer):
+        await _handle_client(reader, writer, parsers, commands, pool, router)
+
+    server = await asyncio.start_unix_server(handler, path=socket_path)
+    os.chmod(socket_path, 0o600)
+    return server
+
+
+def call(socket_path, operation, timeout=None):
+    """
+    Send one request to a running server and wait for its response.
+
+    :param socket_path: str - path of the unix socket
+           operation: dict - request, e.g. {"command": "count", "path": "/data"}
+           timeout: float or None - seconds to wait
+    :return: dict - response
+    :raises: OSError if the server cannot be reached
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as f:
+            f.write((json.dumps(operation) + '\n').encode())
+            f.flush()
+            return json.loads(f.readline())
+
+
+def _remove_own_socket(socket_path, inode):
+    """Remove the socket this server bound, unless the path has been replaced since."""
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if stat.S_ISSOCK(st.st_mode) and st.st_ino == inode:
+        os.remove(socket_path)
+
+
+async def _serve(socket_path, parsers, commands, jobs):
+    router = _OutputRouter(sys.stdout)
+    previous, sys.stdout = sys.stdout, router
+    inode = None
+    try:
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='serve') as pool:
+            server = await start_server(socket_path, parsers, commands, pool, router)
+            # only the socket bound here is removed on exit, never a path start_server refused
+            inode = os.lstat(socket_path).st_ino
+            print(f'Listening on {socket_path} (Ctrl+C to stop)', file=previous, flush=True)
+            stop = asyncio.Event()
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+            async with server:
+                await stop.wait()
+    finally:
+        sys.stdout = previous
+        if inode is not None:
+            _remove_own_socket(socket_path, inode)
+
+
+def run(args):
+    """
+    Run a long-lived server that executes commands sent over a unix socket.
+
+    The process keeps the command modules loaded and a worker pool running,
+    so a request costs a JSON round trip instead of an interpreter start.
+    Requests and responses are JSON lines in the batch manifest format:
+        -> {"id": 1, "command": "count", "path": "/data"}
+        <- {"id": 1, "line": 1, "command": "count", "ok": true, "output": "...", "error": null, "seconds": 0.01}
+        -> {"id": 2, "cancel": 1}
+
+    :param args: argparse.Namespace with fields:
+           socket: str, path of the unix socket
+           jobs: int (optional), number of requests executed in parallel, default 4
+    :return: None, runs until interrupted or terminated (SIGTERM)
+    :raises: FileExistsError if the socket path is in use
+    """
+    jobs = getattr(args, 'jobs', None) or 4
+    log.info(f'Serve command started: socket={args.socket}, jobs={jobs}')
+    parsers = cli.build_parser().subcommands
+    try:
+        asyncio.run(_serve(args.socket, parsers, cli.commands, jobs))
+    except KeyboardInterrupt:
+        pass
+    log.info(f'Server on {args.socket} stopped')
@@ -0,0 +1,292 @@
+import os
+import shutil
+import logging
+from functools import partial
+
+from features import walker, copy_engine, output
+from features.hashing import hash_file, parallel_map
+from features.hash_cache import open_from_args, cached_map
+
+log = logging.getLogger(__name__)
+
+
+class SyncStats(copy_engine.CopyStats):
+    """
+    Counters of a sync run.
+
+    unchanged: int - files already up to date in the destination
+    deleted: int - extra entries removed from the destination
+    conflicts: int - entries whose type differs (file vs directory) and were left alone
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.unchanged = 0
+        self.deleted = 0
+        self.conflicts = 0
+
+    def as_record(self):
+        return dict(super().as_record(), unchanged=self.unchanged, deleted=self.deleted, conflicts=self.conflicts)
+
+    def report(self):
+        """
+        Build a human-readable summary of the sync.
+
+        :return: str
+        """
+        return (f'{self.unchanged} unchanged, {self.deleted} deleted, {self.conflicts} conflicts; '
+                f'copied {super().report()}')
+
+
+def _same_metadata(src_st, dst_st):
+    """Files are considered equal when size and mtime match (copies keep the mtime)."""
+    return src_st.st_size == dst_st.st_size and src_st.st_mtime_ns == dst_st.st_mtime_ns
+
+
+def _remove(path, is_dir):
+    if is_dir:
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _sync_item(item, reflink='auto', delta=False):
+    """
+    Copy one changed entry into the destination.
+
+    Files are written to a temporary name next to the target and renamed
+    over it, so an interrupted sync never leaves a half-written file under
+    the real name. In delta mode existing files are instead updated in
+    place, block by block (see copy_engine.delta_copy).
+    """
+    src, dst = item
+    if os.path.islink(src):
+        if os.path.lexists(dst):
+            os.remove(dst)
+        os.symlink(os.readlink(src), dst)
+        return 0
+    if delta and os.path.isfile(dst) and not os.path.islink(dst):
+        return copy_engine.delta_copy(src, dst)[2]
+    tmp = os.path.join(os.path.dirname(dst), f'.{os.path.basename(dst)}.sync-tmp')
+    try:
+        copied = copy_engine.copy_file(src, tmp, reflink=reflink)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+    return copied
+
+
+def plan_sync(src, dst, checksum=False, delete=False, stats=None, jobs=1, cache=None, walk_threads=1):
+    """
+    Compare two trees and collect the work needed to make dst a mirror of src.
+
+    Each source directory is listed together with its destination
+    counterpart, so an up-to-date mirror costs one metadata pass over both
+    trees. Missing destination directories are created on the way; extra
+    destination entries are only removed with delete=True.
+
+    :param src: str - source directory
+           dst: str - destination directory
+           checksum: bool - compare sha256 of files with equal size instead of mtime
+           delete: bool - remove destination entries that do not exist in src
+           stats: SyncStats or None - counters to update
+           jobs: int - workers hashing files in checksum mode
+           cache: HashCache or None - persistent digest cache for checksum mode
+           walk_threads: int - threads listing source directories
+    :return: tuple(list, list) - (src, dst) pairs to copy, (src dir, dst dir) pairs that were changed
+    """
+    stats = stats if stats is not None else SyncStats()
+    src = os.path.abspath(src)
+    dst = os.path.abspath(dst)
+    to_copy = []
+    to_hash = []
+    changed_dirs = []
+
+    for listing in walker.iter_dirs(src, stat=True, on_error=walker.log_error, threads=walk_threads):
+        target = os.path.normpath(os.path.join(dst, os.path.relpath(listing.path, src)))
+        existing = walker.list_dir(target, stat=True, on_error=None) if os.path.isdir(target) else None
+        dir_changed = existing is None
+        if existing is None:
+            os.makedirs(target, exist_ok=True)
+            existing = walker.Listing(target, 0, [], [])
+        theirs = {entry.name: entry for entry in existing.dirs + existing.files}
+        skipped = set()
+
+        for entry in listing.dirs + listing.files:
+            other = theirs.pop(entry.name, None)
+            dst_path = os.path.join(target, entry.name)
+            real_dir = entry.is_dir and not entry.is_symlink
+            if other is not None and (other.is_dir and not other.is_symlink) != real_dir:
+                if not delete:
+                    stats.conflicts += 1
+                    log.warning(f'Type conflict, not synced: {entry.path} -> {dst_path}')
+                    skipped.add(entry.name)
+                    continue
+                try:
+                    _remove(dst_path, other.is_dir and not other.is_symlink)
+                except OSError as e:
+                    stats.errors += 1
+                    log.error('Error deleting %s: %s', dst_path, e)
+                    skipped.add(entry.name)
+                    continue
+                stats.deleted += 1
+                other = None
+            if real_dir:
+                # a new subdirectory is created inside target later on
+                dir_changed = dir_changed or other is None
+                continue
+            if other is None:
+                to_copy.append((entry.path, dst_path))
+                dir_changed = True
+            elif entry.is_symlink or other.is_symlink:
+                if not (entry.is_symlink and other.is_symlink and os.readlink(entry.path) == os.readlink(dst_path)):
+                    to_copy.append((entry.path, dst_path))
+                    dir_changed = True
+                else:
+                    stats.unchanged += 1
+            elif entry.stat.st_size != other.stat.st_size:
+                to_copy.append((entry.path, dst_path))
+                dir_changed = True
+            elif checksum:
+                to_hash.append((entry.path, dst_path))
+            elif _same_metadata(entry.stat, other.stat):
+                stats.unchanged += 1
+            else:
+                to_copy.append((entry.path, dst_path))
+                dir_changed = True
+
+        if skipped:
+            # the walk must not descend into source folders whose destination is not a folder
+            listing.dirs[:] = [entry for entry in listing.dirs if entry.name not in skipped]
+
+        if delete:
+            for name, other in theirs.items():
+                dst_path = os.path.join(target, name)
+                try:
+                    _remove(dst_path, other.is_dir and not other.is_symlink)
+                    stats.deleted += 1
+                    dir_changed = True
+                    log.info('Deleted extra entry: %s', dst_path)
+                except OSError as e:
+                    stats.errors += 1
+                    log.error('Error deleting %s: %s', dst_path, e)
+        if dir_changed:
+            changed_dirs.append((listing.path, target))
+
+    if to_hash:
+        worker = partial(hash_file, method='sha256')
+        paths = [path for pair in to_hash for path in pair]
+        digests = {path: (digest, error) for path, digest, error, _ in
+                   cached_map(worker, paths, 'sha256', cache, jobs)}
+        for src_path, dst_path in to_hash:
+            if digests[src_path][1] is None and digests[src_path] == digests[dst_path]:
+                stats.unchanged += 1
+            else:
+                to_copy.append((src_path, dst_path))
+                changed_dirs.append((os.path.dirname(src_path), os.path.dirname(dst_path)))
+
+    return to_copy, changed_dirs
+
+
+def sync_tree(src, dst, checksum=False, delete=False, jobs=1, reflink='auto', cache=None, walk_threads=1,
+              delta=False, on_error=copy_engine.print_error):
+    """
+    Make dst a mirror of src, copying only new or changed files.
+
+    :param src: str - source directory
+           dst: str - destination directory, created if missing
+           checksum: bool - compare file contents (sha256) instead of size and mtime
+           delete: bool - remove destination entries that do not exist in src
+           jobs: int - number of files copied (and hashed) in parallel
+           reflink: str - 'auto', 'always' or 'never', see copy_engine.copy_file()
+           cache: HashCache or None - persistent digest cache for checksum mode
+           walk_threads: int - threads listing source directories
+           delta: bool - rewrite only changed blocks of files that exist in dst
+           on_error: callable(src, dst, error) - called for files that cannot be copied
+    :return: SyncStats
+    """
+    stats = SyncStats()
+    to_copy, changed_dirs = plan_sync(src, dst, checksum, delete, stats, jobs, cache, walk_threads)
+
+    worker = partial(_sync_item, reflink=reflink, delta=delta)
+    for (src_path, dst_path), size, error in parallel_map(worker, to_copy, jobs):
+        if error is not None:
+            stats.errors += 1
+            log.error('Error copying %s to %s: %s', src_path, dst_path, error)
+            on_error(src_path, dst_path, error)
+            continue
+        stats.add(size)
+
+    # deepest directories first, so restoring a child does not touch its parent again
+    for src_dir, dst_dir in sorted(set(changed_dirs), key=lambda pair: len(pair[1]), reverse=True):
+        shutil.copystat(src_dir, dst_dir)
+    return stats
+
+
+def run(args):
+    """
+    Synchronize a destination directory with a source directory.
+
+    Only new and changed files are copied; files are compared by size and
+    modification time, or by content with --checksum. Extra files in the
+    destination are kept unless --delete is given. Rerunning on an unchanged
+    mirror only reads metadata.
+
+    :param args: argparse.Namespace with fields:
+           src: str, source directory
+           dst: str, destination directory (created if missing)
+           checksum: bool (optional), compare sha256 instead of size and mtime
+           delete: bool (optional), delete files that do not exist in the source
+           jobs: int (optional), number of files copied in parallel, default 1
+           reflink: str (optional), 'auto', 'always' or 'never'
+           walk_threads: int (optional), threads listing directories in parallel
+           delta: bool (optional), update changed files in place, rewriting only changed blocks
+           no_cache: bool (optional), do not use the persistent hash cache in checksum mode
+           cache_file: str (optional), path to the hash cache database
+           format: str (optional), output format: 'text', 'ndjson' or 'csv'
+    :raises: FileNotFoundError if the source does not exist
+             NotADirectoryError if the source is not a directory
+    :return: SyncStats
+    """
+    src = os.path.abspath(args.src)
+    dst = os.path.abspath(args.dst)
+    checksum = getattr(args, 'checksum', False)
+    delete = getattr(args, 'delete', False)
+    jobs = getattr(args, 'jobs', None) or 1
+    reflink = getattr(args, 'reflink', None) or 'auto'
+    walk_threads = getattr(args, 'walk_threads', None) or 1
+    delta = getattr(args, 'delta', False)
+
+    log.info(f'Sync command started: src={src}, dst={dst}, checksum={checksum}, delete={delete}')
+
+    if not os.path.exists(src):
+        log.error(f'Source does not exist: {src}')
+        raise FileNotFoundError(f'Source does not exist: {src}')
+
+    if not os.path.isdir(src):
+        log.error(f'Source is not a directory: {src}')
+        raise NotADirectoryError(f'Source is not a directory: {src}')
+
+    out = output.from_args(args, ('src', 'dst', 'files', 'bytes', 'unchanged', 'deleted', 'conflicts', 'errors',
+                                  'seconds', 'error'))
+
+    def on_error(src_path, dst_path, error):
+        out.emit(f'Error copying {src_path} to {dst_path}: {error}', src=src_path, dst=dst_path, error=str(error))
+
+    with out:
+        cache = open_from_args(args) if checksum else None
+        try:
+            stats = sync_tree(src, dst, checksum, delete, jobs, reflink, cache, walk_threads, delta, on_error)
+        finally:
+            if cache is not None:
+                cache.close()
+
+        log.info(f'Sync completed: {stats.report()}')
+        record = stats.as_record()
+        record.pop('skipped')
+        out.emit(f'Synced {src} -> {dst}: {stats.report()}', src=src, dst=dst, **record)
+        if stats.conflicts:
+            out.emit(f'{stats.conflicts} entries differ in type (file vs folder), use --delete to replace them')
+    return stats
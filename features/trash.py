@@ -0,0 +1,255 @@
+import os
+import stat
+import json
+import errno
+import time
+import uuid
+import shutil
+import logging
+
+from features import delete, output
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TRASH_DIR = os.environ.get(
+    'DIRTOOLS_TRASH_DIR',
+    os.path.join(os.path.expanduser('~'), '.local', 'share', 'dir_tools', 'trash')
+)
+
+# other filesystems get their own trash directory, remembered in this file of the default trash
+LOCATIONS_FILE = 'locations.txt'
+
+
+def _device(path):
+    """st_dev of a path or of its nearest existing parent."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev
+
+
+def _mount_point(path):
+    path = os.path.abspath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def trash_dir_for(path):
+    """
+    Choose the trash directory for a path, always on the same filesystem.
+
+    The default trash is used when it lives on the same filesystem as the
+    path; otherwise a per-user trash directory at the mount point of the path.
+
+    :param path: str - file or directory to be trashed
+    :return: str - trash directory
+    """
+    device = os.lstat(path).st_dev
+    if _device(DEFAULT_TRASH_DIR) == device:
+        return DEFAULT_TRASH_DIR
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(_mount_point(os.path.dirname(os.path.abspath(path))), f'.dir_tools_trash-{uid}')
+
+
+def _prepare_trash_dir(trash_dir):
+    """
+    Create a trash directory only its owner can enter, or check an existing one.
+
+    Like the freedesktop .Trash-$uid rules: the directory must be a real
+    directory (no symlink) owned by the current user. A directory of ours
+    with wider permissions (created by an older version) is tightened to 0700.
+
+    :param trash_dir: str - trash directory
+    :raises: PermissionError if an existing directory is not safe to use
+    """
+    os.makedirs(trash_dir, mode=0o700, exist_ok=True)
+    st = os.lstat(trash_dir)
+    if not stat.S_ISDIR(st.st_mode) or (hasattr(os, 'getuid') and st.st_uid != os.getuid()):
+        raise PermissionError(f'Unsafe trash directory, not a directory owned by this user: {trash_dir}')
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        os.chmod(trash_dir, 0o700)
+
+
+def trash_dirs():
+    """
+    All trash directories that were used so far.
+
+    :return: list of str
+    """
+    dirs = [DEFAULT_TRASH_DIR]
+    try:
+        with open(os.path.join(DEFAULT_TRASH_DIR, LOCATIONS_FILE)) as f:
+            dirs += [line.strip() for line in f if line.strip() and line.strip() not in dirs]
+    except FileNotFoundError:
+        pass
+    return dirs
+
+
+def _remember(trash_dir):
+    if trash_dir in trash_dirs():
+        return
+    os.makedirs(DEFAULT_TRASH_DIR, exist_ok=True)
+    with open(os.path.join(DEFAULT_TRASH_DIR, LOCATIONS_FILE), 'a') as f:
+        f.write(trash_dir + '\n')
+
+
+def move_to_trash(path):
+    """
+    Move a file or directory into the trash with a single rename.
+
+    Every trashed item gets its own folder holding the renamed entry
+    ('data') and its metadata ('info.json'), so the cost does not depend
+    on the size of the tree.
+
+    :param path: str - file or directory
+    :return: str - id of the trash item
+    :raises: OSError if the path cannot be renamed into the trash
+    """
+    path = os.path.abspath(path)
+    trash_dir = trash_dir_for(path)
+    item_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    item = os.path.join(trash_dir, item_id)
+    _prepare_trash_dir(trash_dir)
+    os.mkdir(item, 0o700)
+    with open(os.path.join(item, 'info.json'), 'w') as f:
+        json.dump({'path': path, 'deleted_at': time.time()}, f)
+    try:
+        os.rename(path, os.path.join(item, 'data'))
+    except OSError:
+        shutil.rmtree(item)
+        raise
+    if trash_dir != DEFAULT_TRASH_DIR:
+        _remember(trash_dir)
+    return item_id
+
+
+def list_items():
+    """
+    Trashed items of all trash directories, oldest first.
+
+    :return: list of dict with keys id, path (original location), deleted_at, location
+    """
+    items = []
+    for trash_dir in trash_dirs():
+        try:
+            names = os.listdir(trash_dir)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            try:
+                with open(os.path.join(trash_dir, name, 'info.json')) as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                continue
+            info.update(id=name, location=os.path.join(trash_dir, name))
+            items.append(info)
+    return sorted(items, key=lambda item: item['deleted_at'])
+
+
+def _find(item_id):
+    for item in list_items():
+        if item['id'] == item_id:
+            return item
+    raise FileNotFoundError(f'No such item in trash: {item_id}')
+
+
+def restore(item_id, to=None):
+    """
+    Move a trashed item back to its original (or a new) location.
+
+    :param item_id: str - id of the trash item
+           to: str or None - restore to this path instead of the original one
+    :return: str - restored path
+    :raises: FileNotFoundError if there is no such item
+             FileExistsError if the target path already exists
+             OSError if the item cannot be moved or copied to the target
+    """
+    item = _find(item_id)
+    target = os.path.abspath(to or item['path'])
+    if os.path.lexists(target):
+        raise FileExistsError(f'Cannot restore, path already exists: {target}')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    data = os.path.join(item['location'], 'data')
+    try:
+        os.rename(data, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # restoring onto another filesystem: copy, then delete the trashed data
+        log.info('Restoring %s across filesystems to %s', item_id, target)
+        shutil.move(data, target)
+    shutil.rmtree(item['location'])
+    return target
+
+
+def purge(older_than=None, item_id=None, jobs=1):
+    """
+    Delete trashed items for good with the parallel delete engine.
+
+    :param older_than: float or None - only purge items trashed more than this many days ago
+           item_id: str or None - only purge this item
+           jobs: int - number of deleting threads
+    :return: tuple(int, delete.DeleteStats) - (purged items, combined counters)
+    """
+    stats = delete.DeleteStats()
+    limit = time.time() - older_than * 86400 if older_than is not None else None
+    purged = 0
+    for item in list_items():
+        if item_id is not None and item['id'] != item_id:
+            continue
+        if limit is not None and item['deleted_at'] > limit:
+            continue
+        data = os.path.join(item['location'], 'data')
+        if os.path.isdir(data) and not os.path.islink(data):
+            delete.delete_tree(data, jobs, stats=stats)
+        elif os.path.lexists(data):
+            os.remove(data)
+            stats.files += 1
+        if not os.path.lexists(data):
+            shutil.rmtree(item['location'])
+            purged += 1
+    return purged, stats
+
+
+def run(args):
+    """
+    Manage the trash used by delete --async.
+
+    Actions:
+        list    - print trashed items with their id and original location
+        restore - move an item back (--id, optional --to)
+        purge   - delete items for good (all, --id, or --older-than DAYS)
+
+    :param args: argparse.Namespace with fields:
+           action: str, one of 'list', 'restore', 'purge'
+           id: str (optional), trash item id
+           to: str (optional), restore to this path
+           older_than: float (optional), purge only items older than this many days
+           jobs: int (optional), number of deleting threads for purge
+           format: str (optional), output format: 'text', 'ndjson' or 'csv'
+    :return: None, prints results to stdout and logs actions
+    :raises: ValueError if restore is called without --id
+    """
+    action = args.action
+    item_id = getattr(args, 'id', None)
+
+    log.info(f'Trash command started: action={action}, id={item_id}')
+
+    if action == 'restore' and not item_id:
+        raise ValueError('restore needs --id of the trash item')
+
+    with output.from_args(args, ('id', 'deleted_at', 'path', 'purged', 'files', 'dirs')) as out:
+        if action == 'restore':
+            target = restore(item_id, getattr(args, 'to', None))
+            log.info(f'Restored {item_id} to {target}')
+            out.emit(f'Restored {item_id} -> {target}', id=item_id, path=target)
+        elif action == 'purge':
+            purged, stats = purge(getattr(args, 'older_than', None), item_id, getattr(args, 'jobs', None) or 1)
+            log.info(f'Purged {purged} trash items: {stats.report()}')
+            out.emit(f'Purged {purged} items: {stats.report()}', purged=purged, files=stats.files, dirs=stats.dirs)
+        else:
+            for item in list_items():
+                deleted = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item['deleted_at']))
+                out.emit(f'{item["id"]}  {deleted}  {item["path"]}', id=item['id'], deleted_at=item['deleted_at'],
+                         path=item['path'])
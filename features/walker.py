@@ -0,0 +1,365 @@
+import os
+import logging
+from fnmatch import fnmatch
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+Entry = namedtuple('Entry', ['path', 'name', 'depth', 'is_dir', 'is_symlink', 'stat'])
+Entry.__doc__ = """
+A single directory entry produced by the walker.
+
+    path: str - full path of the entry
+    name: str - base name
+    depth: int - 1 for entries directly inside the walked directory
+    is_dir: bool - entry is a directory (or a symlink to one)
+    is_symlink: bool - entry is a symbolic link
+    stat: os.stat_result or None - only filled when the walk was asked for stat
+"""
+
+Listing = namedtuple('Listing', ['path', 'depth', 'dirs', 'files'])
+Listing.__doc__ = """
+Contents of one directory, the walker counterpart of an os.walk() tuple.
+
+    path: str - path of the directory
+    depth: int - 0 for the walked directory itself
+    dirs: list of Entry - subdirectories
+    files: list of Entry - everything that is not a directory
+"""
+
+CachedStat = namedtuple('CachedStat', ['st_size', 'st_blocks', 'st_mtime_ns', 'st_ctime_ns', 'st_ino', 'st_mode'])
+CachedStat.__doc__ = """
+Subset of os.stat_result restored from a listing cache.
+"""
+
+
+class ListingCache:
+    """
+    In-memory cache of directory listings validated by directory mtime/ctime.
+
+    Adding, removing or renaming an entry changes the mtime of its directory,
+    so while (st_mtime_ns, st_ctime_ns) of a directory stay the same its
+    cached children can be reused without listing it again. Changes of file
+    contents do not touch the directory, so stat data of cached files may
+    be stale; rescan fully when exact sizes matter.
+
+    Any object with the same get/put/forget methods (e.g. index.DirIndex)
+    can be passed to iter_dirs() as a cache. A cache must always be used
+    with the same stat and exclude_dirs options.
+
+    reused: int - directories answered from the cache
+    rescanned: int - directories that had to be listed
+    """
+
+    def __init__(self):
+        self.listings = dict()
+        self.reused = 0
+        self.rescanned = 0
+
+    def get(self, path, depth, st):
+        """
+        Return the cached listing of a directory if it is still valid.
+
+        :param path: str - directory
+               depth: int - depth of the directory in the current walk
+               st: os.stat_result - fresh stat of the directory
+        :return: Listing or None
+        """
+        cached = self.listings.get(path)
+        if cached is None or cached[0] != (st.st_mtime_ns, st.st_ctime_ns):
+            self.rescanned += 1
+            return None
+        self.reused += 1
+        listing = cached[1]
+        if listing.depth != depth:
+            shift = depth - listing.depth
+            listing = Listing(path, depth, [e._replace(depth=e.depth + shift) for e in listing.dirs],
+                              [e._replace(depth=e.depth + shift) for e in listing.files])
+        return Listing(path, depth, list(listing.dirs), list(listing.files))
+
+    def put(self, path, st, listing):
+        """
+        Store a fresh listing of a directory.
+
+        :param path: str - directory
+               st: os.stat_result - stat of the directory taken before listing it
+               listing: Listing
+        """
+        listing = Listing(path, listing.depth, list(listing.dirs), list(listing.files))
+        self.listings[path] = ((st.st_mtime_ns, st.st_ctime_ns), listing)
+
+    def forget(self, path):
+        """Drop a directory that no longer exists or cannot be listed."""
+        self.listings.pop(path, None)
+
+
+def log_error(error):
+    """
+    Default error callback for walks: log the error and continue.
+
+    :param error: OSError - error raised while listing or stating an entry
+    """
+    log.warning('Cannot access %s: %s', error.filename, error)
+
+
+def _matches(name, patterns):
+    """Check whether a name matches any of the glob patterns."""
+    return any(fnmatch(name, pattern) for pattern in patterns)
+
+
+def _stat(entry):
+    """Stat a DirEntry like os.stat(), falling back to lstat for broken symlinks."""
+    try:
+        return entry.stat()
+    except FileNotFoundError:
+        if entry.is_symlink():
+            return entry.stat(follow_symlinks=False)
+        raise
+
+
+def list_dir(path, depth=0, stat=False, on_error=None, exclude_dirs=None):
+    """
+    List one directory with os.scandir().
+
+    Directory checks and stat results come from the cached DirEntry data,
+    so no extra stat calls are made per entry apart from the optional stat.
+
+    :param path: str - directory to list
+           depth: int - depth of the directory itself
+           stat: bool - fill Entry.stat for every entry
+           on_error: callable(OSError) or None - called for unreadable entries
+           exclude_dirs: list of str or None - glob patterns of directory names to skip
+    :return: Listing or None if the directory itself cannot be listed
+    """
+    dirs = []
+    files = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    if is_dir and exclude_dirs and _matches(entry.name, exclude_dirs):
+                        continue
+                    record = Entry(entry.path, entry.name, depth + 1, is_dir, entry.is_symlink(),
+                                   _stat(entry) if stat else None)
+                except OSError as e:
+                    if on_error is not None:
+                        on_error(e)
+                    continue
+                (dirs if is_dir else files).append(record)
+    except OSError as e:
+        if on_error is not None:
+            on_error(e)
+        return None
+    return Listing(path, depth, dirs, files)
+
+
+class _Prefetcher:
+    """
+    Lists directories ahead of the walk on a bounded thread pool.
+
+    Directories are scheduled in the order the serial walk will need them
+    and at most `limit` listings are in flight or waiting to be consumed.
+    A directory that was not prefetched in time is listed in the caller's
+    thread, so the walk never waits on a queue.
+    """
+
+    def __init__(self, threads, stat, on_error, exclude_dirs):
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='walker')
+        self.limit = threads * 4
+        self.args = (stat, on_error, exclude_dirs)
+        self.futures = dict()
+        self.wanted = []
+        self.listed = set()
+
+    def schedule(self, entries):
+        """Queue directories for prefetching, the first entry is needed first."""
+        self.wanted.extend(reversed(entries))
+        self._fill()
+
+    def _fill(self):
+        while self.wanted and len(self.futures) < self.limit:
+            entry = self.wanted.pop()
+            if entry.path in self.listed:
+                self.listed.discard(entry.path)
+                continue
+            self.futures[entry.path] = self.pool.submit(list_dir, entry.path, entry.depth, *self.args)
+
+    def fetch(self, entry):
+        """Return the listing of a directory, waiting for its prefetch if there is one."""
+        future = self.futures.pop(entry.path, None)
+        if future is None:
+            self.listed.add(entry.path)
+            listing = list_dir(entry.path, entry.depth, *self.args)
+        else:
+            listing = future.result()
+        self._fill()
+        return listing
+
+    def skip(self, entry):
+        """Forget a scheduled directory the walk decided not to enter."""
+        future = self.futures.pop(entry.path, None)
+        if future is None:
+            self.listed.add(entry.path)
+        else:
+            future.cancel()
+        self._fill()
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_dirs(top, max_depth=None, follow_symlinks=False, stat=False, on_error=None,
+              exclude_dirs=None, topdown=True, threads=1, cache=None):
+    """
+    Walk a directory tree and yield one Listing per directory.
+
+    Works like os.walk(): with topdown=True a caller may remove items from
+    Listing.dirs to prune the walk. Symlinks to directories are reported in
+    Listing.dirs but only descended into with follow_symlinks=True (each
+    real directory is visited once, so symlink loops are safe).
+
+    With threads > 1 subdirectories are listed ahead of time on a thread
+    pool, which hides metadata latency on network filesystems. The yielded
+    listings are exactly the same and come in the same order as in a serial
+    walk; only the order of on_error calls may differ.
+
+    With a cache (see ListingCache) every directory is stat-ed first and
+    only listed when its mtime/ctime changed since it was cached; cached
+    directories are not prefetched.
+
+    :param top: str - directory to walk
+           max_depth: int or None - deepest entry depth to report (1 = only top contents)
+           follow_symlinks: bool - descend into symlinked directories
+           stat: bool - fill Entry.stat for every entry
+           on_error: callable(OSError) or None - error callback, errors are ignored if None
+           exclude_dirs: list of str or None - glob patterns of directory names to prune
+           topdown: bool - yield a directory before (True) or after (False) its subdirectories
+           threads: int - number of threads listing directories
+           cache: ListingCache or None - reuse listings of unchanged directories
+    :return: generator of Listing
+    """
+    visited = set()
+    if follow_symlinks:
+        try:
+            st = os.stat(top)
+            visited.add((st.st_dev, st.st_ino))
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            return
+
+    def may_descend(entry):
+        if max_depth is not None and entry.depth >= max_depth:
+            return False
+        return follow_symlinks or not entry.is_symlink
+
+    def first_visit(entry):
+        try:
+            st = os.stat(entry.path)
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            return False
+        key = (st.st_dev, st.st_ino)
+        if key in visited:
+            return False
+        visited.add(key)
+        return True
+
+    def descend(entry):
+        if not may_descend(entry):
+            return False
+        if follow_symlinks and not first_visit(entry):
+            if prefetcher is not None:
+                prefetcher.skip(entry)
+            return False
+        return True
+
+    prefetcher = _Prefetcher(threads, stat, on_error, exclude_dirs) if threads > 1 and cache is None else None
+
+    def load(path, depth):
+        if cache is None:
+            return list_dir(path, depth, stat, on_error, exclude_dirs)
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            cache.forget(path)
+            return None
+        listing = cache.get(path, depth, st)
+        if listing is None:
+            listing = list_dir(path, depth, stat, on_error, exclude_dirs)
+            if listing is None:
+                cache.forget(path)
+            else:
+                cache.put(path, st, listing)
+        return listing
+
+    def fetch(entry):
+        if prefetcher is None:
+            return load(entry.path, entry.depth)
+        return prefetcher.fetch(entry)
+
+    def expand(listing):
+        subdirs = list(listing.dirs)
+        if prefetcher is not None:
+            prefetcher.schedule([entry for entry in subdirs if may_descend(entry)])
+        return iter(subdirs)
+
+    try:
+        root = load(top, 0)
+        if root is None:
+            return
+        if topdown:
+            yield root
+        stack = [(root, expand(root))]
+        while stack:
+            listing, subdirs = stack[-1]
+            for entry in subdirs:
+                if descend(entry):
+                    child = fetch(entry)
+                    if child is None:
+                        continue
+                    if topdown:
+                        yield child
+                    stack.append((child, expand(child)))
+                    break
+            else:
+                stack.pop()
+                if not topdown:
+                    yield listing
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+
+
+def walk(top, include=None, exclude=None, max_depth=None, follow_symlinks=False, stat=False,
+         on_error=None, exclude_dirs=None, dirs=False, threads=1, cache=None):
+    """
+    Walk a directory tree and yield entries one by one.
+
+    :param top: str - directory to walk
+           include: list of str or None - glob patterns, only matching names are yielded
+           exclude: list of str or None - glob patterns of names that are not yielded
+           max_depth: int or None - deepest entry depth to report (1 = only top contents)
+           follow_symlinks: bool - descend into symlinked directories
+           stat: bool - fill Entry.stat for every entry
+           on_error: callable(OSError) or None - error callback, errors are ignored if None
+           exclude_dirs: list of str or None - glob patterns of directory names to prune
+           dirs: bool - also yield directory entries
+           threads: int - number of threads listing directories
+           cache: ListingCache or None - reuse listings of unchanged directories
+    :return: generator of Entry
+    """
+    for listing in iter_dirs(top, max_depth, follow_symlinks, stat, on_error, exclude_dirs,
+                             threads=threads, cache=cache):
+        entries = listing.dirs + listing.files if dirs else listing.files
+        for entry in entries:
+            if include and not _matches(entry.name, include):
+                continue
+            if exclude and _matches(entry.name, exclude):
+                continue
+            yield entry
@@ -42,6 +42,16 @@ class TestAddDate(unittest.TestCase):
         for filename in files:
             self.assertIn(self.creation_date, filename)
 
+    def test_dangling_symlink_is_skipped(self):
+        """A broken symlink in the folder is left alone instead of aborting the run"""
+        link = os.path.join(self.test_dir, 'broken.txt')
+        os.symlink('missing.txt', link)
+
+        add_date.run(Namespace(path=self.test_dir, recursive=False))
+
+        self.assertTrue(os.path.islink(link))
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, f'{self.creation_date}_example.txt')))
+
     def test_recursive_add_date(self):
         """Check recursive renaming"""
         subfolder = os.path.join(self.test_dir, 'sub')
@@ -1,8 +1,13 @@
 import unittest
+import io
 import os
 import sys
 import shutil
+import argparse
 import subprocess
+from unittest import mock
+
+from features import analyse
 
 
 class TestAnalyseCommand(unittest.TestCase):
@@ -39,6 +44,58 @@ class TestAnalyseCommand(unittest.TestCase):
         self.assertIn('file1.txt', result.stdout)
         self.assertIn('file2.txt', result.stdout)
 
+    def test_scan_tree_single_pass(self):
+        """Check directory totals at every depth and largest files"""
+        nested = os.path.join(self.test_dir, 'sub', 'deep')
+        os.makedirs(nested, exist_ok=True)
+        with open(os.path.join(nested, 'big.bin'), 'wb') as f:
+            f.write(b'x' * 5000)
+
+        totals, top_files, largest = analyse.scan_tree(self.test_dir, depth=2, top=2)
+
+        self.assertEqual(totals[self.test_dir].files, 4)
+        self.assertEqual(totals[self.test_dir].apparent, 5000 + 3 * len('Test file 0'))
+        self.assertEqual(totals[os.path.join(self.test_dir, 'sub')].apparent, 5000)
+        self.assertEqual(totals[nested].files, 1)
+        self.assertEqual(len(top_files), 3)
+        self.assertEqual(largest[0], (5000, os.path.join(nested, 'big.bin')))
+        self.assertEqual(len(largest), 2)
+
+        totals, _, _ = analyse.scan_tree(self.test_dir, depth=1)
+        self.assertNotIn(nested, totals)
+        self.assertEqual(totals[os.path.join(self.test_dir, 'sub')].files, 1)
+
+    def test_analyse_depth_report(self):
+        """Check --depth and --top output"""
+        os.makedirs(os.path.join(self.test_dir, 'sub'), exist_ok=True)
+        manager_path = os.path.join(self.project_root, 'manager.py')
+        result = subprocess.run(
+            [sys.executable, manager_path, 'analyse', '-p', self.test_dir, '--depth', '1', '--top', '1'],
+            capture_output=True,
+            text=True,
+            cwd=self.project_root
+        )
+
+        self.assertEqual(result.returncode, 0, msg=f'Error: {result.stderr}')
+        self.assertIn('Directory sizes (depth 1):', result.stdout)
+        self.assertIn('Largest files:', result.stdout)
+        self.assertIn(' - sub  -  0 B', result.stdout)
+
+    def test_unreadable_root(self):
+        """A directory that cannot be listed is reported instead of failing with KeyError"""
+        scandir = os.scandir
+
+        def denied(path='.'):
+            if path == self.test_dir:
+                raise PermissionError(13, 'Permission denied', path)
+            return scandir(path)
+
+        args = argparse.Namespace(path=self.test_dir, depth=1, top=1)
+        with mock.patch('os.scandir', denied), mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            analyse.run(args)
+
+        self.assertEqual(out.getvalue(), f'Cannot read directory: {self.test_dir}\n')
+
 
 if __name__ == '__main__':
     unittest.main()
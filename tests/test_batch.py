@@ -0,0 +1,109 @@
+import unittest
+import os
+import io
+import json
+import shutil
+import argparse
+from unittest import mock
+
+from features import batch, cli, hash_cache, journal
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = os.path.abspath('test_batch_dir')
+        self.data = os.path.join(self.test_dir, 'data')
+        os.makedirs(os.path.join(self.test_dir, 'dst'), exist_ok=True)
+        os.makedirs(self.data, exist_ok=True)
+        for i in range(3):
+            with open(os.path.join(self.data, f'file{i}.txt'), 'w') as f:
+                f.write(f'content {i}')
+        self.parsers = cli.build_parser().subcommands
+        # operations get the CLI defaults (hash cache and journal on), keep their files in the test folder
+        self.patches = [
+            mock.patch.object(hash_cache, 'DEFAULT_CACHE_PATH', os.path.join(self.test_dir, 'hashes.sqlite3')),
+            mock.patch.object(journal, 'DEFAULT_JOURNAL_DIR', os.path.join(self.test_dir, 'journals')),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        """Clean up test folders"""
+        for patch in self.patches:
+            patch.stop()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def run_batch(self, operations, jobs=1):
+        out = io.StringIO()
+        counts = batch.run_batch(operations, self.parsers, cli.commands, jobs, out)
+        return counts, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_results_in_manifest_order(self):
+        """Every operation gets one result line with its captured output"""
+        operations = [
+            {'id': 'c', 'command': 'count', 'path': self.data},
+            {'id': 'h', 'command': 'hashsum', 'path': os.path.join(self.data, 'file0.txt'), 'method': 'md5',
+             'no-cache': True},
+            {'id': 'x', 'command': 'nope'},
+            {'id': 'm', 'command': 'copy', 'src': os.path.join(self.data, 'file1.txt'),
+             'dst': os.path.join(self.test_dir, 'dst')},
+        ]
+
+        counts, results = self.run_batch(operations, jobs=3)
+
+        self.assertEqual(counts, (3, 1))
+        self.assertEqual([r['id'] for r in results], ['c', 'h', 'x', 'm'])
+        self.assertEqual([r['line'] for r in results], [1, 2, 3, 4])
+        self.assertIn('3', results[0]['output'])
+        self.assertIn('md5(', results[1]['output'])
+        self.assertFalse(results[2]['ok'])
+        self.assertIn('unknown command', results[2]['error'])
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'dst', 'file1.txt')))
+
+    def test_invalid_options(self):
+        """Unknown, missing and invalid options are reported per operation"""
+        operations = [
+            {'command': 'count'},
+            {'command': 'count', 'path': self.data, 'color': 'red'},
+            {'command': 'hashsum', 'path': self.data, 'method': 'crc'},
+            {'command': 'batch', 'manifest': 'x.jsonl'},
+        ]
+
+        counts, results = self.run_batch(operations)
+
+        self.assertEqual(counts, (0, 4))
+        self.assertIn('missing required options', results[0]['error'])
+        self.assertIn('unknown option', results[1]['error'])
+        self.assertIn('invalid choice', results[2]['error'])
+        self.assertIn('unknown command', results[3]['error'])
+
+    def test_namespace_defaults_and_types(self):
+        """Manifest values are converted like command line values"""
+        args = batch.namespace_for(self.parsers['hashsum'], 'hashsum',
+                                   {'path': 'x', 'jobs': '4', 'no_cache': 'yes'})
+        self.assertEqual((args.jobs, args.no_cache, args.method, args.executor), (4, True, 'sha256', 'thread'))
+
+        args = batch.namespace_for(self.parsers['move'], 'move', {'src': 'a', 'dst': 'b'})
+        self.assertEqual(args.src, ['a'])
+
+    def test_run_with_csv_manifest(self):
+        """CSV manifests with a header row, results written to a file"""
+        manifest = os.path.join(self.test_dir, 'ops.csv')
+        with open(manifest, 'w') as f:
+            f.write('id,command,path,method\n')
+            f.write(f'1,count,{self.data},\n')
+            f.write(f'2,hashsum,{os.path.join(self.data, "file2.txt")},md5\n')
+        output = os.path.join(self.test_dir, 'results.ndjson')
+        args = argparse.Namespace(manifest=manifest, jobs=2, output=output)
+
+        self.assertEqual(batch.run(args), (2, 0))
+
+        with open(output) as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual([r['id'] for r in results], ['1', '2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,11 +24,14 @@ class TestCLI(unittest.TestCase):
     def run_command(self, args):
         """Method for running manager.py with args"""
         manager_path = os.path.join(self.project_root, 'manager.py')
+        env = dict(os.environ, DIRTOOLS_CACHE=os.path.join(self.test_dir, 'hashes.sqlite3'),
+                   DIRTOOLS_JOURNAL_DIR=os.path.join(self.test_dir, 'journals'))
         result = subprocess.run(
             [sys.executable, manager_path] + args,
             capture_output=True,
             text=True,
-            cwd=self.project_root
+            cwd=self.project_root,
+            env=env
         )
         return result
 
@@ -2,7 +2,9 @@ import unittest
 import os
 import shutil
 import argparse
+from unittest import mock
 from features import copy as copy_feature
+from features import copy_engine
 
 
 class TestCopyCommand(unittest.TestCase):
@@ -23,6 +25,8 @@ class TestCopyCommand(unittest.TestCase):
         self.parser = argparse.ArgumentParser()
         self.parser.add_argument('-s', '--src', required=True)
         self.parser.add_argument('-d', '--dst', required=True)
+        self.parser.add_argument('-j', '--jobs', type=int, default=1)
+        self.parser.add_argument('--delta', action='store_true')
 
     def tearDown(self):
         """Clean up test folders"""
@@ -57,6 +61,184 @@ class TestCopyCommand(unittest.TestCase):
         with open(self.copy_file, 'r') as f:
             self.assertEqual(f.read(), 'Hello, world!')
 
+    def test_copy_delta_updates_existing_file(self):
+        """--delta updates the existing file instead of creating copy_ file"""
+        other_dir = os.path.join(self.test_dir, 'copy_target')
+        os.makedirs(other_dir, exist_ok=True)
+        with open(os.path.join(other_dir, 'example.txt'), 'w') as f:
+            f.write('Hello, there!')
+        args = self.parser.parse_args(['-s', self.src_file, '-d', other_dir, '--delta'])
+
+        dst = copy_feature.run(args)
+
+        self.assertEqual(dst, os.path.join(other_dir, 'example.txt'))
+        self.assertFalse(os.path.exists(os.path.join(other_dir, 'copy_example.txt')))
+        with open(dst) as f:
+            self.assertEqual(f.read(), 'Hello, world!')
+
+    def test_copy_folder_recursive(self):
+        """Copy a folder tree with several workers"""
+        src_dir = os.path.join(self.test_dir, 'tree')
+        os.makedirs(os.path.join(src_dir, 'sub', 'deeper'))
+        for name in ('a.txt', os.path.join('sub', 'b.txt'), os.path.join('sub', 'deeper', 'c.txt')):
+            with open(os.path.join(src_dir, name), 'w') as f:
+                f.write(name)
+        target = os.path.join(self.test_dir, 'target')
+        os.makedirs(target)
+
+        args = self.parser.parse_args(['-s', src_dir, '-d', target, '-j', '4'])
+        dst = copy_feature.run(args)
+
+        self.assertEqual(dst, os.path.join(target, 'tree'))
+        with open(os.path.join(dst, 'sub', 'deeper', 'c.txt')) as f:
+            self.assertEqual(f.read(), os.path.join('sub', 'deeper', 'c.txt'))
+        self.assertTrue(os.path.isfile(os.path.join(dst, 'a.txt')))
+
+
+class TestCopyEngine(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'tests/data_copy_engine'
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.data = os.urandom(300 * 1024)
+        self.src_file = os.path.join(self.test_dir, 'big.bin')
+        with open(self.src_file, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_copy_file_keeps_data_and_mtime(self):
+        """Copied file has the same content and modification time"""
+        os.utime(self.src_file, ns=(1_000_000_000, 1_000_000_000))
+        dst = os.path.join(self.test_dir, 'copy.bin')
+
+        copied = copy_engine.copy_file(self.src_file, dst, buffer_size=4096)
+
+        self.assertEqual(copied, len(self.data))
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.stat(dst).st_mtime_ns, 1_000_000_000)
+
+    def test_buffer_fallback_from_offset(self):
+        """Buffered copy continues at the offset a zero-copy method reached"""
+        dst = os.path.join(self.test_dir, 'copy.bin')
+        with open(self.src_file, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            os.write(fdst.fileno(), self.data[:1000])
+            end = copy_engine._copy_buffered(fsrc.fileno(), fdst.fileno(), 1000, 4096)
+
+        self.assertEqual(end, len(self.data))
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_copy_tree_stats_and_symlinks(self):
+        """Tree copy counts files and recreates symlinks"""
+        src_dir = os.path.join(self.test_dir, 'src')
+        os.makedirs(os.path.join(src_dir, 'sub'))
+        for i in range(10):
+            with open(os.path.join(src_dir, 'sub', f'f{i}'), 'wb') as f:
+                f.write(b'x' * i)
+        os.symlink('sub', os.path.join(src_dir, 'link'))
+        dst_dir = os.path.join(self.test_dir, 'dst')
+
+        stats = copy_engine.copy_tree(src_dir, dst_dir, jobs=3)
+
+        self.assertEqual(stats.files, 11)
+        self.assertEqual(stats.bytes, sum(range(10)))
+        self.assertEqual(stats.errors, 0)
+        self.assertTrue(os.path.islink(os.path.join(dst_dir, 'link')))
+        self.assertEqual(os.readlink(os.path.join(dst_dir, 'link')), 'sub')
+        self.assertEqual(sorted(os.listdir(os.path.join(dst_dir, 'sub'))), sorted(f'f{i}' for i in range(10)))
+        self.assertIn('files/s', stats.report())
+
+    def _clone_supported(self):
+        """Check whether the test folder is on a filesystem that supports reflinks"""
+        probe = os.path.join(self.test_dir, 'probe')
+        with open(self.src_file, 'rb') as fsrc, open(probe, 'wb') as fdst:
+            return copy_engine.clone(fsrc.fileno(), fdst.fileno())
+
+    def test_reflink_clone(self):
+        """Clone shares data on copy-on-write filesystems"""
+        if not self._clone_supported():
+            self.skipTest('filesystem does not support reflinks')
+        dst = os.path.join(self.test_dir, 'clone.bin')
+
+        self.assertEqual(copy_engine.copy_file(self.src_file, dst, reflink='always'), len(self.data))
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_reflink_always_unsupported(self):
+        """reflink='always' fails instead of copying the data"""
+        if self._clone_supported():
+            self.skipTest('filesystem supports reflinks')
+        with self.assertRaises(OSError):
+            copy_engine.copy_file(self.src_file, os.path.join(self.test_dir, 'clone.bin'), reflink='always')
+
+    def test_reflink_auto_falls_back(self):
+        """reflink='auto' copies the data when cloning is not possible"""
+        dst = os.path.join(self.test_dir, 'copy.bin')
+        with mock.patch.object(copy_engine, 'clone', return_value=False) as clone:
+            copy_engine.copy_file(self.src_file, dst)
+
+        clone.assert_called_once()
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_reflink_never(self):
+        """reflink='never' does not try to clone"""
+        dst = os.path.join(self.test_dir, 'copy.bin')
+        with mock.patch.object(copy_engine, 'clone') as clone:
+            copy_engine.copy_file(self.src_file, dst, reflink='never')
+
+        clone.assert_not_called()
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_delta_copy_rewrites_changed_blocks(self):
+        """Only blocks that differ are written"""
+        dst = os.path.join(self.test_dir, 'copy.bin')
+        copy_engine.copy_file(self.src_file, dst)
+        data = bytearray(self.data)
+        data[5000:5010] = b'0123456789'
+        data[200 * 1024] ^= 0xff
+        with open(self.src_file, 'wb') as f:
+            f.write(data)
+
+        blocks, rewritten, written = copy_engine.delta_copy(self.src_file, dst, block_size=4096, batch_blocks=8)
+
+        self.assertEqual((blocks, rewritten, written), (75, 2, 8192))
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), bytes(data))
+        self.assertEqual(os.stat(dst).st_mtime_ns, os.stat(self.src_file).st_mtime_ns)
+
+    def test_delta_copy_size_changes(self):
+        """Delta copy extends or truncates the destination"""
+        # a repeated page: blocks read from a wrong dst offset would look unchanged
+        data = os.urandom(4096) * 75
+        with open(self.src_file, 'wb') as f:
+            f.write(data)
+        dst = os.path.join(self.test_dir, 'copy.bin')
+        with open(dst, 'wb') as f:
+            f.write(data[:9 * 4096 + 1000])
+        blocks, rewritten, _ = copy_engine.delta_copy(self.src_file, dst, block_size=4096, batch_blocks=8)
+        self.assertEqual((blocks, rewritten), (75, 66))
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        with open(self.src_file, 'wb') as f:
+            f.write(data[:10000])
+        _, rewritten, _ = copy_engine.delta_copy(self.src_file, dst, block_size=4096)
+        self.assertEqual(rewritten, 0)
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), data[:10000])
+
+    def test_copy_tree_existing_destination(self):
+        """Tree copy refuses to merge into an existing folder"""
+        with self.assertRaises(FileExistsError):
+            copy_engine.copy_tree(self.test_dir, self.test_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
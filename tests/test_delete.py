@@ -1,7 +1,9 @@
 import unittest
+import io
 import os
 import shutil
 import argparse
+from unittest import mock
 from features import delete
 
 
@@ -23,6 +25,8 @@ class TestDelete(unittest.TestCase):
         # Emulate manager.py
         self.parser = argparse.ArgumentParser()
         self.parser.add_argument('-s', '--src', required=True)
+        self.parser.add_argument('-j', '--jobs', type=int, default=1)
+        self.parser.add_argument('--dry-run', action='store_true')
 
     def tearDown(self):
         """Clean up test folders"""
@@ -47,6 +51,44 @@ class TestDelete(unittest.TestCase):
         with self.assertRaises(FileNotFoundError):
             delete.run(args)
 
+    def make_tree(self):
+        tree = os.path.join(self.test_dir, 'tree')
+        for i in range(3):
+            os.makedirs(os.path.join(tree, f'd{i}', 'deep'), exist_ok=True)
+            for j in range(5):
+                with open(os.path.join(tree, f'd{i}', 'deep', f'f{j}'), 'wb') as f:
+                    f.write(b'x' * 10)
+        os.symlink(os.path.abspath(self.subdir), os.path.join(tree, 'link'))
+        return tree
+
+    def test_parallel_delete(self):
+        """Check parallel delete of a tree, symlinks are not followed"""
+        tree = self.make_tree()
+
+        stats = delete.delete_tree(tree, jobs=4, batch_size=4)
+
+        self.assertFalse(os.path.exists(tree))
+        self.assertTrue(os.path.exists(os.path.join(self.subdir, 'file2.txt')))
+        self.assertEqual((stats.files, stats.dirs, stats.errors), (16, 7, 0))
+
+    def test_parallel_delete_command(self):
+        """Check delete --jobs"""
+        tree = self.make_tree()
+        args = self.parser.parse_args(['-s', tree, '-j', '3'])
+        with mock.patch('builtins.print'):
+            delete.run(args)
+        self.assertFalse(os.path.exists(tree))
+
+    def test_dry_run(self):
+        """Check dry run counts without deleting"""
+        tree = self.make_tree()
+        args = self.parser.parse_args(['-s', tree, '--dry-run'])
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as printed:
+            delete.run(args)
+
+        self.assertEqual(printed.getvalue(), f'Would delete 16 files, 7 directories, 150 bytes: {tree}\n')
+        self.assertEqual(len(os.listdir(tree)), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
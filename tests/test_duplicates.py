@@ -3,6 +3,7 @@ import os
 import shutil
 import argparse
 import sys
+from unittest import mock
 
 from features import duplicates
 
@@ -56,6 +57,70 @@ class TestDuplicates(unittest.TestCase):
         self.assertIn('file2.txt', capture.output)
         self.assertNotIn('unique.txt\n  ', capture.output)
 
+    def test_pipeline_skips_unique_sizes(self):
+        """Check that files with a unique size are never read"""
+        with open(os.path.join(self.test_dir, 'other_size.txt'), 'w') as f:
+            f.write('Some content of another length')
+
+        groups, stats = duplicates.find_duplicates(self.test_dir)
+
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(sorted(os.path.basename(p) for p in groups[0][1]), ['file1.txt', 'file2.txt'])
+        self.assertEqual(stats.files_in['size'], 4)
+        self.assertEqual(stats.files_out['size'], 2)
+        self.assertEqual(stats.bytes_read['partial'], 2 * len('Duplicate file content'))
+        self.assertEqual(stats.files_in['full'], 0)
+
+    def test_pipeline_full_hash_splits_same_edges(self):
+        """Check files with equal head and tail but different middle"""
+        for name, middle in [('big1.bin', b'a'), ('big2.bin', b'b'), ('big3.bin', b'a')]:
+            with open(os.path.join(self.test_dir, name), 'wb') as f:
+                f.write(b'x' * 100 + middle * 50 + b'y' * 100)
+
+        groups, stats = duplicates.find_duplicates(self.test_dir, partial_size=16, verify=True)
+
+        names = sorted(sorted(os.path.basename(p) for p in files) for _, files in groups)
+        self.assertEqual(names, [['big1.bin', 'big3.bin'], ['file1.txt', 'file2.txt']])
+        self.assertEqual(stats.files_in['full'], 3)
+        self.assertEqual(stats.files_out['full'], 2)
+        self.assertEqual(stats.files_out['verify'], 4)
+
+    def test_verify_reads_each_file_once(self):
+        """Check --verify splits a group in one pass and the report never claims negative savings"""
+        for name, content in [('v1.bin', b'a' * 300), ('v2.bin', b'a' * 300), ('v3.bin', b'a' * 299 + b'b'),
+                              ('v4.bin', b'a' * 300)]:
+            with open(os.path.join(self.test_dir, name), 'wb') as f:
+                f.write(content)
+
+        stats = duplicates.PipelineStats()
+        group = [(os.path.join(self.test_dir, f'v{i}.bin'), 300) for i in range(1, 5)]
+        sets = duplicates._identical_sets(group, stats, chunk_size=128)
+        self.assertEqual([sorted(os.path.basename(p) for p, _ in same) for same in sets],
+                         [['v1.bin', 'v2.bin', 'v4.bin']])
+        self.assertEqual(stats.bytes_read['verify'], 4 * 300)
+
+        with mock.patch.object(duplicates, 'VERIFY_OPEN_FILES', 2):
+            self.assertEqual(duplicates._identical_sets(group, duplicates.PipelineStats(), chunk_size=128), sets)
+
+        _, stats = duplicates.find_duplicates(self.test_dir, partial_size=16, verify=True)
+        self.assertEqual(stats.candidate_bytes, 4 * 300 + 2 * len('Duplicate file content'))
+        self.assertNotIn('avoided', stats.report()[-1])
+        self.assertNotIn(' -', stats.report()[-1])
+
+    def test_pipeline_parallel_matches_serial(self):
+        """Check that worker pools give the same groups as a serial run"""
+        for i in range(6):
+            with open(os.path.join(self.test_dir, f'copy{i}.bin'), 'wb') as f:
+                f.write(bytes([i % 2]) * 5000)
+
+        serial, _ = duplicates.find_duplicates(self.test_dir, partial_size=1024)
+        threads, _ = duplicates.find_duplicates(self.test_dir, partial_size=1024, jobs=4)
+        processes, _ = duplicates.find_duplicates(self.test_dir, partial_size=1024, jobs=2, executor='process')
+
+        self.assertEqual(len(serial), 3)
+        self.assertEqual(serial, threads)
+        self.assertEqual(serial, processes)
+
 
 if __name__ == '__main__':
     unittest.main()
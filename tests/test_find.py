@@ -1,8 +1,22 @@
 import unittest
 import os
+import sys
+import json
+import time
 import shutil
 import argparse
-from features import find
+from unittest import mock
+from features import find, walker
+
+
+class OutputCapture:
+    """A class to capture stdout output"""
+    def __init__(self):
+        self.output = ''
+
+    def write(self, s):
+        self.output += s
+
 
 class TestFind(unittest.TestCase):
     def setUp(self):
@@ -22,29 +36,230 @@ class TestFind(unittest.TestCase):
         # Emulate manager.py
         self.parser = argparse.ArgumentParser()
         self.parser.add_argument('path')
-        self.parser.add_argument('regex')
+        self.parser.add_argument('regex', nargs='*')
+        self.parser.add_argument('--glob', action='append')
+        self.parser.add_argument('--pattern-file')
+        self.parser.add_argument('--format', default='text')
+        self.parser.add_argument('--limit', type=int)
+        self.parser.add_argument('--first', action='store_true')
+        self.parser.add_argument('--path-regex')
+        self.parser.add_argument('--type')
+        self.parser.add_argument('--min-size')
+        self.parser.add_argument('--max-size')
+        self.parser.add_argument('--newer')
+        self.parser.add_argument('--older')
+        self.parser.add_argument('--max-depth', type=int)
+        self.parser.add_argument('--exclude-dir', action='append')
 
     def tearDown(self):
         """Clean up test folders"""
         shutil.rmtree(self.test_dir)
 
+    def run_find(self, argv):
+        """Run find and return the number of matches and what it printed"""
+        capture = OutputCapture()
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = capture
+            matched = find.run(self.parser.parse_args(argv))
+        finally:
+            sys.stdout = original_stdout
+        return matched, capture.output
+
     def test_find_txt_files(self):
         """Check file finding .txt"""
-        args = self.parser.parse_args([self.test_dir, r'.*\.txt$'])
-        result = find.run(args)
-        basenames = [os.path.basename(path) for path in result]
+        matched, result = self.run_find([self.test_dir, r'.*\.txt$'])
+        self.assertEqual(matched, 2)
+        basenames = [os.path.basename(path) for path in result.splitlines()]
         self.assertIn('a.txt', basenames)
         self.assertIn('c.txt', basenames)
         self.assertNotIn('b.md', basenames)
 
     def test_find_md_files(self):
         """Check file finding .md"""
-        args = self.parser.parse_args([self.test_dir, r'.*\.md$'])
-        result = find.run(args)
-        basenames = [os.path.basename(path) for path in result]
+        _, result = self.run_find([self.test_dir, r'.*\.md$'])
+        basenames = [os.path.basename(path) for path in result.splitlines()]
         self.assertIn('b.md', basenames)
         self.assertNotIn('a.txt', basenames)
 
+    def test_structured_output(self):
+        """Matches can be written as NDJSON or CSV"""
+        _, ndjson = self.run_find([self.test_dir, r'.*\.txt$', '--format', 'ndjson'])
+        paths = sorted(json.loads(line)['path'] for line in ndjson.splitlines())
+        self.assertEqual(paths, [os.path.join(self.test_dir, 'a.txt'), os.path.join(self.test_dir, 'subdir', 'c.txt')])
+
+        _, csv_output = self.run_find([self.test_dir, r'.*\.md$', '--format', 'csv'])
+        self.assertEqual(csv_output, f'path\n{os.path.join(self.test_dir, "b.md")}\n')
+
+    def test_iter_find(self):
+        """iter_find yields matches lazily and stops walking once the consumer stops"""
+        pulled = []
+        walk = walker.walk
+
+        def counting_walk(*args, **kwargs):
+            for entry in walk(*args, **kwargs):
+                pulled.append(entry.path)
+                yield entry
+
+        with mock.patch.object(find.walker, 'walk', counting_walk):
+            matches = find.iter_find(self.test_dir, r'.*')
+            self.assertEqual(pulled, [])
+            first = next(matches)
+            matches.close()
+        self.assertEqual(pulled, [first])
+
+        self.assertEqual(sorted(os.path.basename(p) for p in find.iter_find(self.test_dir, r'.*\.txt')),
+                         ['a.txt', 'c.txt'])
+
+    def test_limit_and_first(self):
+        """--limit and --first stop after that many matches"""
+        self.assertEqual(len(list(find.iter_find(self.test_dir, r'.*', limit=2))), 2)
+
+        matched, result = self.run_find([self.test_dir, r'.*', '--limit', '2'])
+        self.assertEqual((matched, len(result.splitlines())), (2, 2))
+        matched, result = self.run_find([self.test_dir, r'.*', '--first'])
+        self.assertEqual((matched, len(result.splitlines())), (1, 1))
+
+    def test_iter_find_validates_at_call(self):
+        """Bad arguments fail when iter_find is called, not at the first match"""
+        with self.assertRaises(FileNotFoundError):
+            find.iter_find('nonexistent', r'.*')
+        with self.assertRaises(ValueError):
+            find.iter_find(self.test_dir, r'*invalid[')
+
+    def test_limit_must_be_positive(self):
+        """A limit of 0 or less is rejected instead of returning every match"""
+        for limit in (0, -1):
+            with self.assertRaises(ValueError):
+                find.iter_find(self.test_dir, r'.*', limit=limit)
+            with self.assertRaises(ValueError):
+                self.run_find([self.test_dir, r'.*', '--limit', str(limit)])
+
+    def names(self, **predicates):
+        """Sorted base names found by iter_find"""
+        return sorted(os.path.basename(p) for p in find.iter_find(self.test_dir, **predicates))
+
+    def test_size_type_and_depth(self):
+        """Size, type and depth predicates"""
+        self.assertEqual(self.names(min_size=4), ['b.md', 'c.txt'])
+        self.assertEqual(self.names(min_size='4', max_size=6), ['c.txt'])
+        self.assertEqual(self.names(max_depth=1), ['a.txt', 'b.md'])
+        self.assertEqual(self.names(file_type='d'), ['subdir'])
+        self.assertEqual(self.names(file_type='f', pattern=r'.*\.txt'), ['a.txt', 'c.txt'])
+        self.assertEqual(self.names(path_regex=r'.*subdir.*'), ['c.txt'])
+
+        os.symlink('a.txt', os.path.join(self.test_dir, 'link'))
+        os.symlink('subdir', os.path.join(self.test_dir, 'dirlink'))
+        self.assertEqual(self.names(file_type='l'), ['dirlink', 'link'])
+        self.assertNotIn('link', self.names(file_type='f'))
+
+    def test_newer_and_older(self):
+        """Age predicates compare the modification time"""
+        old = time.time() - 10 * 86400
+        os.utime(os.path.join(self.test_dir, 'b.md'), (old, old))
+        self.assertEqual(self.names(older='7d'), ['b.md'])
+        self.assertEqual(self.names(newer='7d'), ['a.txt', 'c.txt'])
+        self.assertEqual(self.names(newer=old - 1, older='1w'), ['b.md'])
+
+        _, result = self.run_find([self.test_dir, '--older', '2', '--format', 'ndjson'])
+        self.assertEqual([json.loads(line)['path'] for line in result.splitlines()],
+                         [os.path.join(self.test_dir, 'b.md')])
+
+    def test_exclude_dir_prunes_walk(self):
+        """Excluded directories are not listed at all"""
+        listed = []
+        list_dir = walker.list_dir
+
+        def recording_list_dir(path, *args, **kwargs):
+            listed.append(path)
+            return list_dir(path, *args, **kwargs)
+
+        with mock.patch.object(walker, 'list_dir', recording_list_dir):
+            _, result = self.run_find([self.test_dir, '--exclude-dir', 'sub*', '--type', 'd'])
+        self.assertEqual(result, '')
+        self.assertEqual(listed, [self.test_dir])
+
+    def test_stat_only_when_needed(self):
+        """Size and age predicates use the stat data of the walk"""
+        walk = walker.walk
+        calls = []
+
+        def recording_walk(*args, **kwargs):
+            calls.append(kwargs.get('stat'))
+            return walk(*args, **kwargs)
+
+        with mock.patch.object(find.walker, 'walk', recording_walk):
+            list(find.iter_find(self.test_dir, r'.*'))
+            list(find.iter_find(self.test_dir, min_size='1K'))
+        self.assertEqual(calls, [False, True])
+
+    def test_parse_size_and_time(self):
+        """Sizes use binary units, times are ages or ISO dates"""
+        self.assertEqual(find.parse_size('4096'), 4096)
+        self.assertEqual(find.parse_size('10K'), 10240)
+        self.assertEqual(find.parse_size('1.5M'), 1572864)
+        self.assertEqual(find.parse_size('2GiB'), 2 * 1024 ** 3)
+        self.assertEqual(find.parse_time('2h', now=10000), 10000 - 7200)
+        self.assertEqual(find.parse_time('3', now=300000), 300000 - 3 * 86400)
+        self.assertEqual(find.parse_time('2024-05-01T12:00'), time.mktime((2024, 5, 1, 12, 0, 0, 0, 0, -1)))
+        for bad in (lambda: find.parse_size('ten'), lambda: find.parse_time('yesterday'),
+                    lambda: find.iter_find(self.test_dir, file_type='x'),
+                    lambda: find.iter_find(self.test_dir, path_regex='[')):
+            with self.assertRaises(ValueError):
+                bad()
+
+    def test_pattern_set(self):
+        """Suffix, combined and standalone patterns all report every pattern a name hits"""
+        patterns = find.PatternSet([r'.*\.txt$', r'a.*', r'(\w)\1.*', r'(?i)README'], ['*.tar.gz', 'b?.txt'])
+        self.assertEqual(patterns.suffixes, {'.txt': [0], '.tar.gz': [4]})
+        self.assertEqual(patterns.match('a.txt'), [r'.*\.txt$', 'a.*'])
+        self.assertEqual(patterns.match('aa.tar.gz'), ['a.*', r'(\w)\1.*', '*.tar.gz'])
+        self.assertEqual(patterns.match('b1.txt'), [r'.*\.txt$', 'b?.txt'])
+        self.assertEqual(patterns.match('readme'), ['(?i)README'])
+        self.assertEqual(patterns.match('x.txt.bak'), [])
+
+        clashing = find.PatternSet([r'(?P<x>a)', r'(?P<x>b)'])
+        self.assertEqual(clashing.match('b'), ['(?P<x>b)'])
+        with self.assertRaises(ValueError):
+            find.PatternSet(['*broken'])
+
+    def test_multiple_patterns_one_walk(self):
+        """All patterns are matched in a single walk and matches are tagged"""
+        walk = walker.walk
+        calls = []
+
+        def counting_walk(*args, **kwargs):
+            calls.append(args[0])
+            return walk(*args, **kwargs)
+
+        with mock.patch.object(find.walker, 'walk', counting_walk):
+            matched, result = self.run_find([self.test_dir, r'.*\.txt', r'c.*', '--glob', '*.md',
+                                             '--format', 'ndjson'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(matched, 3)
+        records = sorted((os.path.basename(r['path']), r['patterns']) for r in map(json.loads, result.splitlines()))
+        self.assertEqual(records, [('a.txt', [r'.*\.txt']), ('b.md', ['*.md']), ('c.txt', [r'.*\.txt', 'c.*'])])
+
+        _, result = self.run_find([self.test_dir, r'a.*', '--glob', '*.txt', '--format', 'csv'])
+        self.assertEqual(result.splitlines(), ['path,patterns', f'{os.path.join(self.test_dir, "a.txt")},a.*;*.txt',
+                                               f'{os.path.join(self.test_dir, "subdir", "c.txt")},*.txt'])
+
+        self.assertEqual(sorted(find.iter_find(self.test_dir, [r'a.*', r'b.*'], tagged=True)),
+                         [(os.path.join(self.test_dir, 'a.txt'), ['a.*']),
+                          (os.path.join(self.test_dir, 'b.md'), ['b.*'])])
+
+    def test_pattern_file(self):
+        """Patterns can be read from a file, 'glob:' lines are globs"""
+        pattern_file = os.path.join(self.test_dir, 'patterns.txt')
+        with open(pattern_file, 'w') as f:
+            f.write('# documents\nglob:*.md\n\nc[.].*\n')
+        self.assertEqual(find.read_patterns(pattern_file), (['c[.].*'], ['*.md']))
+
+        matched, result = self.run_find([self.test_dir, '--pattern-file', pattern_file])
+        self.assertEqual(matched, 2)
+        self.assertEqual(sorted(result.splitlines()), [f'{os.path.join(self.test_dir, "b.md")}\t*.md',
+                                                       f'{os.path.join(self.test_dir, "subdir", "c.txt")}\tc[.].*'])
+
     def test_invalid_path(self):
         """Check file finding with invalid path"""
         args = self.parser.parse_args(['nonexistent', r'.*\.txt$'])
@@ -0,0 +1,106 @@
+import unittest
+import os
+import shutil
+import argparse
+import sys
+
+from features import hash_cache, hashsum, hashing
+
+
+class OutputCapture:
+    """A class to capture stdout output"""
+    def __init__(self):
+        self.output = ''
+
+    def write(self, s):
+        self.output += s
+
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'test_hash_cache_dir'
+        self.cache_file = os.path.join(self.test_dir, 'cache', 'hashes.sqlite3')
+        os.makedirs(os.path.join(self.test_dir, 'data'), exist_ok=True)
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.test_dir, 'data', f'file{i}.txt')
+            with open(path, 'w') as f:
+                f.write(f'content {i}')
+            self.files.append(path)
+
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-p', '--path', required=True)
+        parser.add_argument('-m', '--method', default='sha256')
+        parser.add_argument('--no-cache', action='store_true')
+        parser.add_argument('--rebuild-cache', action='store_true')
+        parser.add_argument('--cache-file')
+        self.parser = parser
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_lookup_and_invalidation(self):
+        """Check that a changed file is not served from cache"""
+        path = self.files[0]
+        with hash_cache.HashCache(self.cache_file) as cache:
+            digest = hash_cache.cached_hash(hashing.hash_file, path, 'sha256', cache)
+            self.assertEqual(cache.lookup(os.stat(path), 'sha256'), digest)
+            self.assertIsNone(cache.lookup(os.stat(path), 'md5'))
+
+            with open(path, 'w') as f:
+                f.write('changed content')
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+            self.assertIsNone(cache.lookup(os.stat(path), 'sha256'))
+
+    def test_cached_map_skips_known_files(self):
+        """Check that only cache misses are hashed"""
+        calls = []
+
+        def hasher(path):
+            calls.append(path)
+            return hashing.hash_file(path)
+
+        with hash_cache.HashCache(self.cache_file) as cache:
+            first = list(hash_cache.cached_map(hasher, self.files, 'sha256', cache))
+            self.assertEqual(len(calls), 3)
+            second = list(hash_cache.cached_map(hasher, self.files, 'sha256', cache))
+            self.assertEqual(len(calls), 3)
+
+        self.assertEqual([d for _, d, _, _ in first], [d for _, d, _, _ in second])
+        self.assertEqual([c for _, _, _, c in second], [True, True, True])
+
+    def test_compact_removes_deleted(self):
+        """Check compaction of entries for deleted files"""
+        with hash_cache.HashCache(self.cache_file) as cache:
+            list(hash_cache.cached_map(hashing.hash_file, self.files, 'sha256', cache))
+            os.remove(self.files[1])
+            self.assertEqual(cache.compact(), 1)
+            self.assertEqual(cache.count(), 2)
+
+    def test_hashsum_run_uses_cache(self):
+        """Check hits on rerun and --rebuild-cache / --no-cache switches"""
+        directory = os.path.join(self.test_dir, 'data')
+        outputs = []
+        for extra in ([], [], ['--rebuild-cache'], ['--no-cache']):
+            args = self.parser.parse_args(['-p', directory, '--cache-file', self.cache_file] + extra)
+            capture = OutputCapture()
+            original_stdout = sys.stdout
+            try:
+                sys.stdout = capture
+                hashsum.run(args)
+            finally:
+                sys.stdout = original_stdout
+            outputs.append(capture.output)
+
+        self.assertEqual(len(set(outputs)), 1)
+        with hash_cache.HashCache(self.cache_file) as cache:
+            self.assertEqual(cache.count(), 3)
+            self.assertIsNotNone(cache.lookup(os.stat(self.files[0]), 'sha256'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import shutil
+import hashlib
+import tracemalloc
+
+from features import hashing
+
+
+class TestHashing(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'test_hashing_dir'
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.data = os.urandom(3 * 1024 * 1024 + 123)
+        self.file_path = os.path.join(self.test_dir, 'big.bin')
+        with open(self.file_path, 'wb') as f:
+            f.write(self.data)
+
+        self.empty_path = os.path.join(self.test_dir, 'empty.bin')
+        open(self.empty_path, 'wb').close()
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_streaming_matches_hashlib(self):
+        """Check chunked hashing with different chunk sizes"""
+        expected = hashlib.sha256(self.data).hexdigest()
+        for chunk_size in (4096, 1024 * 1024, 16 * 1024 * 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(hashing.hash_file(self.file_path, chunk_size=chunk_size), expected)
+
+    def test_mmap_matches_hashlib(self):
+        """Check hashing through mmap"""
+        expected = hashlib.md5(self.data).hexdigest()
+        self.assertEqual(hashing.hash_file(self.file_path, 'md5', mmap_threshold=1), expected)
+
+    def test_empty_file(self):
+        """Check hashing of empty file in both modes"""
+        expected = hashlib.sha256(b'').hexdigest()
+        self.assertEqual(hashing.hash_file(self.empty_path), expected)
+        self.assertEqual(hashing.hash_file(self.empty_path, mmap_threshold=1), expected)
+
+    def test_memory_does_not_grow_with_file(self):
+        """Check that peak allocation stays around one chunk"""
+        chunk_size = 64 * 1024
+        tracemalloc.start()
+        try:
+            hashing.hash_file(self.file_path, chunk_size=chunk_size)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 4 * chunk_size)
+
+    def test_invalid_arguments(self):
+        """Check errors for bad chunk size and unknown algorithm"""
+        with self.assertRaises(ValueError):
+            hashing.hash_file(self.file_path, chunk_size=0)
+        with self.assertRaises(ValueError):
+            hashing.hash_file(self.file_path, 'no-such-hash')
+
+    def test_parallel_map_keeps_order(self):
+        """Check that parallel results come back in input order with errors captured"""
+        paths = [self.file_path, 'missing.bin', self.empty_path] * 5
+        expected = [hashing.hash_file(p) if p != 'missing.bin' else None for p in paths]
+        for executor in ('thread', 'process'):
+            with self.subTest(executor=executor):
+                results = list(hashing.parallel_map(hashing.hash_file, paths, jobs=4, executor=executor,
+                                                    batch_size=2))
+                self.assertEqual([item for item, _, _ in results], paths)
+                self.assertEqual([result for _, result, _ in results], expected)
+                errors = [error for item, _, error in results if item == 'missing.bin']
+                self.assertTrue(all(isinstance(e, FileNotFoundError) for e in errors))
+
+    def test_parallel_map_unknown_executor(self):
+        """Check error for unknown executor type"""
+        with self.assertRaises(ValueError):
+            list(hashing.parallel_map(hashing.hash_file, [self.file_path], jobs=2, executor='gpu'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,6 +27,8 @@ class TestHashSum(unittest.TestCase):
         parser = argparse.ArgumentParser()
         parser.add_argument('-p', '--path', required=True)
         parser.add_argument('-m', '--method', choices=['sha256', 'md5'], default='sha256')
+        parser.add_argument('-j', '--jobs', type=int, default=1)
+        parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
         self.parser = parser
 
     def tearDown(self):
@@ -64,6 +66,29 @@ class TestHashSum(unittest.TestCase):
         self.assertIn('md5', capture.output.lower())
         self.assertIn('file.txt', capture.output)
 
+    def test_hash_dir_parallel_sorted(self):
+        """Check that parallel hashing prints files sorted by path"""
+        for i in range(10):
+            with open(os.path.join(self.test_dir, f'extra{9 - i}.txt'), 'w') as f:
+                f.write(f'content {i}')
+        outputs = []
+        for jobs, executor in [('1', 'thread'), ('4', 'thread'), ('3', 'process')]:
+            args = self.parser.parse_args(['-p', self.test_dir, '-j', jobs, '--executor', executor])
+            capture = OutputCapture()
+            original_stdout = sys.stdout
+            try:
+                sys.stdout = capture
+                hashsum.run(args)
+            finally:
+                sys.stdout = original_stdout
+            outputs.append(capture.output)
+
+        lines = outputs[0].splitlines()[1:]
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines, sorted(lines))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+import os
+import shutil
+import argparse
+import sys
+
+from features import index, count, find, analyse
+
+
+class OutputCapture:
+    """A class to capture stdout output"""
+    def __init__(self):
+        self.output = ''
+
+    def write(self, s):
+        self.output += s
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = os.path.abspath('test_index_dir')
+        self.tree = os.path.join(self.test_dir, 'tree')
+        self.index_file = os.path.join(self.test_dir, 'index.sqlite3')
+        for folder in ['a/b', 'c']:
+            os.makedirs(os.path.join(self.tree, folder), exist_ok=True)
+        for name, size in [('top.txt', 10), ('a/one.txt', 200), ('a/b/two.log', 3000), ('c/three.txt', 40)]:
+            with open(os.path.join(self.tree, name), 'wb') as f:
+                f.write(b'x' * size)
+
+        self.parser = argparse.ArgumentParser()
+        self.parser.add_argument('-p', '--path', required=True)
+        self.parser.add_argument('-r', '--regex', default='.*')
+        self.parser.add_argument('--index', action='store_true')
+        self.parser.add_argument('--index-file')
+        self.parser.add_argument('--refresh', action='store_true')
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def run_quiet(self, func, argv):
+        """Run a command with captured stdout"""
+        args = self.parser.parse_args(argv)
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = OutputCapture()
+            return func(args)
+        finally:
+            sys.stdout = original_stdout
+
+    def printed(self, func, argv):
+        """Run a command and return the lines it printed"""
+        capture = OutputCapture()
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = capture
+            func(self.parser.parse_args(argv))
+        finally:
+            sys.stdout = original_stdout
+        return capture.output.splitlines()
+
+    def test_queries_match_filesystem(self):
+        """Check that count, find and analyse give the same answers from the index"""
+        with index.DirIndex(self.index_file) as idx:
+            self.assertEqual(idx.build(self.tree), 7)
+
+        use_index = ['--index', '--index-file', self.index_file]
+        for path in (self.tree, os.path.join(self.tree, 'a')):
+            with self.subTest(path=path):
+                self.assertEqual(self.run_quiet(count.run, ['-p', path] + use_index),
+                                 self.run_quiet(count.run, ['-p', path]))
+                self.assertEqual(sorted(self.printed(find.run, ['-p', path, '-r', r'.*\.txt'] + use_index)),
+                                 sorted(self.printed(find.run, ['-p', path, '-r', r'.*\.txt'])))
+
+        with index.open_for(self.tree, self.index_file) as idx:
+            indexed = idx.scan_tree(self.tree, depth=2, top=2)
+        live = analyse.scan_tree(self.tree, depth=2, top=2)
+        self.assertEqual({p: (s.apparent, s.allocated, s.files) for p, s in indexed[0].items()},
+                         {p: (s.apparent, s.allocated, s.files) for p, s in live[0].items()})
+        self.assertEqual(sorted(indexed[1]), sorted(live[1]))
+        self.assertEqual(indexed[2], live[2])
+
+    def test_find_predicates_match_filesystem(self):
+        """Check that find predicates give the same answers from the index"""
+        with index.DirIndex(self.index_file) as idx:
+            idx.build(self.tree)
+            for predicates in [dict(min_size=100), dict(max_size='100'), dict(max_depth=2), dict(file_type='d'),
+                               dict(exclude_dirs=['b']), dict(file_type='d', exclude_dirs=['a'])]:
+                with self.subTest(**predicates):
+                    self.assertEqual(sorted(find.iter_find(self.tree, index=idx, **predicates)),
+                                     sorted(find.iter_find(self.tree, **predicates)))
+
+    def test_relative_path_matches_filesystem(self):
+        """find with --index prints and matches the paths a walk of a relative -p would"""
+        with index.DirIndex(self.index_file) as idx:
+            idx.build(self.tree)
+
+        use_index = ['--index', '--index-file', self.index_file]
+        relative = os.path.relpath(self.tree)
+        for path in (relative, relative + os.sep, os.path.join(relative, 'a')):
+            with self.subTest(path=path):
+                self.assertEqual(sorted(self.printed(find.run, ['-p', path] + use_index)),
+                                 sorted(self.printed(find.run, ['-p', path])))
+                with index.open_for(self.tree, self.index_file) as idx:
+                    self.assertEqual(sorted(find.iter_find(path, index=idx, path_regex=r'test_index_dir/.*')),
+                                     sorted(find.iter_find(path, path_regex=r'test_index_dir/.*')))
+
+    def test_update_rescans_changed_directories(self):
+        """Check that update only lists directories whose mtime changed"""
+        with index.DirIndex(self.index_file) as idx:
+            idx.build(self.tree)
+            self.assertEqual(idx.update(), (4, 0))
+
+            with open(os.path.join(self.tree, 'a', 'b', 'new.txt'), 'w') as f:
+                f.write('new')
+            shutil.rmtree(os.path.join(self.tree, 'c'))
+            os.makedirs(os.path.join(self.tree, 'd', 'e'))
+            with open(os.path.join(self.tree, 'd', 'e', 'deep.txt'), 'w') as f:
+                f.write('deep')
+
+            reused, rescanned = idx.update()
+            self.assertEqual((reused, rescanned), (1, 4))
+            self.assertEqual(idx.count_files(self.tree), 5)
+            names = sorted(name for _, name in idx.iter_files(self.tree))
+            self.assertEqual(names, ['deep.txt', 'new.txt', 'one.txt', 'top.txt', 'two.log'])
+
+    def test_refresh_before_query(self):
+        """Check --refresh builds a missing index and then updates it incrementally"""
+        argv = ['-p', self.tree, '--refresh', '--index-file', self.index_file]
+        self.assertEqual(self.run_quiet(count.run, argv), 4)
+
+        with open(os.path.join(self.tree, 'c', 'added.txt'), 'w') as f:
+            f.write('added')
+        self.assertEqual(self.run_quiet(count.run, argv), 5)
+        with index.DirIndex(self.index_file) as idx:
+            self.assertEqual(idx.update(), (4, 0))
+
+    def test_refresh_status_is_printed(self):
+        """Check the index status line reaches a buffered stdout before the command output"""
+        argv = ['-p', self.tree, '--refresh', '--index-file', self.index_file]
+        lines = self.printed(count.run, argv)
+        self.assertEqual(lines[0], 'Index built: 7 entries')
+        self.assertEqual(self.printed(count.run, argv)[0], 'Index refreshed: 0 directories rescanned, 4 reused')
+
+    def test_missing_index(self):
+        """Check error when no index covers the path"""
+        with self.assertRaises(FileNotFoundError):
+            index.open_for(self.tree, self.index_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import io
+import os
+import shutil
+import argparse
+from unittest import mock
+
+from features import copy as copy_feature
+from features import copy_engine, journal, move
+
+
+class Interrupted(Exception):
+    """Raised from a checkpoint to emulate a copy killed midway"""
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'test_journal_dir'
+        self.src_dir = os.path.join(self.test_dir, 'src')
+        self.dst_dir = os.path.join(self.test_dir, 'dst')
+        self.journal_file = os.path.join(self.test_dir, 'journal.sqlite3')
+        os.makedirs(os.path.join(self.src_dir, 'sub'), exist_ok=True)
+        os.makedirs(self.dst_dir, exist_ok=True)
+        self.big = os.path.join(self.src_dir, 'big.bin')
+        self.data = os.urandom(10 * 1024)
+        with open(self.big, 'wb') as f:
+            f.write(self.data)
+        for i in range(4):
+            with open(os.path.join(self.src_dir, 'sub', f'file{i}.txt'), 'w') as f:
+                f.write(f'content {i}')
+
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-s', '--src', required=True)
+        parser.add_argument('-d', '--dst', required=True)
+        parser.add_argument('--resume', action='store_true')
+        parser.add_argument('--verify-hash', action='store_true')
+        parser.add_argument('--journal')
+        parser.add_argument('--no-journal', action='store_true')
+        self.parser = parser
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_resume_point_of_completed_file(self):
+        """Completed files are skipped only while source and destination still match"""
+        dst = os.path.join(self.dst_dir, 'big.bin')
+        with journal.Journal(self.journal_file) as j:
+            self.assertEqual(copy_engine.copy_file_journaled(self.big, dst, j), len(self.data))
+            st = os.stat(self.big)
+            self.assertEqual(j.resume_point(self.big, dst, st), (True, len(self.data)))
+            self.assertIsNone(copy_engine.copy_file_journaled(self.big, dst, j))
+
+            # same size and mtime but different content is only caught with verify
+            with open(dst, 'r+b') as f:
+                f.write(b'X')
+            os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+            self.assertEqual(j.resume_point(self.big, dst, st), (True, len(self.data)))
+            self.assertEqual(j.resume_point(self.big, dst, st, verify=True), (False, 0))
+
+            os.utime(self.big, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+            self.assertEqual(j.resume_point(self.big, dst, os.stat(self.big)), (False, 0))
+
+    def test_continue_partial_file(self):
+        """An interrupted large file continues from its last checkpoint"""
+        dst = os.path.join(self.dst_dir, 'big.bin')
+        checkpoints = []
+
+        def interrupt(src, offset):
+            checkpoints.append(offset)
+            journal.Journal.checkpoint(j, src, offset)
+            if len(checkpoints) == 2:
+                raise Interrupted()
+
+        with mock.patch.object(copy_engine, 'CHECKPOINT_BYTES', 1024):
+            with journal.Journal(self.journal_file) as j:
+                with mock.patch.object(j, 'checkpoint', interrupt):
+                    with self.assertRaises(Interrupted):
+                        copy_engine.copy_file_journaled(self.big, dst, j)
+
+            with journal.Journal(self.journal_file) as j:
+                self.assertEqual(j.resume_point(self.big, dst, os.stat(self.big)), (False, 2048))
+                copied = copy_engine.copy_file_journaled(self.big, dst, j, verify=True)
+
+        self.assertEqual(checkpoints, [1024, 2048])
+        self.assertEqual(copied, len(self.data) - 2048)
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_copy_resume_tree(self):
+        """Rerunning an interrupted tree copy with --resume only copies what is missing"""
+        args = self.parser.parse_args(['-s', self.src_dir, '-d', self.dst_dir, '--journal', self.journal_file])
+        target = os.path.join(self.dst_dir, 'src')
+        with journal.Journal(self.journal_file) as j:
+            copy_engine.copy_tree(self.src_dir, target, journal=j)
+        os.remove(os.path.join(target, 'sub', 'file2.txt'))
+
+        args.resume = True
+        with mock.patch.object(copy_engine.CopyStats, 'report', lambda stats: f'{stats.files}/{stats.skipped}'), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as printed:
+            self.assertEqual(copy_feature.run(args), target)
+
+        self.assertIn('Copied 1/4\n', printed.getvalue())
+        self.assertTrue(os.path.isfile(os.path.join(target, 'sub', 'file2.txt')))
+        self.assertFalse(os.path.exists(self.journal_file))
+
+    def test_copy_without_resume_starts_over(self):
+        """A fresh run discards a stale journal and keeps the copy_ rename"""
+        target = os.path.join(self.dst_dir, 'src')
+        with journal.Journal(self.journal_file) as j:
+            copy_engine.copy_tree(self.src_dir, target, journal=j)
+
+        args = self.parser.parse_args(['-s', self.src_dir, '-d', self.dst_dir, '--journal', self.journal_file])
+        with mock.patch('builtins.print'):
+            self.assertEqual(copy_feature.run(args), os.path.join(self.dst_dir, 'copy_src'))
+
+    def test_journaled_move(self):
+        """Journaled move copies everything before deleting the source"""
+        target = os.path.join(self.dst_dir, 'src')
+        args = self.parser.parse_args(['-s', self.src_dir, '-d', self.dst_dir, '--journal', self.journal_file])
+        with journal.Journal(self.journal_file) as j:
+            move._move_journaled(move.MovePlan(os.path.abspath(self.src_dir), os.path.abspath(target), True, False),
+                                 j, args)
+
+        self.assertFalse(os.path.exists(self.src_dir))
+        self.assertFalse(os.path.exists(self.journal_file))
+        with open(os.path.join(target, 'big.bin'), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import os
+import shutil
+import logging
+
+from features import cli, logger
+
+
+class Counted:
+    """Log argument that counts how often it is converted to text"""
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return 'counted'
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'test_logger_dir'
+        self.log_file = os.path.join(self.test_dir, 'test.log')
+        self.root_level = logging.getLogger().level
+        self.log = logging.getLogger('test_logger.first')
+        self.other = logging.getLogger('test_logger.second')
+
+    def tearDown(self):
+        """Restore logging and clean up test folders"""
+        logger.shutdown_logging()
+        logging.getLogger().setLevel(self.root_level)
+        self.log.setLevel(logging.NOTSET)
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def read_log(self):
+        logger.shutdown_logging()
+        with open(self.log_file) as f:
+            return f.read()
+
+    def test_records_are_written(self):
+        """Records reach the log file in the usual format"""
+        logger.setup_logging(filename=self.log_file)
+        logger.setup_logging(filename=os.path.join(self.test_dir, 'ignored.log'))
+        self.log.info('Hashed file: %s', 'a.txt')
+        self.log.debug('not written')
+
+        content = self.read_log()
+        self.assertRegex(content, r'^\d{4}-\d\d-\d\d [\d:,]+ \[INFO\] Hashed file: a.txt\n$')
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'ignored.log')))
+
+    def test_quiet_skips_formatting(self):
+        """In quiet mode info records are neither formatted nor written"""
+        counted = Counted()
+        logger.setup_logging(filename=self.log_file, quiet=True, loggers={'test_logger.first': logging.DEBUG})
+        self.log.info('file %s', counted)
+        self.assertEqual(counted.calls, 0)
+        self.log.warning('warning %s', counted)
+
+        content = self.read_log()
+        self.assertNotIn('file counted', content)
+        self.assertIn('[WARNING] warning counted', content)
+
+    def test_per_logger_levels(self):
+        """A level given for one module only applies to that module"""
+        logger.setup_logging(logging.INFO, filename=self.log_file, loggers={'test_logger.first': logging.ERROR})
+        self.log.info('first info')
+        self.log.error('first error')
+        self.other.info('second info')
+
+        content = self.read_log()
+        self.assertNotIn('first info', content)
+        self.assertIn('first error', content)
+        self.assertIn('second info', content)
+
+    def test_rotation(self):
+        """The log file is rotated when it grows beyond max_bytes"""
+        logger.setup_logging(filename=self.log_file, max_bytes=500, backups=2)
+        for i in range(100):
+            self.log.info('record %d', i)
+
+        self.assertIn('record 99', self.read_log())
+        self.assertTrue(os.path.exists(self.log_file + '.1'))
+        self.assertTrue(os.path.exists(self.log_file + '.2'))
+        self.assertFalse(os.path.exists(self.log_file + '.3'))
+
+    def test_rotation_counts_encoded_bytes(self):
+        """Non-ASCII records are measured in bytes, so rotated files stay within max_bytes"""
+        logger.setup_logging(filename=self.log_file, max_bytes=1000, backups=5)
+        for i in range(100):
+            self.log.info('запись %d', i)
+        logger.shutdown_logging()
+
+        self.assertTrue(os.path.exists(self.log_file + '.3'))
+        for suffix in ('', '.1', '.2', '.3'):
+            self.assertLessEqual(os.path.getsize(self.log_file + suffix), 1000)
+
+    def test_command_loggers(self):
+        """A per-command level covers every module the command logs from"""
+        loggers = cli.command_loggers({'copy': logging.DEBUG})
+        self.assertEqual(loggers, {'features.copy': logging.DEBUG, 'features.copy_engine': logging.DEBUG,
+                                   'features.walker': logging.DEBUG})
+
+        loggers = cli.command_loggers({'count': logging.ERROR, 'sync': logging.DEBUG})
+        self.assertEqual(loggers['features.walker'], logging.DEBUG)
+        self.assertEqual(loggers['features.count'], logging.ERROR)
+        self.assertEqual(loggers['features.hash_cache'], logging.DEBUG)
+
+    def test_parse_levels(self):
+        """Level specifications combine a global level with per-command levels"""
+        self.assertEqual(logger.parse_levels(None), (logging.INFO, {}))
+        self.assertEqual(logger.parse_levels('warning'), (logging.WARNING, {}))
+        self.assertEqual(logger.parse_levels('ERROR, hashsum=DEBUG'), (logging.ERROR, {'hashsum': logging.DEBUG}))
+        with self.assertRaises(ValueError):
+            logger.parse_levels('copy=LOUD')
+
+
+if __name__ == '__main__':
+    unittest.main()
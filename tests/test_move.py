@@ -1,7 +1,10 @@
 import os
 import shutil
 import unittest
+import io
 import argparse
+import errno
+from unittest import mock
 
 from features import move
 
@@ -89,6 +92,105 @@ class TestMove(unittest.TestCase):
 
         os.remove('not_a_folder.txt')
 
+    def batch_args(self, *argv):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-s', '--src', nargs='+')
+        parser.add_argument('-d', '--dst')
+        parser.add_argument('-r', '--regex')
+        parser.add_argument('-j', '--jobs', type=int, default=1)
+        parser.add_argument('--verify-hash', action='store_true')
+        return parser.parse_args(list(argv))
+
+    def make_files(self, names):
+        for name in names:
+            with open(os.path.join('test_src_dir', name), 'w') as f:
+                f.write(name)
+
+    def test_batch_move_glob_and_paths(self):
+        """Check moving several sources and glob patterns at once"""
+        self.make_files(['a.log', 'b.log', 'c.txt'])
+        os.makedirs('test_src_dir/folder')
+        args = self.batch_args('-s', 'test_src_dir/*.log', 'test_src_dir/folder', '-d', 'test_dst_dir')
+
+        with mock.patch('builtins.print'):
+            move.run(args)
+
+        self.assertEqual(sorted(os.listdir('test_dst_dir')), ['a.log', 'b.log', 'folder'])
+        self.assertEqual(sorted(os.listdir('test_src_dir')), ['c.txt', 'test_file.txt'])
+
+    def test_batch_move_regex(self):
+        """Check moving entries of a folder selected by regex"""
+        self.make_files(['a.log', 'b.log', 'c.txt'])
+        args = self.batch_args('-s', 'test_src_dir', '-r', r'.*\.txt', '-d', 'test_dst_dir')
+
+        with mock.patch('builtins.print'):
+            move.run(args)
+
+        self.assertEqual(sorted(os.listdir('test_dst_dir')), ['c.txt', 'test_file.txt'])
+
+    def test_batch_conflicts_move_nothing(self):
+        """Check that one conflict stops the whole batch before anything moves"""
+        self.make_files(['a.log', 'b.log'])
+        with open('test_dst_dir/b.log', 'w') as f:
+            f.write('existing')
+        args = self.batch_args('-s', 'test_src_dir/a.log', 'test_src_dir/b.log', '-d', 'test_dst_dir')
+
+        with self.assertRaises(FileExistsError):
+            move.run(args)
+        self.assertTrue(os.path.exists('test_src_dir/a.log'))
+        self.assertFalse(os.path.exists('test_dst_dir/a.log'))
+
+    def test_move_folder_into_itself(self):
+        """Check moving a folder into its own subfolder"""
+        os.makedirs('test_src_dir/inner')
+        plans, conflicts = move.plan_moves([os.path.abspath('test_src_dir')], 'test_src_dir/inner')
+        self.assertEqual(len(conflicts), 1)
+
+    def test_cross_device_copy_verify_unlink(self):
+        """Check the copy-verify-unlink path used across filesystems"""
+        self.make_files(['a.log', 'b.log'])
+        os.makedirs('test_src_dir/folder/sub')
+        with open('test_src_dir/folder/sub/c.txt', 'w') as f:
+            f.write('c')
+        args = self.batch_args('-s', 'test_src_dir/a.log', 'test_src_dir/b.log', 'test_src_dir/folder',
+                               '-d', 'test_dst_dir', '-j', '2', '--verify-hash')
+
+        with mock.patch.object(move.os, 'rename', side_effect=OSError(errno.EXDEV, 'cross-device')), \
+                mock.patch('builtins.print'):
+            move.run(args)
+
+        self.assertEqual(sorted(os.listdir('test_dst_dir')), ['a.log', 'b.log', 'folder'])
+        self.assertEqual(sorted(os.listdir('test_src_dir')), ['test_file.txt'])
+        with open('test_dst_dir/folder/sub/c.txt') as f:
+            self.assertEqual(f.read(), 'c')
+
+    def test_cross_device_journaled_files_in_parallel(self):
+        """Check journaled cross-device moves of single files use the -j workers"""
+        self.make_files(['a.log', 'b.log', 'c.log'])
+        args = self.batch_args('-s', 'test_src_dir/a.log', 'test_src_dir/b.log', 'test_src_dir/c.log',
+                               '-d', 'test_dst_dir', '-j', '3')
+        args.no_journal = False
+        args.resume = False
+        used_jobs = []
+        parallel_map = move.parallel_map
+
+        def recording_map(func, items, jobs=1, *rest, **kwargs):
+            used_jobs.append((len(items), jobs))
+            return parallel_map(func, items, jobs, *rest, **kwargs)
+
+        with mock.patch.object(move.journal_mod, 'DEFAULT_JOURNAL_DIR', os.path.abspath('test_dst_dir/.journals')), \
+                mock.patch.object(move.os, 'rename', side_effect=OSError(errno.EXDEV, 'cross-device')), \
+                mock.patch.object(move, 'parallel_map', recording_map), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as printed:
+            move.run(args)
+
+        self.assertEqual(used_jobs, [(3, 3)])
+        self.assertEqual(len(printed.getvalue().splitlines()), 3)
+        self.assertEqual(sorted(name for name in os.listdir('test_dst_dir') if name.endswith('.log')),
+                         ['a.log', 'b.log', 'c.log'])
+        self.assertEqual(os.listdir('test_dst_dir/.journals'), [])
+        self.assertEqual(sorted(os.listdir('test_src_dir')), ['test_file.txt'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import io
+import json
+
+from features import output
+
+
+class CountingStream(io.StringIO):
+    """StringIO that counts write calls"""
+    def __init__(self, tty=False):
+        super().__init__()
+        self.writes = 0
+        self.tty = tty
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+    def isatty(self):
+        return self.tty
+
+
+class TestOutput(unittest.TestCase):
+    def emit_all(self, fmt, stream=None, **kwargs):
+        """Write a heading and two results"""
+        stream = stream or io.StringIO()
+        with output.Output(fmt, ('path', 'size'), stream, **kwargs) as out:
+            out.emit('Files:')
+            out.emit('  a.txt 1', path='a.txt', size=1)
+            out.emit('  b,c.txt 2', path='b,c.txt', size=2, extra=True)
+        return stream.getvalue()
+
+    def test_text(self):
+        """Text output prints the human readable lines only"""
+        self.assertEqual(self.emit_all('text'), 'Files:\n  a.txt 1\n  b,c.txt 2\n')
+
+    def test_ndjson(self):
+        """NDJSON output has one object per result and no headings"""
+        lines = self.emit_all('ndjson').splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{'path': 'a.txt', 'size': 1}, {'path': 'b,c.txt', 'size': 2, 'extra': True}])
+
+    def test_csv(self):
+        """CSV output has a header row and only the declared columns"""
+        self.assertEqual(self.emit_all('csv'), 'path,size\na.txt,1\n"b,c.txt",2\n')
+
+    def test_buffered_writes(self):
+        """Lines are written in chunks, or one by one to a terminal"""
+        stream = CountingStream()
+        self.emit_all('text', stream, buffer_lines=2)
+        self.assertEqual(stream.writes, 2)
+
+        tty = CountingStream(tty=True)
+        self.emit_all('text', tty, buffer_lines=2)
+        self.assertEqual(tty.writes, 3)
+
+    def test_unknown_format(self):
+        """Unknown formats are rejected"""
+        with self.assertRaises(ValueError):
+            output.Output('xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import os
+import sys
+import json
+import socket
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from features import cli, serve
+
+
+class Blocking:
+    """Command that runs until the test releases it"""
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def run(self, args):
+        self.started.set()
+        self.release.wait(10)
+        print('released')
+
+
+class TestServe(unittest.TestCase):
+    def setUp(self):
+        """Start a server in a background event loop"""
+        self.test_dir = tempfile.mkdtemp(prefix='dirtools_serve_')
+        self.socket = os.path.join(self.test_dir, 's.sock')
+        self.data = os.path.join(self.test_dir, 'data')
+        os.makedirs(self.data)
+        for i in range(3):
+            with open(os.path.join(self.data, f'file{i}.txt'), 'w') as f:
+                f.write(f'content {i}')
+
+        self.blocking = Blocking()
+        parsers = dict(cli.build_parser().subcommands, block=argparse.ArgumentParser())
+        commands = dict(cli.commands, block=self.blocking)
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.router = serve._OutputRouter(sys.stdout)
+        self.previous, sys.stdout = sys.stdout, self.router
+        self.server = asyncio.run_coroutine_threadsafe(
+            serve.start_server(self.socket, parsers, commands, self.pool, self.router), self.loop).result()
+
+    def tearDown(self):
+        """Stop the server and clean up"""
+        self.blocking.release.set()
+        self.server.close()
+        asyncio.run_coroutine_threadsafe(self.server.wait_closed(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.pool.shutdown()
+        sys.stdout = self.previous
+        shutil.rmtree(self.test_dir)
+
+    def test_call(self):
+        """A request is executed with its output captured"""
+        response = serve.call(self.socket, {'id': 'a', 'command': 'count', 'path': self.data}, timeout=5)
+
+        self.assertTrue(response['ok'], response)
+        self.assertEqual(response['id'], 'a')
+        self.assertIn('3', response['output'])
+
+    def start_another(self, socket_path):
+        return asyncio.run_coroutine_threadsafe(
+            serve.start_server(socket_path, {}, {}, self.pool), self.loop).result(5)
+
+    def test_socket_path_in_use(self):
+        """A running server and regular files are never replaced, stale sockets are"""
+        with self.assertRaises(FileExistsError):
+            self.start_another(self.socket)
+        self.assertTrue(serve.call(self.socket, {'command': 'count', 'path': self.data}, timeout=5)['ok'])
+
+        regular = os.path.join(self.test_dir, 'file.sock')
+        with open(regular, 'w') as f:
+            f.write('keep')
+        with self.assertRaises(FileExistsError):
+            self.start_another(regular)
+        self.assertTrue(os.path.isfile(regular))
+
+        stale = os.path.join(self.test_dir, 'stale.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(stale)
+        server = self.start_another(stale)
+        server.close()
+        asyncio.run_coroutine_threadsafe(server.wait_closed(), self.loop).result(5)
+
+    def test_run_keeps_path_in_use(self):
+        """serve refusing to start leaves a regular file or a live socket at the path alone"""
+        regular = os.path.join(self.test_dir, 'file.sock')
+        with open(regular, 'w') as f:
+            f.write('keep')
+
+        for socket_path in (regular, self.socket):
+            with self.assertRaises(FileExistsError):
+                serve.run(argparse.Namespace(socket=socket_path, jobs=1))
+        with open(regular) as f:
+            self.assertEqual(f.read(), 'keep')
+        self.assertTrue(serve.call(self.socket, {'command': 'count', 'path': self.data}, timeout=5)['ok'])
+
+    def test_invalid_request(self):
+        """Errors are returned to the client"""
+        response = serve.call(self.socket, {'id': 1, 'command': 'count'}, timeout=5)
+        self.assertFalse(response['ok'])
+        self.assertIn('missing required options', response['error'])
+
+    def test_concurrent_clients_and_cancel(self):
+        """Clients are served concurrently and pending requests can be cancelled"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(self.socket)
+            f = sock.makefile('rwb')
+            for request in ({'id': 1, 'command': 'block'}, {'id': 2, 'command': 'count', 'path': self.data}):
+                f.write((json.dumps(request) + '\n').encode())
+            f.flush()
+            self.assertTrue(self.blocking.started.wait(5))
+
+            # request 2 waits for the only worker; cancel it from the same connection
+            f.write((json.dumps({'id': 3, 'cancel': 2}) + '\n').encode())
+            f.flush()
+            responses = [json.loads(f.readline()) for _ in range(2)]
+            self.assertEqual({r['id']: r['ok'] for r in responses}, {2: False, 3: True})
+            self.assertEqual([r['error'] for r in responses if r['id'] == 2], ['cancelled'])
+
+            # another client is not blocked by the first one's connection
+            other = threading.Thread(target=serve.call, args=(self.socket, {'command': 'block'}, 5))
+            other.start()
+            self.blocking.release.set()
+            response = json.loads(f.readline())
+            other.join(5)
+            f.close()
+
+        self.assertEqual(response['id'], 1)
+        self.assertEqual(response['output'], 'released\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+# upper bound for the cumulative import time of manager.py, in microseconds
+IMPORT_BUDGET_US = 100000
+
+# modules only some commands need; a plain count must not load them
+HEAVY_MODULES = ('hashlib', 'sqlite3', 'asyncio', 'multiprocessing', 'features.hashing', 'features.copy_engine')
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+    def python(self, *args):
+        """Run the interpreter in the project root"""
+        return subprocess.run([sys.executable] + list(args), capture_output=True, text=True,
+                              cwd=self.project_root)
+
+    def import_time(self):
+        """Cumulative import time of manager as reported by -X importtime"""
+        result = self.python('-X', 'importtime', '-c', 'import manager')
+        self.assertEqual(result.returncode, 0, msg=result.stderr)
+        for line in result.stderr.splitlines():
+            fields = [field.strip() for field in line.split('|')]
+            if fields[-1] == 'manager':
+                return int(fields[1])
+        self.fail('manager missing from -X importtime output')
+
+    def test_import_time(self):
+        """Importing manager stays within the startup budget"""
+        best = min(self.import_time() for _ in range(3))
+        self.assertLess(best, IMPORT_BUDGET_US, f'import manager took {best} us')
+
+    def test_commands_load_lazily(self):
+        """Dispatching a command imports only what that command needs"""
+        log_dir = tempfile.mkdtemp(prefix='dirtools_startup_')
+        self.addCleanup(shutil.rmtree, log_dir)
+        # keep the repository's logs/manager.log out of the test
+        code = ('import sys, manager, features.logger\n'
+                f'features.logger.LOG_FILE = {os.path.join(log_dir, "manager.log")!r}\n'
+                'manager.main(["count", "-p", "features"])\n'
+                f'print(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules))\n'
+                'print(sorted(name for name in sys.modules if name.startswith("features.")))')
+        result = self.python('-c', code)
+        self.assertEqual(result.returncode, 0, msg=result.stderr)
+        heavy, loaded = result.stdout.splitlines()[-2:]
+        self.assertEqual(heavy, '[]')
+        self.assertEqual(loaded, "['features.cli', 'features.count', 'features.logger', 'features.output', 'features.walker']")
+
+
+if __name__ == '__main__':
+    unittest.main()
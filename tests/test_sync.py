@@ -0,0 +1,164 @@
+import unittest
+import os
+import shutil
+import argparse
+import sys
+from unittest import mock
+
+from features import sync, copy_engine
+
+
+class OutputCapture:
+    """A class to capture stdout output"""
+    def __init__(self):
+        self.output = ''
+
+    def write(self, s):
+        self.output += s
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'test_sync_dir'
+        self.src = os.path.join(self.test_dir, 'src')
+        self.dst = os.path.join(self.test_dir, 'dst')
+        os.makedirs(os.path.join(self.src, 'sub', 'deep'), exist_ok=True)
+        for name in ['a.txt', 'sub/b.txt', 'sub/deep/c.txt']:
+            with open(os.path.join(self.src, name), 'w') as f:
+                f.write(f'content of {name}')
+
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-s', '--src', required=True)
+        parser.add_argument('-d', '--dst', required=True)
+        parser.add_argument('--checksum', action='store_true')
+        parser.add_argument('--delete', action='store_true')
+        parser.add_argument('--delta', action='store_true')
+        parser.add_argument('-j', '--jobs', type=int, default=1)
+        self.parser = parser
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def sync(self, *extra):
+        args = self.parser.parse_args(['-s', self.src, '-d', self.dst] + list(extra))
+        captured = OutputCapture()
+        sys.stdout = captured
+        try:
+            return sync.run(args)
+        finally:
+            sys.stdout = sys.__stdout__
+
+    def read(self, root, name):
+        with open(os.path.join(root, name)) as f:
+            return f.read()
+
+    def test_initial_and_unchanged_sync(self):
+        """First sync copies everything, the second one copies nothing"""
+        stats = self.sync('-j', '3')
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(self.read(self.dst, 'sub/deep/c.txt'), 'content of sub/deep/c.txt')
+
+        with mock.patch.object(copy_engine, 'copy_file') as copy_file:
+            stats = self.sync()
+        copy_file.assert_not_called()
+        self.assertEqual((stats.files, stats.unchanged), (0, 3))
+
+    def test_changed_file_is_copied(self):
+        """A file with new mtime or size is copied again"""
+        self.sync()
+        path = os.path.join(self.src, 'sub', 'b.txt')
+        with open(path, 'w') as f:
+            f.write('changed and longer')
+
+        stats = self.sync()
+
+        self.assertEqual((stats.files, stats.unchanged), (1, 2))
+        self.assertEqual(self.read(self.dst, 'sub/b.txt'), 'changed and longer')
+        self.assertEqual(os.stat(path).st_mtime_ns, os.stat(os.path.join(self.dst, 'sub', 'b.txt')).st_mtime_ns)
+
+    def test_checksum_detects_same_size_change(self):
+        """--checksum compares contents when size and mtime look unchanged"""
+        self.sync()
+        target = os.path.join(self.dst, 'a.txt')
+        st = os.stat(target)
+        with open(target, 'w') as f:
+            f.write('content of X.txt')
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        self.assertEqual(self.sync().files, 0)
+        stats = self.sync('--checksum')
+
+        self.assertEqual((stats.files, stats.unchanged), (1, 2))
+        self.assertEqual(self.read(self.dst, 'a.txt'), 'content of a.txt')
+
+    def test_delta_updates_in_place(self):
+        """--delta rewrites only the changed blocks of an existing file"""
+        path = os.path.join(self.src, 'big.bin')
+        data = bytearray(os.urandom(3 * 128 * 1024))
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.sync()
+        inode = os.stat(os.path.join(self.dst, 'big.bin')).st_ino
+        data[-1] ^= 0xff
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        stats = self.sync('--delta')
+
+        self.assertEqual((stats.files, stats.bytes), (1, 128 * 1024))
+        self.assertEqual(os.stat(os.path.join(self.dst, 'big.bin')).st_ino, inode)
+        with open(os.path.join(self.dst, 'big.bin'), 'rb') as f:
+            self.assertEqual(f.read(), bytes(data))
+
+    def test_delete_extras(self):
+        """Extra destination entries are only removed with --delete"""
+        self.sync()
+        os.makedirs(os.path.join(self.dst, 'extra_dir'))
+        with open(os.path.join(self.dst, 'sub', 'extra.txt'), 'w') as f:
+            f.write('extra')
+
+        self.assertEqual(self.sync().deleted, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.dst, 'sub', 'extra.txt')))
+
+        stats = self.sync('--delete')
+        self.assertEqual(stats.deleted, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'extra_dir')))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'sub', 'extra.txt')))
+
+    def test_type_conflict(self):
+        """A folder in place of a file is left alone unless --delete"""
+        os.makedirs(os.path.join(self.dst, 'a.txt'))
+
+        self.assertEqual(self.sync().conflicts, 1)
+        self.assertTrue(os.path.isdir(os.path.join(self.dst, 'a.txt')))
+
+        self.sync('--delete')
+        self.assertEqual(self.read(self.dst, 'a.txt'), 'content of a.txt')
+
+    def test_type_conflict_file_in_place_of_folder(self):
+        """A file in place of a folder is left alone and the folder is not descended into"""
+        shutil.rmtree(self.dst, ignore_errors=True)
+        os.makedirs(self.dst)
+        with open(os.path.join(self.dst, 'sub'), 'w') as f:
+            f.write('not a folder')
+
+        stats = self.sync()
+        self.assertEqual(stats.conflicts, 1)
+        self.assertEqual(self.read(self.dst, 'sub'), 'not a folder')
+        self.assertEqual(self.read(self.dst, 'a.txt'), 'content of a.txt')
+
+        self.sync('--delete')
+        self.assertEqual(self.read(self.dst, 'sub/deep/c.txt'), 'content of sub/deep/c.txt')
+
+    def test_source_is_not_a_directory(self):
+        """Sync needs a source folder"""
+        args = self.parser.parse_args(['-s', os.path.join(self.src, 'a.txt'), '-d', self.dst])
+        with self.assertRaises(NotADirectoryError):
+            sync.run(args)
+
+
+if __name__ == '__main__':
+    unittest.main()
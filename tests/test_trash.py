@@ -0,0 +1,120 @@
+import unittest
+import io
+import os
+import stat
+import time
+import errno
+import shutil
+import argparse
+from unittest import mock
+
+from features import delete, trash
+
+
+class TestTrash(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = os.path.abspath('test_trash_dir')
+        self.trash_dir = os.path.join(self.test_dir, 'trash')
+        self.tree = os.path.join(self.test_dir, 'tree')
+        os.makedirs(os.path.join(self.tree, 'sub'), exist_ok=True)
+        for name in ['a.txt', 'sub/b.txt']:
+            with open(os.path.join(self.tree, name), 'w') as f:
+                f.write(name)
+        self.patch = mock.patch.object(trash, 'DEFAULT_TRASH_DIR', self.trash_dir)
+        self.patch.start()
+
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-s', '--src', required=True)
+        parser.add_argument('--async', dest='async_delete', action='store_true')
+        self.parser = parser
+
+    def tearDown(self):
+        """Clean up test folders"""
+        self.patch.stop()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def trash_tree(self):
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as printed:
+            delete.run(self.parser.parse_args(['-s', self.tree, '--async']))
+        items = trash.list_items()
+        self.assertEqual(printed.getvalue(), f'Moved to trash: {self.tree} (id {items[-1]["id"]})\n')
+        return items
+
+    def test_async_delete_moves_to_trash(self):
+        """delete --async renames the target into the trash"""
+        items = self.trash_tree()
+
+        self.assertFalse(os.path.exists(self.tree))
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['path'], self.tree)
+        self.assertTrue(os.path.isfile(os.path.join(items[0]['location'], 'data', 'sub', 'b.txt')))
+
+    def test_restore(self):
+        """Restored item is back at its original place"""
+        item_id = self.trash_tree()[0]['id']
+
+        self.assertEqual(trash.restore(item_id), self.tree)
+
+        with open(os.path.join(self.tree, 'sub', 'b.txt')) as f:
+            self.assertEqual(f.read(), 'sub/b.txt')
+        self.assertEqual(trash.list_items(), [])
+
+    def test_restore_conflict(self):
+        """Restore never overwrites"""
+        item_id = self.trash_tree()[0]['id']
+        os.makedirs(self.tree)
+        with self.assertRaises(FileExistsError):
+            trash.restore(item_id)
+        self.assertEqual(trash.restore(item_id, to=os.path.join(self.test_dir, 'restored')),
+                         os.path.join(self.test_dir, 'restored'))
+
+    def test_trash_is_private(self):
+        """Trash and item folders are only accessible by their owner"""
+        os.makedirs(self.trash_dir, mode=0o755)
+        os.chmod(self.trash_dir, 0o755)
+        item = self.trash_tree()[0]
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.trash_dir).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(item['location']).st_mode), 0o700)
+
+    def test_refuses_symlinked_trash(self):
+        """A trash directory replaced by a symlink is not used"""
+        os.makedirs(os.path.join(self.test_dir, 'elsewhere'))
+        os.symlink(os.path.join(self.test_dir, 'elsewhere'), self.trash_dir)
+        with self.assertRaises(PermissionError):
+            trash.move_to_trash(os.path.join(self.tree, 'a.txt'))
+        self.assertTrue(os.path.exists(os.path.join(self.tree, 'a.txt')))
+
+    def test_restore_across_filesystems(self):
+        """Restore falls back to copy and delete when rename crosses filesystems"""
+        item_id = self.trash_tree()[0]['id']
+        rename = os.rename
+
+        def cross_device_rename(src, dst, *args, **kwargs):
+            if dst.startswith(self.tree):
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            return rename(src, dst, *args, **kwargs)
+
+        with mock.patch('os.rename', cross_device_rename):
+            self.assertEqual(trash.restore(item_id), self.tree)
+        with open(os.path.join(self.tree, 'sub', 'b.txt')) as f:
+            self.assertEqual(f.read(), 'sub/b.txt')
+        self.assertEqual(trash.list_items(), [])
+
+    def test_purge_older_than(self):
+        """Purge keeps items inside the recovery window"""
+        self.trash_tree()
+
+        self.assertEqual(trash.purge(older_than=1)[0], 0)
+        with mock.patch.object(time, 'time', return_value=time.time() + 2 * 86400):
+            purged, stats = trash.purge(older_than=1, jobs=2)
+
+        self.assertEqual((purged, stats.files, stats.dirs), (1, 2, 2))
+        self.assertEqual(trash.list_items(), [])
+        self.assertEqual(os.listdir(self.trash_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import os
+import shutil
+
+from features import walker
+
+
+class TestWalker(unittest.TestCase):
+    def setUp(self):
+        """Preparing for test"""
+        self.test_dir = 'test_walker_dir'
+        for folder in ['a/b/c', 'a/skip', 'd']:
+            os.makedirs(os.path.join(self.test_dir, folder), exist_ok=True)
+        for name in ['top.txt', 'a/one.txt', 'a/one.md', 'a/b/two.txt', 'a/b/c/three.txt',
+                     'a/skip/hidden.txt', 'd/four.log']:
+            with open(os.path.join(self.test_dir, name), 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        """Clean up test folders"""
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_matches_os_walk(self):
+        """Check that listings are the same as os.walk"""
+        expected = [(root, sorted(dirs), sorted(files)) for root, dirs, files in os.walk(self.test_dir)]
+        actual = [(listing.path, sorted(e.name for e in listing.dirs), sorted(e.name for e in listing.files))
+                  for listing in walker.iter_dirs(self.test_dir)]
+        self.assertEqual(actual, expected)
+
+    def test_stat_and_depth(self):
+        """Check cached stat results and entry depth"""
+        entries = {os.path.relpath(e.path, self.test_dir): e for e in walker.walk(self.test_dir, stat=True)}
+        self.assertEqual(entries['a/b/two.txt'].stat.st_size, len('a/b/two.txt'))
+        self.assertEqual(entries['top.txt'].depth, 1)
+        self.assertEqual(entries['a/b/c/three.txt'].depth, 4)
+        self.assertIsNone(next(walker.walk(self.test_dir)).stat)
+
+    def test_filters_and_max_depth(self):
+        """Check include/exclude patterns, excluded directories and depth limit"""
+        names = sorted(e.name for e in walker.walk(self.test_dir, include=['*.txt'], exclude=['t*'],
+                                                   exclude_dirs=['skip']))
+        self.assertEqual(names, ['one.txt'])
+        names = sorted(e.name for e in walker.walk(self.test_dir, max_depth=2))
+        self.assertEqual(names, ['four.log', 'one.md', 'one.txt', 'top.txt'])
+
+    def test_topdown_pruning_and_bottom_up(self):
+        """Check pruning through Listing.dirs and bottom-up order"""
+        visited = []
+        for listing in walker.iter_dirs(self.test_dir):
+            visited.append(os.path.relpath(listing.path, self.test_dir))
+            listing.dirs[:] = [d for d in listing.dirs if d.name != 'b']
+        self.assertNotIn(os.path.join('a', 'b'), visited)
+
+        order = [os.path.relpath(listing.path, self.test_dir)
+                 for listing in walker.iter_dirs(self.test_dir, topdown=False)]
+        self.assertLess(order.index(os.path.join('a', 'b', 'c')), order.index(os.path.join('a', 'b')))
+        self.assertEqual(order[-1], '.')
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'symlinks are not supported')
+    def test_symlink_policy(self):
+        """Check that symlinked directories are followed only on request and loops are safe"""
+        os.symlink(os.path.abspath(os.path.join(self.test_dir, 'a')), os.path.join(self.test_dir, 'd', 'loop'))
+        plain = [e.name for e in walker.walk(self.test_dir)]
+        followed = [e.name for e in walker.walk(self.test_dir, follow_symlinks=True)]
+        self.assertEqual(plain.count('two.txt'), 1)
+        self.assertEqual(followed.count('two.txt'), 1)
+        self.assertEqual(len(plain), len(followed))
+
+    def test_error_callback(self):
+        """Check that errors are passed to the callback"""
+        errors = []
+        self.assertEqual(list(walker.iter_dirs('no_such_dir', on_error=errors.append)), [])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], FileNotFoundError)
+
+    def test_threaded_walk_matches_serial(self):
+        """Check that parallel listing gives exactly the serial result"""
+        for i in range(20):
+            folder = os.path.join(self.test_dir, 'wide', f'dir{i}', 'inner')
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, 'file.txt'), 'w') as f:
+                f.write(str(i))
+
+        def snapshot(**kwargs):
+            return [(listing.path, listing.depth, listing.dirs, listing.files)
+                    for listing in walker.iter_dirs(self.test_dir, **kwargs)]
+
+        for kwargs in ({}, {'topdown': False}, {'max_depth': 3}, {'stat': True}, {'exclude_dirs': ['dir1*']}):
+            with self.subTest(**kwargs):
+                self.assertEqual(snapshot(threads=4, **kwargs), snapshot(**kwargs))
+
+        serial = []
+        threaded = []
+        for result, threads in ((serial, 1), (threaded, 3)):
+            for listing in walker.iter_dirs(self.test_dir, threads=threads):
+                result.append(listing.path)
+                listing.dirs[:] = [d for d in listing.dirs if not d.name.endswith('5')]
+        self.assertEqual(threaded, serial)
+
+    def test_listing_cache_reuses_unchanged_directories(self):
+        """Check that only directories with a changed mtime are listed again"""
+        cache = walker.ListingCache()
+        first = sorted(e.path for e in walker.walk(self.test_dir, stat=True, cache=cache))
+        self.assertEqual((cache.reused, cache.rescanned), (0, 6))
+
+        second = sorted(e.path for e in walker.walk(self.test_dir, stat=True, cache=cache))
+        self.assertEqual(second, first)
+        self.assertEqual((cache.reused, cache.rescanned), (6, 6))
+
+        new_file = os.path.join(self.test_dir, 'a', 'b', 'new.txt')
+        with open(new_file, 'w') as f:
+            f.write('new')
+        third = sorted(e.path for e in walker.walk(self.test_dir, stat=True, cache=cache))
+        self.assertEqual(third, sorted(first + [new_file]))
+        self.assertEqual((cache.reused, cache.rescanned), (11, 7))
+
+
+if __name__ == '__main__':
+    unittest.main()